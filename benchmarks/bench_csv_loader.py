@@ -0,0 +1,72 @@
+"""
+Compare the old two-pass, python-engine CSV loader with the single-pass readers
+in workshop_items on a large synthetic recipe book.
+
+Run from the repository root:
+    python -m benchmarks.bench_csv_loader [--recipes 50000]
+
+The recipe book comes from benchmarks.synthetic, like the main suite (benchmarks.run).
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+import workshop_items as w
+from benchmarks.synthetic import write_recipe_book
+
+
+def legacy_load_csv_with_max_columns(filepath):
+    # The helper as it used to be: one pass to count fields, then pandas' python engine.
+    with open(filepath, newline='') as f:
+        max_fields = max(len(row) for row in csv.reader(f))
+    return pd.read_csv(filepath, header=None, engine='python', names=range(max_fields), on_bad_lines='skip')
+
+
+def legacy_recipes(filepath):
+    df = legacy_load_csv_with_max_columns(filepath)
+    max_fields = df.shape[1]
+    recipes = {}
+    for _, row in df.iterrows():
+        ingredients = []
+        for i in range(1, max_fields, 2):
+            if pd.isna(row[i]):
+                break
+            qty = float(row[i + 1]) if i + 1 < max_fields and not pd.isna(row[i + 1]) else 0
+            ingredients.append((row[i], qty))
+        recipes[row[0]] = ingredients
+    return recipes
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--recipes", type=int, default=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "recipe_book.csv")
+        write_recipe_book(path, args.recipes)
+
+        results = [
+            ("legacy load_csv_with_max_columns", *timed(legacy_load_csv_with_max_columns, path)),
+            ("load_csv_with_max_columns", *timed(w.load_csv_with_max_columns, path)),
+            ("legacy recipe dict (iterrows)", *timed(legacy_recipes, path)),
+            ("iter_recipe_book", *timed(lambda p: dict(w.iter_recipe_book(p)), path)),
+        ]
+
+    print(f"Synthetic recipe book: {args.recipes} recipes")
+    for name, seconds, _ in results:
+        print(f"  {name:<36} {seconds * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
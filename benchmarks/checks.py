@@ -0,0 +1,253 @@
+"""
+Offline behaviour checks for the pieces that talk to the network or the clock.
+
+Run from the repository root:
+    python -m benchmarks.checks [NAME ...]
+
+Universalis is replaced by StubUniversalis, a local HTTP server that answers
+the aggregated endpoint and can be told to fail the next few requests.
+"""
+import argparse
+import contextlib
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubUniversalis:
+    """
+    Local stand-in for the Universalis aggregated endpoint.
+
+    Every item ID is priced at id % 1000, except IDs divisible by 7, which are
+    reported as failed items (no result). fail_next(n, status) makes the next
+    n requests answer with that status (0 drops the connection instead).
+    Requested batches are recorded in `batches`.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self._failures = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with stub._lock:
+                    status = stub._failures.pop(0) if stub._failures else 200
+                    ids = [int(i) for i in self.path.rstrip("/").split("/")[-1].split(",")]
+                    stub.batches.append(ids)
+                if status == 0:
+                    self.connection.close()
+                    return
+                if status != 200:
+                    self.send_response(status)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                results = [
+                    {"itemId": i, "nq": {"minListing": {"world": {"price": i % 1000}, "dc": {"price": i % 1000}}}}
+                    for i in ids if i % 7
+                ]
+                body = json.dumps({"results": results, "failedItems": [i for i in ids if not i % 7]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def fail_next(self, n, status=503):
+        with self._lock:
+            self._failures.extend([status] * n)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Checks ---
+
+def check_market_client():
+    """Batching, dedup, retry after 429/5xx, and failed requests mapping to empty rows."""
+    from market_client import MARKET_COLUMNS, MarketClient
+
+    with StubUniversalis() as stub:
+        with MarketClient(base_url=stub.url, batch_size=10, rate_limit=0, backoff=0.01, retries=2) as client:
+            ids = list(range(1, 26)) + [3, "4", 5.0, None]
+            market = client.fetch(ids)
+            assert sorted(len(b) for b in stub.batches) == [5, 10, 10], stub.batches
+            assert sorted(i for b in stub.batches for i in b) == list(range(1, 26))
+            assert set(market) == set(range(1, 26))
+            assert market[12]["minListing_world"] == 12
+            assert market[14] == {col: None for col in MARKET_COLUMNS}  # reported as a failed item
+
+            stub.batches.clear()
+            stub.fail_next(1, 429)
+            stub.fail_next(1, 0)
+            assert client.fetch([101])[101]["minListing_world"] == 101
+            assert len(stub.batches) == 3
+
+            stub.batches.clear()
+            stub.fail_next(3, 503)
+            assert client.fetch([102]) == {102: {col: None for col in MARKET_COLUMNS}}
+            assert len(stub.batches) == 3  # first try plus two retries
+
+            stub.batches.clear()
+            stub.fail_next(1, 404)
+            client.fetch([103])
+            assert len(stub.batches) == 1  # not retryable
+
+
+def check_price_cache_outage():
+    """A failed refresh leaves cached prices stale (not fresh None rows) and is retried on the next read."""
+    from market_client import MarketClient
+    from price_cache import CachedMarketClient, PriceCache
+
+    now = [1000.0]
+    cache = PriceCache(":memory:", clock=lambda: now[0])
+    with StubUniversalis() as stub:
+        client = MarketClient(base_url=stub.url, rate_limit=0, backoff=0.01, retries=1)
+        with CachedMarketClient(cache=cache, client=client, stale_while_revalidate=True) as cached:
+            assert cached.fetch([100])[100]["minListing_world"] == 100
+            now[0] += 3600
+            stub.fail_next(2, 503)
+            assert cached.fetch([100])[100]["minListing_world"] == 100  # stale, revalidating
+            cached.wait()
+            fresh, stale, missing = cache.lookup("Seraph", [100])
+            assert not fresh and stale[100]["minListing_world"] == 100
+
+            # Without revalidation a failed first fetch returns None values but caches nothing.
+            cached.stale_while_revalidate = False
+            stub.fail_next(2, 503)
+            assert cached.fetch([200])[200]["minListing_world"] is None
+            assert cache.lookup("Seraph", [200])[2] == [200]
+            assert cached.fetch([200])[200]["minListing_world"] == 200
+
+
+def check_prefetch_outage():
+    """A prefetch during an outage stores nothing, so the items are still due next cycle."""
+    from market_client import MarketClient
+    from node_schedule import NodeSchedule
+    from price_cache import PriceCache
+    from price_prefetch import PricePrefetcher
+
+    schedule = NodeSchedule.from_rows([
+        {"ID": str(300 + n), "Time": f"{n}:00 AM/PM", "Item Name": f"Ore {n}", "Location": "Il Mheg",
+         "Coordinates": "(x1,y1)"}
+        for n in range(12)
+    ])
+    cache = PriceCache(":memory:", clock=lambda: 0.0)
+    with StubUniversalis() as stub:
+        client = MarketClient(base_url=stub.url, rate_limit=0, backoff=0.01, retries=0)
+        with PricePrefetcher(schedule, cache=cache, client=client, hours=4, clock=lambda: 0.0) as prefetcher:
+            due = prefetcher.plan()[0]
+            assert due
+            stub.fail_next(1, 503)
+            summary = prefetcher.prefetch()
+            assert summary["failed"] == len(due) and summary["fetched"] == 0
+            assert prefetcher.plan()[0] == due
+            assert prefetcher.prefetch()["fetched"] == len(due)
+            assert prefetcher.plan()[0] == []
+        client.close()
+
+
+def check_node_watcher():
+    """With a FakeClock moved across a spawn window, the watcher announces it exactly once."""
+    import asyncio
+
+    from node_schedule import ET_DAY, NodeSchedule
+    from node_watcher import ET_MINUTE_SECONDS, FakeClock, NodeWatcher
+
+    class Collect:
+        def __init__(self):
+            self.events = []
+
+        async def send(self, event):
+            self.events.append(event)
+
+        async def close(self):
+            pass
+
+    schedule = NodeSchedule.from_rows([
+        {"ID": "5111", "Time": "2:00 AM", "Item Name": "Ore", "Location": "Il Mheg", "Coordinates": "(x1,y1)"}
+    ])
+
+    async def run():
+        collect = Collect()
+        clock = FakeClock(start=(1000 * ET_DAY + 5) * ET_MINUTE_SECONDS)  # ET 00:05
+        watcher = NodeWatcher(schedule, [collect], clock=clock, lead=60)
+        task = asyncio.ensure_future(watcher.run())
+        await clock.advance(0)
+        assert collect.events == []  # 02:00 is still more than an ET hour away
+        await clock.advance(180 * ET_MINUTE_SECONDS)  # wakes at 01:00, 02:00 and 03:00
+        watcher.stop()
+        await task
+        assert [(e["spawn_et"], e["minutes_until"]) for e in collect.events] == [("02:00", 60)], collect.events
+
+    asyncio.run(run())
+
+
+def check_pipeline_dry_run():
+    """A dry run lists a stage downstream of one that would run as "may run", never "skipped"."""
+    import os
+    import tempfile
+
+    from pipeline import Pipeline, Stage
+
+    def copy(src, dst):
+        with open(src, encoding="utf-8") as f, open(dst, "w", encoding="utf-8") as out:
+            out.write(f.read())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        a, b, c = (os.path.join(tmp, name) for name in ("a.txt", "b.txt", "c.txt"))
+        with open(a, "w", encoding="utf-8") as f:
+            f.write("one")
+
+        def pipeline():
+            return Pipeline([
+                Stage("up", copy, inputs=[a], outputs=[b], args=(a, b)),
+                Stage("down", copy, inputs=[b], outputs=[c], args=(b, c)),
+            ], state_path=os.path.join(tmp, "state.json"))
+
+        assert pipeline().run() == {"up": "ran", "down": "ran"}
+        assert pipeline().run(dry_run=True) == {"up": "skipped", "down": "skipped"}
+        with open(a, "w", encoding="utf-8") as f:
+            f.write("two")
+        assert pipeline().run(dry_run=True) == {"up": "would run", "down": "may run"}
+        assert pipeline().run() == {"up": "ran", "down": "ran"}
+
+
+CHECKS = {
+    "market_client": check_market_client,
+    "price_cache_outage": check_price_cache_outage,
+    "prefetch_outage": check_prefetch_outage,
+    "node_watcher": check_node_watcher,
+    "pipeline_dry_run": check_pipeline_dry_run,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("names", nargs="*", help=f"checks to run (default all: {', '.join(CHECKS)})")
+    args = parser.parse_args(argv)
+    for name in args.names or CHECKS:
+        with contextlib.redirect_stdout(io.StringIO()):  # the clients' own warnings
+            CHECKS[name]()
+        print(f"  {name:<24} ok")
+
+
+if __name__ == "__main__":
+    main()
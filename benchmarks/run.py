@@ -0,0 +1,281 @@
+"""
+Timing and peak-memory benchmarks for the workshop and timed-node pipelines,
+run offline against a seeded synthetic dataset (see benchmarks/synthetic.py).
+
+Run from the repository root:
+    python -m benchmarks.run [--scale small|medium|large] [--repeat 3] [--only NAME ...]
+    python -m benchmarks.run --save                 # write benchmarks/baselines/<scale>.json
+    python -m benchmarks.run --compare              # compare against that baseline
+
+--compare exits with status 1 when a benchmark got slower (or used more memory)
+than the baseline by more than the given threshold.
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import synthetic
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+# Differences below these are noise, whatever the ratio.
+MIN_TIME_DELTA = 0.005
+MIN_MEMORY_DELTA = 256 * 1024
+
+
+class _OfflineMarket:
+    # Stands in for CachedMarketClient: deterministic prices, no network.
+    def fetch(self, item_ids):
+        from market_client import MARKET_COLUMNS, normalize_item_id
+        market = {}
+        for item_id in item_ids:
+            item_id = normalize_item_id(item_id)
+            if item_id is not None:
+                market[item_id] = {col: (item_id * 7 + n) % 5000 for n, col in enumerate(MARKET_COLUMNS)}
+        return market
+
+
+def _benchmarks(paths, out):
+    """[(name, setup, run)]: setup() runs untimed before every repeat and returns run's argument."""
+    import workshop_items as w
+    import timed_nodes as tn
+    from item_index import ItemIndex, build_index, clean_item_names
+    from gathering_route import plan_gathering_route
+    from item_model import CompactRecipes
+    from node_schedule import NodeSchedule
+    from parts_catalog import PartsCatalog
+
+    book, gathering = paths["recipe_book"], paths["recipe_gathering"]
+    totals = os.path.join(out, "workshop_output.csv")
+    cleaned = os.path.join(out, "cleaned_nodes.csv")
+    materials = os.path.join(out, "catalog_materials.csv")
+    index_path = os.path.join(paths["root"], "utilities", "item_ids.idx")
+
+    def fresh_graph():
+        # Bypass load_recipe_graph's cache so every repeat parses and sorts again.
+        w._recipe_graph_cache.clear()
+
+    def prices():
+        graph = w.load_recipe_graph(book, gathering)
+        return {
+            opt: (sum(map(ord, opt)) % 97) + 1
+            for ingredients in graph.recipes.values() for ingredient, _ in ingredients
+            for opt in graph.options(ingredient) if opt not in graph.recipes
+        }
+
+    def stock():
+        # Every fifth recipe product and leaf, a few of each, as if left over from earlier builds.
+        graph = w.load_recipe_graph(book, gathering)
+        items = list(graph.recipes) + sorted(graph.compact.names.names[graph.compact.n_products:])
+        return {item: n % 5 + 1 for n, item in enumerate(items[::5])}
+
+    def route_list():
+        # 150 routable ingredients with airship-sized quantities.
+        path = os.path.join(out, "route_list.csv")
+        listing = w.generate_gathering_list(totals, book, gathering, os.path.join(out, "gathering_list.csv"))
+        listing = listing[listing["Method"].isin(["normal", "timed node"])].head(150).copy()
+        listing["Total Quantity"] = [n % 60 + 6 for n in range(len(listing))]
+        listing.to_csv(path, index=False)
+        return path
+
+    def no_index():
+        if os.path.exists(index_path):
+            os.remove(index_path)
+
+    def no_catalog():
+        path = os.path.join(paths["root"], "utilities", "parts_catalog.json")
+        if os.path.exists(path):
+            os.remove(path)
+
+    return [
+        # workshop_items
+        ("iter_recipe_book", None, lambda _: sum(1 for _ in w.iter_recipe_book(book))),
+        ("RecipeGraph.from_csv", None, lambda _: w.RecipeGraph.from_csv(book, gathering)),
+        ("consolidate_csv_files", None,
+         lambda _: w.consolidate_csv_files(paths["workshop_parts"])[["Item", "Quantity"]].to_csv(
+             totals, index=False, header=False)),
+        ("WorkshopConsolidator.scan", None,
+         lambda _: w.WorkshopConsolidator(paths["workshop_parts"], os.path.join(out, "watch.csv")).scan()),
+        ("generate_gathering_list", fresh_graph,
+         lambda _: w.generate_gathering_list(totals, book, gathering, os.path.join(out, "gathering_list.csv"))),
+        ("generate_gathering_list (cached graph)", None,
+         lambda _: w.generate_gathering_list(totals, book, gathering, os.path.join(out, "gathering_list.csv"))),
+        ("generate_cheapest_gathering_list", prices,
+         lambda p: w.generate_cheapest_gathering_list(totals, book, gathering, os.path.join(out, "cheapest.csv"), prices=p)),
+        ("CompactRecipes.from_recipes", None,
+         lambda _: CompactRecipes.from_recipes(w.load_recipe_graph(book, gathering).recipes)),
+        ("NetRequirements (full)", None,
+         lambda _: w.load_recipe_graph(book, gathering).net_requirements(w.read_totals(totals), stock())),
+        ("NetRequirements.set_stock x100", lambda: w.load_recipe_graph(book, gathering).net_requirements(
+            w.read_totals(totals), stock()),
+         lambda net: [net.set_stock(item, n % 7) for n, item in enumerate(list(stock())[:100])]),
+        ("print_recipe_tree", None, lambda _: w.print_recipe_tree(totals, book, gathering)),
+        ("materialize_catalog", None,
+         lambda _: w.materialize_catalog(materials, book, gathering, full=True)),
+        ("materialize_catalog (unchanged)", None, lambda _: w.materialize_catalog(materials, book, gathering)),
+        ("plan_gathering_route (150 ingredients)", route_list,
+         lambda path: plan_gathering_route(path, nodes_csv=paths["nodes_with_ids"], start=0)),
+        ("get_crafting_recipes", None, lambda _: w.get_crafting_recipes(totals)),
+        ("PartsCatalog.load (cold)", no_catalog, lambda _: PartsCatalog.load()),
+        ("catalog_requirements", None, lambda _: w.catalog_requirements(recipe_book_csv=book, recipe_gathering_csv=gathering)),
+        # timed_nodes
+        ("clean_unspoiled_data", None, lambda _: tn.clean_unspoiled_data(paths["wiki_dumps"][0], cleaned)),
+        ("clean_wiki_dumps", None,
+         lambda _: tn.clean_wiki_dumps(paths["wiki_dumps"], os.path.join(out, "wiki_nodes.csv"))),
+        ("build_index", no_index, lambda _: build_index(paths["item_ids"], index_path)),
+        ("ItemIndex.lookup", None,
+         lambda _: ItemIndex.load(paths["item_ids"], index_path).lookup(clean_item_names(synthetic.node_item_names(5000)))),
+        ("assign_ids", None, lambda _: tn.assign_ids(cleaned, os.path.join(out, "nodes_with_ids.csv"))),
+        ("NodeSchedule.from_csv", None, lambda _: NodeSchedule.from_csv(paths["nodes_with_ids"])),
+        ("NodeSchedule.forecast (1 real day)", None,
+         lambda _: NodeSchedule.from_csv(paths["nodes_with_ids"]).forecast(0, 86400)),
+        ("sort_for_current_time", None,
+         lambda _: tn.sort_for_current_time(paths["nodes_with_ids"], os.path.join(out, "sorted.csv"))),
+        ("generate_market_data", None,
+         lambda _: tn.generate_market_data(os.path.join(out, "sorted.csv"), os.path.join(out, "market.csv"),
+                                           client=_OfflineMarket(), history=False)),
+    ]
+
+
+def _prepare(paths, out):
+    # Intermediate files some benchmarks read, written once up front so --only works on its own.
+    import workshop_items as w
+    import timed_nodes as tn
+    # Same layout as utilities/workshop_output.csv: item,quantity without a header.
+    w.consolidate_csv_files(paths["workshop_parts"])[["Item", "Quantity"]].to_csv(
+        os.path.join(out, "workshop_output.csv"), index=False, header=False)
+    tn.clean_unspoiled_data(paths["wiki_dumps"][0], os.path.join(out, "cleaned_nodes.csv"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        tn.sort_for_current_time(paths["nodes_with_ids"], os.path.join(out, "sorted.csv"))
+
+
+def _measure(setup, run, repeat):
+    # One untimed warm-up (loads caches and indexes the way a second call would
+    # find them), `repeat` timed runs, then one more under tracemalloc for the peak.
+    with contextlib.redirect_stdout(io.StringIO()):
+        run(setup() if setup else None)
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        gc.collect()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            run(arg)
+            times.append(time.perf_counter() - start)
+    arg = setup() if setup else None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            run(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"min_s": min(times), "median_s": statistics.median(times), "peak_bytes": peak}
+
+
+def run_benchmarks(scale="small", repeat=3, only=None, seed=0):
+    """Generate the dataset, run every benchmark and return the results document."""
+    repo_root = os.getcwd()
+    if repo_root not in sys.path:
+        sys.path.insert(0, repo_root)
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        start = time.perf_counter()
+        paths = synthetic.make_dataset(root, scale, seed)
+        print(f"Generated {scale} dataset in {time.perf_counter() - start:.1f}s")
+        out = os.path.join(root, "out")
+        os.makedirs(out)
+        os.chdir(root)  # assign_ids, catalog_requirements etc. read utilities/ and data/ relative to cwd
+        try:
+            _prepare(paths, out)
+            for name, setup, run in _benchmarks(paths, out):
+                if only and not any(o.lower() in name.lower() for o in only):
+                    continue
+                results[name] = _measure(setup, run, repeat)
+                r = results[name]
+                print(f"  {name:<42} {r['min_s'] * 1000:10.1f} ms  {r['peak_bytes'] / 2**20:8.1f} MiB")
+        finally:
+            os.chdir(repo_root)
+    return {
+        "scale": scale,
+        "seed": seed,
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=0.25, memory_threshold=0.25):
+    """
+    Lines describing each benchmark against the baseline, and the names that
+    regressed: slower by more than `threshold` (fraction) or using more than
+    `memory_threshold` extra peak memory, ignoring differences below the noise floor.
+    """
+    lines, regressions = [], []
+    for name, now in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            lines.append(f"  {name:<42} new")
+            continue
+        t_ratio = now["min_s"] / before["min_s"] if before["min_s"] else 1.0
+        m_ratio = now["peak_bytes"] / before["peak_bytes"] if before["peak_bytes"] else 1.0
+        slower = t_ratio > 1 + threshold and now["min_s"] - before["min_s"] > MIN_TIME_DELTA
+        bigger = m_ratio > 1 + memory_threshold and now["peak_bytes"] - before["peak_bytes"] > MIN_MEMORY_DELTA
+        flag = "  REGRESSION" if slower or bigger else ""
+        if flag:
+            regressions.append(name)
+        lines.append(f"  {name:<42} time x{t_ratio:5.2f}  memory x{m_ratio:5.2f}{flag}")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(synthetic.SCALES), default="small")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="*", help="run only benchmarks whose name contains one of these")
+    parser.add_argument("--save", nargs="?", const="", help="save results as a baseline (default benchmarks/baselines/<scale>.json)")
+    parser.add_argument("--compare", nargs="?", const="", help="compare with a baseline (default benchmarks/baselines/<scale>.json)")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown as a fraction (default 0.25)")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="allowed peak-memory growth as a fraction")
+    args = parser.parse_args(argv)
+
+    default_baseline = os.path.join(BASELINE_DIR, f"{args.scale}.json")
+    current = run_benchmarks(args.scale, args.repeat, args.only, args.seed)
+
+    if args.save is not None:
+        path = args.save or default_baseline
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {path}")
+
+    if args.compare is not None:
+        path = args.compare or default_baseline
+        with open(path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("scale") != current["scale"]:
+            print(f"Warning: baseline is for scale '{baseline.get('scale')}', this run is '{current['scale']}'")
+        lines, regressions = compare(current, baseline, args.threshold, args.memory_threshold)
+        print(f"Compared with {path}:")
+        print("\n".join(lines))
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+        print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
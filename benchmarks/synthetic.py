@@ -0,0 +1,239 @@
+"""
+Seeded generator for large, realistic-looking inputs to benchmark against.
+
+Everything is written under one root laid out like the repository, so the
+functions that read from "utilities/" and "data/" relative to the working
+directory can be pointed at it with os.chdir:
+
+    root/
+      utilities/recipe_book.csv         deep multi-level recipes with '|' alternatives
+      utilities/recipe_gathering.csv    method + location for every gathered item
+      utilities/item_ids.json           node items plus filler names
+      utilities/workshop_parts/*.csv    part CSVs (item,qty)
+      data/<category>/<model>/*.csv     the same parts as a catalog
+      data/timed_nodes/*_nodes.txt      wiki table dumps
+      data/timed_nodes/final_nodes_with_ids.csv
+
+The same seed and scale always produce byte-identical files.
+"""
+import csv
+import json
+import os
+import random
+
+# Sizes per scale; "small" finishes in seconds and is what --quick uses.
+SCALES = {
+    "small": {"recipes": 2000, "depth": 6, "parts": 200, "nodes": 2000, "dumps": 2, "items": 20000},
+    "medium": {"recipes": 20000, "depth": 8, "parts": 2000, "nodes": 20000, "dumps": 4, "items": 100000},
+    "large": {"recipes": 100000, "depth": 10, "parts": 10000, "nodes": 100000, "dumps": 8, "items": 500000},
+}
+
+CRYSTAL_ELEMENTS = ["Fire", "Ice", "Wind", "Earth", "Lightning", "Water"]
+CRYSTAL_GRADES = ["Shard", "Crystal", "Cluster"]
+METHODS = ["normal", "normal", "normal", "timed node", "drop", "npc", "gc seals", "voyages"]
+ZONES = [
+    "Il Mheg", "The Rak'tika Greatwood", "Amh Araeng", "The Tempest", "Kholusia", "Lakeland",
+    "Azys Lla", "The Sea of Clouds", "Coerthas Western Highlands", "South Shroud",
+    "Northern Thanalan", "The Dravanian Forelands", "The Fringes", "The Lochs", "Yanxia",
+]
+CLASSES = ["Botanist", "Miner"]
+EXPANSIONS = ["A Realm Reborn", "Heavensward", "Stormblood", "Shadowbringers", "Endwalker"]
+CATEGORIES = {
+    "airships": ["forecastle", "aftcastle", "hull", "sail"],
+    "submarines": ["bow", "stern", "hull", "bridge"],
+    "estates": ["walls", "roof", "door", "window"],
+}
+
+
+def crystal_names():
+    return [f"{element} {grade}" for grade in CRYSTAL_GRADES for element in CRYSTAL_ELEMENTS]
+
+
+def _location(rng, method):
+    zone = rng.choice(ZONES)
+    coords = f"{zone} ( {rng.uniform(5, 40):.1f} / {rng.uniform(5, 40):.1f} )"
+    if method == "timed node":
+        hour = rng.choice([12, 2, 4, 6, 8, 10])
+        return coords + f", Timed at {hour}AM/PM ET"
+    return coords
+
+
+def write_recipe_book(path, n_recipes, depth=6, seed=0, gathering_path=None):
+    """
+    Recipe book of n_recipes products spread over `depth` tiers. Tier t products
+    use 1-4 ingredients from lower tiers (mostly t-1, so trees are deep) and a
+    crystal cell that is often a '|' alternative; a few material cells are
+    alternatives too. Tier-0 ingredients are gathered materials.
+
+    Returns the names of the top-tier products. With gathering_path, also writes
+    a matching recipe_gathering.csv.
+    """
+    rng = random.Random(seed)
+    crystals = crystal_names()
+    n_materials = max(10, n_recipes // 4)
+    materials = [f"Material {i}" for i in range(n_materials)]
+
+    per_tier = max(1, n_recipes // depth)
+    tiers = [materials]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        made = 0
+        for t in range(1, depth + 1):
+            count = per_tier if t < depth else n_recipes - made
+            products = [f"Tier {t} Item {i}" for i in range(count)]
+            for product in products:
+                row = [product]
+                for _ in range(rng.randint(1, 4)):
+                    source = tiers[-1] if rng.random() < 0.7 else rng.choice(tiers)
+                    cell = rng.choice(source)
+                    if rng.random() < 0.05:
+                        cell = f"{cell}|{rng.choice(source)}"
+                    row += [cell, rng.randint(1, 9)]
+                row += ["|".join(rng.sample(crystals, rng.choice([1, 1, 2, 3]))), rng.randint(1, 5)]
+                writer.writerow(row)
+            made += count
+            tiers.append(products)
+
+    if gathering_path is not None:
+        with open(gathering_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            for crystal in crystals:
+                writer.writerow([crystal, "crystal", _location(rng, "normal")])
+            for material in materials:
+                method = rng.choice(METHODS)
+                row = [material, method, _location(rng, method)]
+                if rng.random() < 0.1:
+                    row.append(_location(rng, method))
+                writer.writerow(row)
+    return tiers[-1]
+
+
+def write_part_csvs(folder, data_dir, products, n_files, seed=0):
+    """
+    n_files part CSVs ("item,qty" rows) in `folder`, mirrored as a catalog
+    under data_dir/<category>/<model>/<model>_<component>_parts.csv.
+    """
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    names = list(CATEGORIES)
+    for i in range(n_files):
+        category = names[i % len(names)]
+        components = CATEGORIES[category]
+        model = f"model_{i // len(components) // len(names)}_type"
+        component = components[(i // len(names)) % len(components)]
+        rows = [(item, rng.randint(1, 60)) for item in rng.sample(products, min(len(products), rng.randint(5, 15)))]
+
+        model_dir = os.path.join(data_dir, category, model)
+        os.makedirs(model_dir, exist_ok=True)
+        filename = f"{model}_{component}_parts.csv"
+        for target in (os.path.join(folder, f"{category}_{filename}"), os.path.join(model_dir, filename)):
+            with open(target, "w", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerows(rows)
+
+
+def node_item_names(n_nodes):
+    return [f"Node Item {i}" for i in range(n_nodes)]
+
+
+def _spawn_time(rng):
+    hour = rng.randint(0, 11) * 2 or 12
+    if rng.random() < 0.8:
+        return f"{hour % 12 or 12}:00 AM/PM"
+    return f"{hour % 12 or 12}:00 {rng.choice(['AM', 'PM'])}"
+
+
+def write_wiki_dumps(folder, n_nodes, n_files=2, seed=0):
+    """
+    Wiki table dumps shaped like data/timed_nodes/unspoiled_nodes.txt, with
+    n_nodes rows split across n_files pages (plus some questlink and cluster
+    rows that the parser skips). Returns the dump paths.
+    """
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    items = node_item_names(n_nodes)
+    per_file = -(-n_nodes // n_files)
+    kinds = ["Unspoiled", "Legendary", "Ephemeral", "Folklore"]
+    paths = []
+    for k in range(n_files):
+        kind = kinds[k % len(kinds)]
+        path = os.path.join(folder, f"{kind.lower()}_{k}_nodes.txt")
+        chunk = items[k * per_file:(k + 1) * per_file]
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"'''{kind} Nodes''' are timed [[gathering]] nodes.\n__TOC__\n")
+            per_section = max(1, len(chunk) // (len(CLASSES) * len(EXPANSIONS)))
+            for start in range(0, len(chunk), per_section):
+                section = start // per_section
+                if section % len(EXPANSIONS) == 0:
+                    f.write(f"=={CLASSES[(section // len(EXPANSIONS)) % len(CLASSES)]}==\n\n")
+                f.write(f"==={EXPANSIONS[section % len(EXPANSIONS)]}===\n")
+                f.write(f"Each node only lasts {rng.choice(['2', 'two', '4'])} in-game hours.\n\n")
+                f.write("{| {{STDT|sortable gathering-role align-left}}\n|-\n")
+                f.write("! Time\n! Item\n! Slot #\n! Location\n! Coordinate\n! Level\n! Star\n! Additional Info\n")
+                for item in chunk[start:start + per_section]:
+                    f.write("|-\n")
+                    extra = "[[Perception]] 1312" if rng.random() < 0.3 else ""
+                    f.write(
+                        f"|{_spawn_time(rng)} || {{{{item icon|{item}}}}} || {rng.randint(1, 8)} || "
+                        f"[[{rng.choice(ZONES)}]] || (x{rng.randint(5, 40)},y{rng.randint(5, 40)}) || "
+                        f"{rng.randint(50, 90)} || || {extra}\n"
+                    )
+                    if rng.random() < 0.02:
+                        f.write(f"|-\n|{_spawn_time(rng)} || {{{{item icon|Fire Cluster}}}} || 1 || [[Lakeland]] || (x1,y1) || 70 || ||\n")
+                    if rng.random() < 0.02:
+                        f.write(f"|-\n|{_spawn_time(rng)} || {{{{questlink|Some Quest}}}} || 1 || [[Lakeland]] || (x1,y1) || 70 || ||\n")
+                f.write("|}\n\n")
+        paths.append(path)
+    return paths
+
+
+def write_item_ids(path, n_items, names=(), seed=0):
+    """item_ids.json with every name in `names` plus filler items up to n_items."""
+    rng = random.Random(seed)
+    item_json = {}
+    next_id = 1
+    for name in names:
+        item_json[str(next_id)] = {"en": name, "de": "x", "fr": "x", "ja": "x"}
+        next_id += 1
+    while len(item_json) < n_items:
+        words = " ".join(rng.choice(["Raw", "Cut", "Aged", "Fine", "Rough", "Dark", "Pale"]) for _ in range(2))
+        item_json[str(next_id)] = {"en": f"{words} Filler {next_id}", "de": "x", "fr": "x", "ja": "x"}
+        next_id += 1
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(item_json, f)
+
+
+def write_nodes_with_ids(path, n_nodes, seed=0):
+    """final_nodes_with_ids.csv for the sorting/schedule benchmarks (IDs match write_item_ids)."""
+    rng = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["ID", "Time", "Item Name", "Location", "Coordinates"])
+        for i, name in enumerate(node_item_names(n_nodes)):
+            writer.writerow([i + 1, _spawn_time(rng), name, rng.choice(ZONES),
+                             f"(x{rng.randint(5, 40)},y{rng.randint(5, 40)})"])
+
+
+def make_dataset(root, scale="small", seed=0):
+    """Write a whole synthetic tree under root; returns {name: path} for the generated inputs."""
+    sizes = SCALES[scale]
+    utilities = os.path.join(root, "utilities")
+    data_dir = os.path.join(root, "data")
+    nodes_dir = os.path.join(data_dir, "timed_nodes")
+    os.makedirs(utilities, exist_ok=True)
+    os.makedirs(nodes_dir, exist_ok=True)
+
+    paths = {
+        "root": root,
+        "recipe_book": os.path.join(utilities, "recipe_book.csv"),
+        "recipe_gathering": os.path.join(utilities, "recipe_gathering.csv"),
+        "workshop_parts": os.path.join(utilities, "workshop_parts"),
+        "item_ids": os.path.join(utilities, "item_ids.json"),
+        "nodes_with_ids": os.path.join(nodes_dir, "final_nodes_with_ids.csv"),
+    }
+    products = write_recipe_book(paths["recipe_book"], sizes["recipes"], sizes["depth"], seed,
+                                 gathering_path=paths["recipe_gathering"])
+    write_part_csvs(paths["workshop_parts"], data_dir, products, sizes["parts"], seed)
+    paths["wiki_dumps"] = write_wiki_dumps(nodes_dir, sizes["nodes"], sizes["dumps"], seed)
+    write_item_ids(paths["item_ids"], sizes["items"], node_item_names(sizes["nodes"]), seed)
+    write_nodes_with_ids(paths["nodes_with_ids"], sizes["nodes"], seed)
+    return paths
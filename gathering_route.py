@@ -0,0 +1,395 @@
+# Time-windowed route planner for a gathering list
+import math
+import re
+import time
+from collections import Counter
+
+import pandas as pd
+
+import tracing
+from node_schedule import DEFAULT_UPTIME, ET_DAY, ET_RATIO, parse_spawn_times
+
+# Real-time cost model, in seconds; every value can be overridden per RoutePlanner.
+SECONDS_PER_UNIT = 2.5        # gathering one item, including moving between the nodes of a cluster
+SECONDS_PER_MAP_UNIT = 2.5    # mounted travel per map coordinate within a zone
+TELEPORT_SECONDS = 20         # cast plus loading screen
+TIMED_YIELD = 30              # items one visit to an unspoiled node gives before it's spent
+MAX_VISITS = 8                # visits planned per timed ingredient; the rest is left for another run
+
+# Methods that are gathered at a spot on the map; the rest (npc, drop, voyages, …) aren't routed.
+ROUTE_METHODS = ("normal", "timed node")
+
+# Real seconds per ET minute (about 2.9).
+_REAL_PER_ET_MINUTE = 60 / ET_RATIO
+# Held-Karp is used to order the stops in a zone up to this many; 2-opt above it.
+_EXACT_STOPS = 8
+
+_SPOT = re.compile(r'^\s*(?P<zone>[^(,]+?)\s*\(\s*(?P<x>\d+(?:\.\d+)?)\s*/\s*(?P<y>\d+(?:\.\d+)?)\s*\)')
+_TIMED = re.compile(
+    r'Timed at\s*(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<meridiem>am|pm)?(?P<both>\s*/\s*(?:am|pm))?',
+    re.IGNORECASE,
+)
+
+
+class Spot:
+    """Where an ingredient is gathered: zone, map coordinates and spawn minutes (empty if always up)."""
+    __slots__ = ("zone", "x", "y", "starts")
+
+    def __init__(self, zone, x, y, starts=()):
+        self.zone = zone
+        self.x = x
+        self.y = y
+        self.starts = tuple(starts)
+
+    @property
+    def timed(self):
+        return bool(self.starts)
+
+    def key(self):
+        return (self.zone, round(self.x), round(self.y), self.starts)
+
+    def __repr__(self):
+        window = "" if not self.starts else ", " + "/".join(f"{s // 60:02d}:{s % 60:02d}" for s in self.starts)
+        return f"Spot({self.zone} ({self.x:g} / {self.y:g}){window})"
+
+
+def parse_location_info(text):
+    """
+    A Spot for a gathering list Location Info cell, or None if it isn't a map location.
+
+    'The Sea of Clouds ( 35.8 / 21.4 ), Timed at 6AM/PM ET' spawns at 06:00 and
+    18:00; 'Timed at 9:00am', '10:00am/pm' and '9PM ET' are read the same way.
+    """
+    match = _SPOT.match(str(text or ""))
+    if not match:
+        return None
+    starts = ()
+    timed = _TIMED.search(text)
+    if timed:
+        minute = int(timed.group("minute") or 0)
+        if timed.group("both"):
+            starts = parse_spawn_times(f"{timed.group('hour')}:{minute:02d} AM/PM")
+        elif timed.group("meridiem"):
+            starts = parse_spawn_times(f"{timed.group('hour')}:{minute:02d} {timed.group('meridiem').upper()}")
+        else:
+            starts = parse_spawn_times(f"{timed.group('hour')}:{minute:02d}")
+    return Spot(match.group("zone").strip(), float(match.group("x")), float(match.group("y")), starts)
+
+
+def node_spots(nodes_csv):
+    """{lower-cased item name: [Spot, …]} from a timed nodes CSV (as written by assign_ids)."""
+    from item_model import NodeTable
+
+    table = NodeTable.from_csv(nodes_csv)
+    spots = {}
+    for r in table.records.tolist():
+        _, item, _, location, x, y, start, start2 = r
+        if math.isnan(x) or math.isnan(y):
+            continue
+        name = table.names[item].replace("(Rare)", "").strip().lower()
+        starts = (start,) if start2 < 0 else (start, start2)
+        spots.setdefault(name, []).append(Spot(table.names[location], x, y, starts))
+    return spots
+
+
+class _Task:
+    # One step of the route: every untimed stop in a zone (in order), or one visit to a timed node.
+    __slots__ = ("zone", "stops", "seconds", "starts", "node")
+
+    def __init__(self, zone, stops, starts=(), node=None):
+        self.zone = zone
+        self.stops = stops  # [(ingredient, x, y, quantity, gather seconds, travel seconds before)]
+        self.seconds = sum(stop[4] + stop[5] for stop in stops)
+        self.starts = starts
+        self.node = node
+
+    @property
+    def entry(self):
+        return self.stops[0][1], self.stops[0][2]
+
+    @property
+    def exit(self):
+        return self.stops[-1][1], self.stops[-1][2]
+
+
+class RoutePlanner:
+    """
+    Plans a gathering run that collects the required quantities in as few
+    real-time minutes as possible.
+
+    - Untimed ingredients are grouped by zone into one block each, and the stops
+      in a block are ordered by shortest path (exact DP for small zones, 2-opt
+      for large ones), so each zone costs one teleport.
+    - Each timed ingredient needs ceil(quantity / timed_yield) visits (at most
+      max_visits), each in a different spawn window, and a visit has to finish
+      before its node despawns.
+    - The blocks and visits are then sequenced greedily (whatever finishes
+      soonest next) and improved by local search (relocating and swapping steps)
+      until nothing improves or time_limit seconds have passed. Blocks fill the
+      time between spawns, and waiting for a window counts towards the total.
+
+    Every sequence is scored by simulating it against the Eorzean clock from `start`.
+    """
+
+    def __init__(self, seconds_per_unit=SECONDS_PER_UNIT, seconds_per_map_unit=SECONDS_PER_MAP_UNIT,
+                 teleport_seconds=TELEPORT_SECONDS, timed_yield=TIMED_YIELD, max_visits=MAX_VISITS,
+                 uptime=DEFAULT_UPTIME, time_limit=0.5):
+        self.seconds_per_unit = seconds_per_unit
+        self.seconds_per_map_unit = seconds_per_map_unit
+        self.teleport_seconds = teleport_seconds
+        self.timed_yield = timed_yield
+        self.max_visits = max_visits
+        self.uptime = uptime
+        self.time_limit = time_limit
+
+    # --- Tasks ---
+
+    def _travel(self, a, b):
+        return math.hypot(a[0] - b[0], a[1] - b[1]) * self.seconds_per_map_unit
+
+    def _order_stops(self, points):
+        # Indices of points in shortest open-path order.
+        n = len(points)
+        if n <= 2:
+            return list(range(n))
+        dist = [[self._travel(a, b) for b in points] for a in points]
+        if n <= _EXACT_STOPS:
+            # Held-Karp over subsets; best[mask][j] = (cost, previous) of a path covering mask ending at j.
+            best = [dict() for _ in range(1 << n)]
+            for j in range(n):
+                best[1 << j][j] = (0.0, -1)
+            for mask in range(1, 1 << n):
+                for j, (cost, _) in best[mask].items():
+                    for k in range(n):
+                        if mask & (1 << k):
+                            continue
+                        nxt = mask | (1 << k)
+                        candidate = cost + dist[j][k]
+                        if k not in best[nxt] or candidate < best[nxt][k][0]:
+                            best[nxt][k] = (candidate, j)
+            full = (1 << n) - 1
+            j = min(best[full], key=lambda end: best[full][end][0])
+            order, mask = [], full
+            while j >= 0:
+                order.append(j)
+                j, mask = best[mask][j][1], mask & ~(1 << j)
+            return order[::-1]
+        # Nearest neighbour from the westernmost stop, then 2-opt.
+        start = min(range(n), key=lambda i: points[i])
+        order, left = [start], set(range(n)) - {start}
+        while left:
+            nearest = min(left, key=lambda k: dist[order[-1]][k])
+            order.append(nearest)
+            left.remove(nearest)
+        improved = True
+        while improved:
+            improved = False
+            for i in range(1, n - 1):
+                for j in range(i + 1, n):
+                    before = dist[order[i - 1]][order[i]] + (dist[order[j]][order[j + 1]] if j + 1 < n else 0)
+                    after = dist[order[i - 1]][order[j]] + (dist[order[i]][order[j + 1]] if j + 1 < n else 0)
+                    if after < before - 1e-9:
+                        order[i:j + 1] = order[i:j + 1][::-1]
+                        improved = True
+        return order
+
+    def _tasks(self, chosen):
+        # chosen: [(ingredient, quantity, Spot)] -> [_Task]
+        tasks, by_zone = [], {}
+        for ingredient, quantity, spot in chosen:
+            if spot.timed:
+                left = min(quantity, self.timed_yield * self.max_visits)
+                while left > 0:
+                    take = min(left, self.timed_yield)
+                    seconds = min(take * self.seconds_per_unit, self.uptime * _REAL_PER_ET_MINUTE)
+                    tasks.append(_Task(spot.zone, [(ingredient, spot.x, spot.y, take, seconds, 0.0)],
+                                       spot.starts, node=(ingredient,) + spot.key()))
+                    left -= take
+            else:
+                by_zone.setdefault(spot.zone, []).append((ingredient, quantity, spot))
+        for zone, entries in by_zone.items():
+            points = [(spot.x, spot.y) for _, _, spot in entries]
+            stops, previous = [], None
+            for i in self._order_stops(points):
+                ingredient, quantity, spot = entries[i]
+                travel = 0.0 if previous is None else self._travel(previous, points[i])
+                stops.append((ingredient, spot.x, spot.y, quantity, quantity * self.seconds_per_unit, travel))
+                previous = points[i]
+            tasks.append(_Task(zone, stops))
+        return tasks
+
+    # --- Simulation ---
+
+    def _window(self, et, task, used):
+        # (ET minute gathering can begin, window start) for the first usable window at or after et.
+        duration = task.seconds / _REAL_PER_ET_MINUTE
+        best = None
+        for start in task.starts:
+            window = et - ((et - start) % ET_DAY)
+            while True:
+                begin = max(et, window)
+                if begin + duration <= window + self.uptime and (task.node, round(window)) not in used:
+                    break
+                window += ET_DAY
+            if best is None or begin < best[0]:
+                best = (begin, round(window))
+        return best
+
+    def _step(self, state, task, et0):
+        # State (real seconds, zone, position, windows used) after doing task, and when it was reached.
+        t, zone, position, used = state
+        t += self.teleport_seconds if task.zone != zone else self._travel(position, task.entry)
+        arrive = t
+        if task.starts:
+            begin, window = self._window(et0 + t / _REAL_PER_ET_MINUTE, task, used)
+            used = used | {(task.node, window)}
+            t = (begin - et0) * _REAL_PER_ET_MINUTE
+        return (t + task.seconds, task.zone, task.exit, used), arrive
+
+    def _states(self, sequence, et0):
+        # states[k] is the state before sequence[k]; states[-1] holds the total time.
+        states = [(0.0, None, None, frozenset())]
+        for task in sequence:
+            states.append(self._step(states[-1], task, et0)[0])
+        return states
+
+    def _finish(self, sequence, first, state, et0, bound):
+        # Total time of sequence given the state before sequence[first]; inf once it reaches bound.
+        for task in sequence[first:]:
+            state = self._step(state, task, et0)[0]
+            if state[0] >= bound:
+                return math.inf
+        return state[0]
+
+    def _rows(self, sequence, et0):
+        rows, state = [], (0.0, None, None, frozenset())
+        for task in sequence:
+            state, arrive = self._step(state, task, et0)
+            t = state[0] - task.seconds
+            wait = t - arrive
+            for ingredient, x, y, quantity, seconds, travel in task.stops:
+                t += travel
+                et = int(et0 + t / _REAL_PER_ET_MINUTE) % ET_DAY
+                rows.append({
+                    "Arrive": round((t - wait) / 60, 1), "Wait": round(max(wait, 0.0) / 60, 1),
+                    "Leave": round((t + seconds) / 60, 1), "ET": f"{et // 60:02d}:{et % 60:02d}",
+                    "Zone": task.zone, "X": x, "Y": y, "Ingredient": ingredient, "Quantity": quantity,
+                    "Method": "timed node" if task.starts else "normal",
+                })
+                t += seconds
+                wait = 0.0
+        return rows
+
+    # --- Search ---
+
+    def _greedy(self, tasks, et0):
+        # Repeatedly append whichever task would finish soonest.
+        sequence, left = [], list(tasks)
+        state = (0.0, None, None, frozenset())
+        while left:
+            steps = [self._step(state, task, et0)[0] for task in left]
+            best = min(range(len(left)), key=lambda k: steps[k][0])
+            sequence.append(left.pop(best))
+            state = steps[best]
+        return sequence
+
+    def _improve(self, sequence, et0, deadline):
+        # First-improvement local search over relocate and swap moves.
+        states = self._states(sequence, et0)
+        n = len(sequence)
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            for i in range(n):
+                for j in range(n):
+                    if i == j:
+                        continue
+                    moved = sequence[:i] + sequence[i + 1:]
+                    moved.insert(j, sequence[i])
+                    swapped = list(sequence)
+                    swapped[i], swapped[j] = swapped[j], swapped[i]
+                    first = min(i, j)
+                    for candidate in (moved, swapped):
+                        if self._finish(candidate, first, states[first], et0, states[-1][0] - 1e-6) < math.inf:
+                            sequence, states, improved = candidate, self._states(candidate, et0), True
+                            break
+                if time.perf_counter() >= deadline:
+                    break
+        return sequence
+
+    def plan(self, requirements, start=None):
+        """
+        Route rows for requirements [(ingredient, quantity, [Spot, …])], in visiting order.
+
+        Where an ingredient can be gathered at several spots, the one in the zone
+        shared with the most other ingredients is used (untimed before timed).
+        Columns: Step, Arrive, Wait, Leave (real minutes from start), ET (when
+        gathering begins), Zone, X, Y, Ingredient, Quantity, Method.
+        """
+        deadline = time.perf_counter() + self.time_limit
+        start = time.time() if start is None else start
+        et0 = start * ET_RATIO / 60
+
+        zones = Counter(zone for _, _, spots in requirements for zone in {spot.zone for spot in spots})
+        chosen = [
+            (ingredient, quantity, max(spots, key=lambda spot: (zones[spot.zone], not spot.timed)))
+            for ingredient, quantity, spots in requirements if spots and quantity > 0
+        ]
+        with tracing.stage("route.plan", items=len(chosen)):
+            tasks = self._tasks(chosen)
+            sequence = self._improve(self._greedy(tasks, et0), et0, deadline)
+            rows = self._rows(sequence, et0)
+        route = pd.DataFrame(rows, columns=["Arrive", "Wait", "Leave", "ET", "Zone", "X", "Y", "Ingredient",
+                                            "Quantity", "Method"])
+        route.insert(0, "Step", range(1, len(route) + 1))
+        return route
+
+
+def plan_gathering_route(gathering_list_csv, output_csv=None, nodes_csv=None, start=None, planner=None):
+    """
+    Plan the gathering run for a gathering list (as written by generate_gathering_list).
+
+    Rows whose Method is in ROUTE_METHODS and whose Location Info is a map
+    location are routed; nodes_csv (e.g. final_nodes_with_ids.csv) adds the
+    spawn times and spots it knows for the same items. Returns (route,
+    unrouted): the RoutePlanner.plan rows, and the gathering list rows that
+    aren't gathered on the map plus what's left of any timed ingredient
+    beyond max_visits.
+    """
+    planner = planner or RoutePlanner()
+    listing = pd.read_csv(gathering_list_csv, keep_default_na=False)
+    nodes = node_spots(nodes_csv) if nodes_csv else {}
+
+    spots, quantities = {}, {}
+    routed = pd.Series(False, index=listing.index)
+    for i, ingredient, quantity, method, info in zip(listing.index, listing["Ingredient"],
+                                                    listing["Total Quantity"], listing["Method"],
+                                                    listing["Location Info"]):
+        spot = parse_location_info(info) if method in ROUTE_METHODS else None
+        if spot is None:
+            continue
+        routed[i] = True
+        spots.setdefault(ingredient, {})[spot.key()] = spot
+        quantities[ingredient] = math.ceil(float(quantity))
+    for ingredient, by_key in spots.items():
+        for spot in nodes.get(ingredient.lower(), ()):
+            by_key.setdefault(spot.key(), spot)
+        # A timed spot from the nodes CSV supersedes the same untimed spot from the recipe data.
+        timed = {(s.zone, round(s.x), round(s.y)) for s in by_key.values() if s.timed}
+        for key in [k for k, s in by_key.items() if not s.timed and k[:3] in timed]:
+            del by_key[key]
+
+    route = planner.plan([(ingredient, quantities[ingredient], list(by_key.values()))
+                          for ingredient, by_key in spots.items()], start=start)
+    unrouted = listing[~routed & ~listing["Ingredient"].isin(spots)]
+    planned = route.groupby("Ingredient")["Quantity"].sum()
+    leftover = listing[routed].drop_duplicates("Ingredient").copy()
+    leftover["Total Quantity"] = leftover["Ingredient"].map(quantities) - leftover["Ingredient"].map(planned).fillna(0)
+    leftover = leftover[leftover["Total Quantity"] > 0]
+    if len(leftover):
+        print(f"{len(leftover)} timed ingredient(s) need more than {planner.max_visits} visits; "
+              f"the remainder is left in the unrouted list")
+        unrouted = pd.concat([unrouted, leftover]).sort_values("Ingredient")
+    if output_csv:
+        route.to_csv(output_csv, index=False)
+    return route, unrouted
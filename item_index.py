@@ -0,0 +1,240 @@
+# Memory-mapped item name -> ID index built from utilities/item_ids.json
+import difflib
+import json
+import os
+import re
+import struct
+
+import numpy as np
+import pandas as pd
+
+import tracing
+
+JSON_PATH = os.path.join("utilities", "item_ids.json")
+INDEX_PATH = os.path.join("utilities", "item_ids.idx")
+
+MAGIC = b"TNKIDX\0\0"
+INDEX_VERSION = 1
+# magic, version, exact width, exact count, token width, token count, source size, source mtime
+_HEADER = struct.Struct("<8sIIIIIQd")
+_HEADER_SIZE = 64
+
+_RARE = re.compile(r'\s*\(rare\)', re.IGNORECASE)
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def clean_item_name(name):
+    """Lower-case, strip and drop '(Rare)' so node names match the item list."""
+    return _RARE.sub('', str(name)).strip().lower()
+
+
+def clean_item_names(names):
+    """Vectorized clean_item_name over a Series (or any iterable) of names."""
+    names = pd.Series(names, dtype=object).astype(str)
+    return names.str.replace(_RARE, '', regex=True).str.strip().str.lower()
+
+
+def token_key(name):
+    """Order- and punctuation-insensitive form of a name: 'Ore, Iron' -> 'iron ore'."""
+    return " ".join(sorted(_NON_ALNUM.sub(' ', name.lower()).split()))
+
+
+def _sorted_table(pairs):
+    # pairs: {key: item_id}; returns (fixed-width key array, id array) sorted by key bytes.
+    encoded = sorted((key.encode("utf-8"), item_id) for key, item_id in pairs.items())
+    width = max((len(k) for k, _ in encoded), default=1)
+    keys = np.array([k for k, _ in encoded], dtype=f"S{width}")
+    ids = np.array([i for _, i in encoded], dtype=np.uint32)
+    return keys, ids
+
+
+@tracing.traced("item_index.build")
+def build_index(json_path=JSON_PATH, index_path=INDEX_PATH):
+    """
+    Convert item_ids.json into the binary index at index_path.
+
+    Layout: a 64-byte header, then the exact-name table (sorted fixed-width
+    names + uint32 IDs), then the token-key table used for fuzzy matches.
+    Names keep the last ID seen, as the dict built by the old code did; token
+    keys shared by different items are left out as ambiguous.
+    """
+    with open(json_path, "r", encoding="utf-8") as f:
+        item_json = json.load(f)
+
+    exact = {}
+    for item_id, names in item_json.items():
+        en_name = names.get("en", "").strip().lower()
+        if en_name:
+            exact[en_name] = int(item_id)
+
+    tokens, ambiguous = {}, set()
+    for name, item_id in exact.items():
+        key = token_key(name)
+        if key in tokens and tokens[key] != item_id:
+            ambiguous.add(key)
+        tokens[key] = item_id
+    for key in ambiguous:
+        del tokens[key]
+
+    exact_keys, exact_ids = _sorted_table(exact)
+    token_keys, token_ids = _sorted_table(tokens)
+    stat = os.stat(json_path)
+    header = _HEADER.pack(
+        MAGIC, INDEX_VERSION,
+        exact_keys.dtype.itemsize, len(exact_keys),
+        token_keys.dtype.itemsize, len(token_keys),
+        stat.st_size, stat.st_mtime,
+    )
+
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header.ljust(_HEADER_SIZE, b"\0"))
+        for array in (exact_keys, exact_ids, token_keys, token_ids):
+            f.write(array.tobytes())
+    os.replace(tmp_path, index_path)
+
+
+def _read_header(index_path):
+    with open(index_path, "rb") as f:
+        return _HEADER.unpack(f.read(_HEADER.size))
+
+
+def _is_current(json_path, index_path):
+    if not os.path.exists(index_path):
+        return False
+    try:
+        magic, version, _, _, _, _, size, mtime = _read_header(index_path)
+    except struct.error:
+        return False
+    if magic != MAGIC or version != INDEX_VERSION:
+        return False
+    stat = os.stat(json_path)
+    return size == stat.st_size and mtime == stat.st_mtime
+
+
+class ItemIndex:
+    """
+    Read-only view over the binary index. Tables are memory-mapped, so opening
+    the index costs the same however big the item list is, and lookups binary
+    search the sorted names (vectorized with numpy.searchsorted for columns).
+    """
+
+    def __init__(self, index_path=INDEX_PATH):
+        _, _, exact_width, exact_count, token_width, token_count, _, _ = _read_header(index_path)
+        offset = _HEADER_SIZE
+        tables = []
+        for width, count in ((exact_width, exact_count), (token_width, token_count)):
+            keys = np.memmap(index_path, dtype=f"S{width}", mode="r", offset=offset, shape=(count,))
+            offset += width * count
+            ids = np.memmap(index_path, dtype=np.uint32, mode="r", offset=offset, shape=(count,))
+            offset += 4 * count
+            tables.append((keys, ids))
+        (self._names, self._ids), (self._tokens, self._token_ids) = tables
+
+    @classmethod
+    def load(cls, json_path=JSON_PATH, index_path=INDEX_PATH):
+        """Open the index, (re)building it first if item_ids.json changed since it was written."""
+        if not _is_current(json_path, index_path):
+            build_index(json_path, index_path)
+        return cls(index_path)
+
+    def close(self):
+        """
+        Drop the memory-mapped tables so the index file can be rebuilt in place
+        (Windows won't replace a file that is still mapped). The index is unusable afterwards.
+        """
+        self._names = self._ids = self._tokens = self._token_ids = None
+
+    def __len__(self):
+        return len(self._names)
+
+    @staticmethod
+    def _search(keys, ids, queries):
+        # Returns a float array of IDs (NaN where a query isn't in the table).
+        width = keys.dtype.itemsize
+        result = np.full(len(queries), np.nan)
+        if not len(keys) or not queries:
+            return result
+        encoded = [q.encode("utf-8") for q in queries]
+        fits = np.array([0 < len(q) <= width for q in encoded], dtype=bool)
+        probe = np.array([q if len(q) <= width else b"" for q in encoded], dtype=f"S{width}")
+        pos = np.minimum(np.searchsorted(keys, probe), len(keys) - 1)
+        found = fits & (keys[pos] == probe)
+        result[found] = ids[pos[found]]
+        return result
+
+    def lookup(self, names, fuzzy=True, warn=True):
+        """
+        Item IDs for a column of names, as a nullable Int64 Series aligned with it.
+
+        Names are cleaned with clean_item_names first. With fuzzy=True, names
+        that miss the exact table are retried by token key, which forgives word
+        order, punctuation and spacing differences. Each such substitution is
+        printed (unless warn=False) so a wrong match can be spotted.
+        """
+        names = pd.Series(names)
+        cleaned = clean_item_names(names)
+        uniques = list(pd.unique(cleaned))
+        ids = self._search(self._names, self._ids, uniques)
+        if fuzzy:
+            missing = np.isnan(ids)
+            if missing.any():
+                retry = [token_key(uniques[i]) for i in np.flatnonzero(missing)]
+                ids[missing] = self._search(self._tokens, self._token_ids, retry)
+                if warn:
+                    for i in np.flatnonzero(missing):
+                        if not np.isnan(ids[i]):
+                            print(f"Warning: no exact ID for item '{uniques[i]}'; using {int(ids[i])} "
+                                  f"('{self.name_of(int(ids[i]))}'), matched ignoring word order and punctuation.")
+        by_name = pd.Series(ids, index=uniques)
+        return pd.Series(by_name.reindex(cleaned).to_numpy(), index=names.index).astype("Int64")
+
+    def get(self, name, fuzzy=True, warn=True):
+        """Item ID for one name, or None."""
+        item_id = self.lookup([name], fuzzy=fuzzy, warn=warn).iloc[0]
+        return None if pd.isna(item_id) else int(item_id)
+
+    def name_of(self, item_id):
+        """The (cleaned) name an ID is indexed under, or None; a linear scan, for messages."""
+        hits = np.flatnonzero(self._ids == item_id)
+        return self._names[hits[-1]].decode("utf-8") if len(hits) else None
+
+    def suggest(self, name, n=3, cutoff=0.75):
+        """
+        Close-by-edit-distance candidates [(name, id), …] for a name with no match.
+        Only names sharing the first letter are compared, which keeps this quick.
+        """
+        cleaned = clean_item_name(name)
+        if not cleaned or not len(self._names):
+            return []
+        first = cleaned[0].encode("utf-8")[:1]
+        lo = np.searchsorted(self._names, np.array([first], dtype=self._names.dtype))[0]
+        hi = np.searchsorted(self._names, np.array([first + b"\xff"], dtype=self._names.dtype))[0]
+        pool = {self._names[i].decode("utf-8"): int(self._ids[i]) for i in range(lo, hi)}
+        return [(match, pool[match]) for match in difflib.get_close_matches(cleaned, pool, n=n, cutoff=cutoff)]
+
+    def report_missing(self, names, ids):
+        """Print the usual 'No ID found' errors, with suggestions where there are any."""
+        for name, item_id in zip(names, ids):
+            if pd.isna(item_id):
+                hint = ", ".join(f"'{m}' ({i})" for m, i in self.suggest(name))
+                print(f"Error: No ID found for item '{name}' (cleaned as '{clean_item_name(name)}')."
+                      + (f" Did you mean {hint}?" if hint else ""))
+
+
+_loaded = {}
+
+def get_item_index(json_path=JSON_PATH, index_path=INDEX_PATH):
+    """Shared ItemIndex for this process, reopened only when item_ids.json changes."""
+    key = (os.path.abspath(json_path), os.path.abspath(index_path))
+    stamp = os.stat(json_path).st_mtime
+    cached = _loaded.get(key)
+    if cached is None or cached[0] != stamp:
+        tracing.count("item_index.cache_miss")
+        if cached is not None:
+            # Unmap the old index before load() rebuilds the file underneath it.
+            _loaded.pop(key)[1].close()
+        cached = _loaded[key] = (stamp, ItemIndex.load(json_path, index_path))
+    else:
+        tracing.count("item_index.cache_hit")
+    return cached[1]
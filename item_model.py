@@ -0,0 +1,336 @@
+# Compact in-memory model: interned item names, array-backed recipes, catalog and nodes
+import csv
+import re
+
+import numpy as np
+import pandas as pd
+
+from node_schedule import DEFAULT_UPTIME, ET_DAY, parse_spawn_times
+
+_COORDINATES = re.compile(r'x\s*([\d.]+)\s*,\s*y\s*([\d.]+)', re.IGNORECASE)
+
+
+class ItemNames:
+    """
+    Interns item names as consecutive integer IDs (0, 1, 2, …), so the other
+    structures here can hold int32 arrays instead of repeated strings.
+    IDs are stable for the life of the table; names are never removed.
+    """
+    __slots__ = ("names", "_ids")
+
+    def __init__(self, names=()):
+        self.names = []
+        self._ids = {}
+        for name in names:
+            self.intern(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def __getitem__(self, item_id):
+        return self.names[item_id]
+
+    def copy(self):
+        other = ItemNames()
+        other.names = list(self.names)
+        other._ids = dict(self._ids)
+        return other
+
+    def intern(self, name):
+        """ID of name, adding it if it's new."""
+        item_id = self._ids.get(name)
+        if item_id is None:
+            item_id = self._ids[name] = len(self.names)
+            self.names.append(name)
+        return item_id
+
+    def intern_many(self, names):
+        """int32 array of IDs for an iterable of names, adding new ones."""
+        return np.fromiter((self.intern(name) for name in names), dtype=np.int32)
+
+    def lookup(self, names):
+        """int32 array of IDs for names, -1 where a name isn't interned (nothing is added)."""
+        get = self._ids.get
+        return np.fromiter((get(name, -1) for name in names), dtype=np.int32)
+
+    def categorical(self, ids):
+        """IDs back to names as a pandas Categorical (no per-row strings; -1 becomes NaN)."""
+        return pd.Categorical.from_codes(np.asarray(ids), categories=pd.Index(self.names, dtype=object))
+
+
+class CompactRecipes:
+    """
+    The recipe book as offset/array adjacency (CSR) over interned names.
+
+    Products are interned first, so product IDs are 0 … n_products-1 and an ID
+    is craftable exactly when it's below n_products. The ingredients of product
+    p are edges offsets[p]:offsets[p+1] of:
+
+    - ingredient: option ID (int32); an 'A|B' cell becomes one edge per option
+    - qty: quantity of the whole cell (float64)
+    - options: number of options in the cell (uint8); a cell's options are consecutive
+    """
+
+    def __init__(self, names, n_products, offsets, ingredient, qty, options):
+        self.names = names
+        self.n_products = n_products
+        self.offsets = offsets
+        self.ingredient = ingredient
+        self.qty = qty
+        self.options = options
+        self._levels = None
+
+    @classmethod
+    def from_recipes(cls, recipes, names=None):
+        """Build from {product: [(ingredient_cell, qty), …]} as held by RecipeGraph."""
+        names = names if names is not None else ItemNames()
+        products = list(recipes)
+        if names.intern_many(products).tolist() != list(range(len(products))):
+            raise ValueError("Products must be interned first (pass a fresh or product-only ItemNames)")
+        offsets = np.zeros(len(products) + 1, dtype=np.int32)
+        ingredient, qty, options = [], [], []
+        for p, product in enumerate(products):
+            for cell, amount in recipes[product]:
+                opts = [opt.strip() for opt in str(cell).split('|')]
+                for opt in opts:
+                    ingredient.append(names.intern(opt))
+                    qty.append(amount)
+                    options.append(len(opts))
+            offsets[p + 1] = len(ingredient)
+        return cls(
+            names, len(products), offsets,
+            np.array(ingredient, dtype=np.int32),
+            np.array(qty, dtype=np.float64),
+            np.array(options, dtype=np.uint8),
+        )
+
+    @classmethod
+    def from_frame(cls, frame, names=None):
+        """Inverse of to_frame: rows of Product, Ingredient, Quantity (Ingredient may hold 'A|B')."""
+        recipes = {}
+        for product, ingredient, qty in zip(frame["Product"], frame["Ingredient"], frame["Quantity"]):
+            recipes.setdefault(product, []).append((ingredient, qty))
+        return cls.from_recipes(recipes, names)
+
+    def __len__(self):
+        return self.n_products
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.ingredient.nbytes + self.qty.nbytes + self.options.nbytes
+
+    def edge_products(self):
+        """Product ID of every edge."""
+        return np.repeat(np.arange(self.n_products, dtype=np.int32), np.diff(self.offsets))
+
+    def cells(self, product_id):
+        """[(option IDs, qty), …] for one product, in recipe order."""
+        cells = []
+        i, end = self.offsets[product_id], self.offsets[product_id + 1]
+        while i < end:
+            n = int(self.options[i])
+            cells.append((self.ingredient[i:i + n].tolist(), float(self.qty[i])))
+            i += n
+        return cells
+
+    def to_recipes(self):
+        """Back to {product: [(ingredient_cell, qty), …]}; alternatives are re-joined with '|'."""
+        return {
+            self.names[p]: [("|".join(self.names[o] for o in opts), qty) for opts, qty in self.cells(p)]
+            for p in range(self.n_products)
+        }
+
+    def to_frame(self):
+        """
+        One row per recipe cell: Product, Ingredient ('A|B' for alternatives) and Quantity.
+        Use edges_frame() for one row per option with categorical names.
+        """
+        rows = [(product, cell, qty) for product, cells in self.to_recipes().items() for cell, qty in cells]
+        return pd.DataFrame(rows, columns=["Product", "Ingredient", "Quantity"])
+
+    def edges_frame(self):
+        """One row per edge (option), with Product / Ingredient as Categoricals over the names."""
+        return pd.DataFrame({
+            "Product": self.names.categorical(self.edge_products()),
+            "Ingredient": self.names.categorical(self.ingredient),
+            "Quantity": self.qty,
+            "Options": self.options,
+        })
+
+    def levels(self):
+        """
+        Edge arrays (product IDs, ingredient IDs, share) grouped by the product's
+        depth, shallowest first. An item's depth is its longest path from a
+        top-level product, so pushing demand down level by level settles every
+        parent before its ingredients. A share is the cell quantity split evenly
+        between its options. Built once.
+        """
+        if self._levels is not None:
+            return self._levels
+        products = self.edge_products()
+        depth = np.zeros(len(self.names), dtype=np.int32)
+        for _ in range(self.n_products + 1):
+            before = depth.copy()
+            np.maximum.at(depth, self.ingredient, depth[products] + 1)
+            if np.array_equal(before, depth):
+                break
+        else:
+            raise ValueError("Recipe cycle detected")
+        share = self.qty / self.options
+        edge_depth = depth[products]
+        order = np.argsort(edge_depth, kind="stable")
+        bounds = np.flatnonzero(np.diff(edge_depth[order])) + 1
+        self._levels = [
+            (products[idx], self.ingredient[idx], share[idx])
+            for idx in np.split(order, bounds) if len(idx)
+        ]
+        return self._levels
+
+    def push_down(self, totals):
+        """
+        Propagate a demand array (n_names × n_projects, or n_names) through the
+        recipes in place: every product's demand is added to its ingredients.
+        Afterwards the rows of non-craftable IDs hold the base requirements.
+        """
+        matrix = totals if totals.ndim == 2 else totals[:, None]
+        for rows, cols, shares in self.levels():
+            np.add.at(matrix, cols, matrix[rows] * shares[:, None])
+        return totals
+
+
+class CompactCatalog:
+    """
+    The part quantities of a PartsCatalog as offset arrays: part i (catalog key
+    keys[i]) holds items item[offsets[i]:offsets[i+1]] with quantities qty[…].
+    """
+
+    def __init__(self, names, keys, offsets, item, qty):
+        self.names = names
+        self.keys = keys
+        self.offsets = offsets
+        self.item = item
+        self.qty = qty
+
+    @classmethod
+    def from_catalog(cls, catalog, names=None, keys=None):
+        """Build from a PartsCatalog (every key in catalog.keys() order unless keys is given)."""
+        names = names if names is not None else ItemNames()
+        by_key = {entry["key"]: entry["items"] for entry in catalog.entries.values()}
+        keys = list(keys) if keys is not None else catalog.keys()
+        offsets = np.zeros(len(keys) + 1, dtype=np.int32)
+        item, qty = [], []
+        for i, key in enumerate(keys):
+            for name, amount in by_key[tuple(key)].items():
+                item.append(names.intern(name))
+                qty.append(amount)
+            offsets[i + 1] = len(item)
+        return cls(names, keys, offsets, np.array(item, dtype=np.int32), np.array(qty, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.item.nbytes + self.qty.nbytes
+
+    def part_index(self):
+        """Index (into keys) of every item entry."""
+        return np.repeat(np.arange(len(self.keys), dtype=np.int32), np.diff(self.offsets))
+
+    def to_frame(self):
+        """One row per (part, item): Category, Model, Size, Component, Item, Quantity."""
+        parts = self.part_index()
+        keys = pd.DataFrame(self.keys, columns=["Category", "Model", "Size", "Component"])
+        frame = keys.iloc[parts].reset_index(drop=True)
+        frame["Item"] = self.names.categorical(self.item)
+        frame["Quantity"] = self.qty
+        return frame
+
+
+NODE_DTYPE = np.dtype([
+    ("id", np.int32),         # Universalis item ID, -1 if unknown
+    ("item", np.int32),       # interned Item Name
+    ("time", np.int32),       # interned Time label ("2:00 AM/PM", "14:00", …)
+    ("location", np.int32),   # interned Location
+    ("x", np.float32),
+    ("y", np.float32),
+    ("start", np.int16),      # first spawn, ET minute of the day
+    ("start2", np.int16),     # second spawn for AM/PM nodes, else -1
+])
+
+
+class NodeTable:
+    """
+    Timed nodes as one NODE_DTYPE structured array (28 bytes a node), with
+    names, times and locations interned in a shared ItemNames table.
+    """
+
+    def __init__(self, records, names):
+        self.records = records
+        self.names = names
+
+    @classmethod
+    def from_rows(cls, rows, names=None):
+        """Build from dicts with ID, Time, Item Name, Location and Coordinates (as the nodes CSVs)."""
+        names = names if names is not None else ItemNames()
+        rows = list(rows)
+        records = np.zeros(len(rows), dtype=NODE_DTYPE)
+        for i, row in enumerate(rows):
+            try:
+                item_id = int(float(row.get("ID")))
+            except (TypeError, ValueError):
+                item_id = -1
+            starts = parse_spawn_times(str(row["Time"]))
+            match = _COORDINATES.search(str(row.get("Coordinates") or ""))
+            records[i] = (
+                item_id,
+                names.intern(row["Item Name"]),
+                names.intern(row["Time"]),
+                names.intern(row.get("Location") or ""),
+                float(match.group(1)) if match else np.nan,
+                float(match.group(2)) if match else np.nan,
+                starts[0],
+                starts[1] if len(starts) > 1 else -1,
+            )
+        return cls(records, names)
+
+    @classmethod
+    def from_csv(cls, filename, names=None):
+        with open(filename, newline='', encoding='utf-8') as f:
+            return cls.from_rows(csv.DictReader(f), names)
+
+    @classmethod
+    def from_frame(cls, frame, names=None):
+        return cls.from_rows(frame.to_dict("records"), names)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def nbytes(self):
+        return self.records.nbytes
+
+    def to_frame(self):
+        """Back to the nodes CSV layout: ID, Time, Item Name, Location, Coordinates."""
+        r = self.records
+        coordinates = [
+            f"(x{x:g},y{y:g})" if not (np.isnan(x) or np.isnan(y)) else ""
+            for x, y in zip(r["x"].tolist(), r["y"].tolist())
+        ]
+        return pd.DataFrame({
+            "ID": pd.Series(r["id"]).where(r["id"] >= 0).astype("Int64"),
+            "Time": self.names.categorical(r["time"]).astype(object),
+            "Item Name": self.names.categorical(r["item"]).astype(object),
+            "Location": self.names.categorical(r["location"]).astype(object),
+            "Coordinates": coordinates,
+        })
+
+    def active_mask(self, et_minute, uptime=DEFAULT_UPTIME):
+        """Boolean mask of nodes up at et_minute (either spawn window)."""
+        now = et_minute % ET_DAY
+        r = self.records
+        up = ((now - r["start"]) % ET_DAY) < uptime
+        return up | ((r["start2"] >= 0) & (((now - r["start2"]) % ET_DAY) < uptime))
@@ -0,0 +1,193 @@
+# Shared Universalis market client used by timed_nodes and workshop_items
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+import tracing
+
+UNIVERSALIS_API = "https://universalis.app/api/v2"
+
+# Market values pulled from each aggregated result.
+MARKET_COLUMNS = [
+    "minListing_world",
+    "minListing_dc",
+    "recentPurchase_world",
+    "recentPurchase_dc",
+    "averageSalePrice_dc",
+    "dailySaleVelocity_dc",
+]
+
+# The aggregated endpoint accepts at most 100 item IDs per request.
+MAX_BATCH_SIZE = 100
+
+
+def extract_market_fields(result):
+    """Pull the MARKET_COLUMNS values out of one aggregated-endpoint result."""
+    nq = result.get("nq", {})
+    return {
+        "minListing_world": nq.get("minListing", {}).get("world", {}).get("price"),
+        "minListing_dc": nq.get("minListing", {}).get("dc", {}).get("price"),
+        "recentPurchase_world": nq.get("recentPurchase", {}).get("world", {}).get("price"),
+        "recentPurchase_dc": nq.get("recentPurchase", {}).get("dc", {}).get("price"),
+        "averageSalePrice_dc": nq.get("averageSalePrice", {}).get("dc", {}).get("price"),
+        "dailySaleVelocity_dc": nq.get("dailySaleVelocity", {}).get("dc", {}).get("quantity"),
+    }
+
+
+def empty_market_fields():
+    return {col: None for col in MARKET_COLUMNS}
+
+
+def normalize_item_id(item_id):
+    """Turn CSV/JSON item IDs (12345, 12345.0, "12345") into an int, or None if missing."""
+    if item_id is None or pd.isna(item_id):
+        return None
+    try:
+        return int(float(item_id))
+    except (TypeError, ValueError):
+        return None
+
+
+class _RateLimiter:
+    """Spaces request starts so no more than `rate` begin per second across all threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class MarketClient:
+    """
+    Connection-pooled client for the Universalis aggregated endpoint.
+
+    Item IDs are batched (up to 100 per request) and batches are fetched
+    concurrently, with request starts capped at `rate_limit` per second.
+    Connection errors, 429s and 5xx responses are retried with exponential
+    backoff. `base_url` can point at a local stub server for testing (see
+    benchmarks/checks.py).
+    """
+
+    def __init__(self, world="Seraph", base_url=UNIVERSALIS_API, batch_size=MAX_BATCH_SIZE,
+                 max_workers=4, rate_limit=20, retries=3, backoff=0.5, timeout=10):
+        self.world = world
+        self.base_url = base_url.rstrip("/")
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.requests_made = 0
+        self._limiter = _RateLimiter(rate_limit)
+        self._counter_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _get(self, url):
+        """GET with retries; returns the parsed JSON or None after the last failed attempt."""
+        for attempt in range(self.retries + 1):
+            self._limiter.wait()
+            with self._counter_lock:
+                self.requests_made += 1
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                tracing.latency("http.universalis", time.perf_counter() - start, status=response.status_code)
+                if response.status_code == 200:
+                    return response.json()
+                retryable = response.status_code == 429 or response.status_code >= 500
+                error = f"status code {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout, ValueError) as e:
+                if not isinstance(e, ValueError):  # bad JSON was already timed above
+                    tracing.latency("http.universalis", time.perf_counter() - start, error=type(e).__name__)
+                retryable = True
+                error = str(e)
+            if not retryable or attempt == self.retries:
+                print(f"Error fetching {url}: {error}")
+                return None
+            tracing.count("http.retry")
+            time.sleep(self.backoff * (2 ** attempt))
+        return None
+
+    def _fetch_batch(self, item_ids):
+        # (found, failed): failed lists the IDs whose request didn't succeed, even after retries.
+        url = f"{self.base_url}/aggregated/{self.world}/{','.join(str(i) for i in item_ids)}"
+        data = self._get(url)
+        if data is None:
+            return {}, list(item_ids)
+        found = {}
+        for result in data.get("results", []):
+            item_id = normalize_item_id(result.get("itemId"))
+            if item_id is not None:
+                found[item_id] = extract_market_fields(result)
+        for item_id in item_ids:
+            if item_id not in found:
+                print(f"No results found for item ID {item_id}")
+                found[item_id] = empty_market_fields()
+        return found, []
+
+    def fetch_with_failures(self, item_ids):
+        """
+        Like fetch, but returns (market, failed): market only holds the items
+        Universalis answered for (None values where it has no data), and failed
+        the IDs whose request failed, so callers that cache results can skip them.
+        """
+        ids = [normalize_item_id(i) for i in item_ids]
+        ids = list(dict.fromkeys(i for i in ids if i is not None))
+        batches = [ids[i:i + self.batch_size] for i in range(0, len(ids), self.batch_size)]
+
+        market, failed = {}, []
+        if len(batches) <= 1 or self.max_workers <= 1:
+            results = map(self._fetch_batch, batches)
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                results = list(pool.map(self._fetch_batch, batches))
+        for found, missed in results:
+            market.update(found)
+            failed.extend(missed)
+        return market, failed
+
+    def fetch(self, item_ids):
+        """
+        Fetch market data for many items at once.
+
+        Returns {item_id: {column: value}} for every valid ID given; items with
+        no data (or whose request failed) map to None values.
+        """
+        market, failed = self.fetch_with_failures(item_ids)
+        for item_id in failed:
+            market[item_id] = empty_market_fields()
+        return market
+
+    def fetch_one(self, item_id):
+        """Market data for a single item."""
+        item_id = normalize_item_id(item_id)
+        if item_id is None:
+            return empty_market_fields()
+        return self.fetch([item_id])[item_id]
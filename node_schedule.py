@@ -0,0 +1,212 @@
+# Spawn-window index for timed nodes (standard library only; numpy is loaded on demand)
+import bisect
+import csv
+import os
+import re
+import time
+
+# One Eorzean day is 1440 ET minutes; ET runs 3600/175 times faster than real time.
+ET_DAY = 1440
+ET_RATIO = 20.571428571428573
+
+# Unspoiled/legendary nodes stay up for 2 ET hours.
+DEFAULT_UPTIME = 120
+
+_AMBIGUOUS = re.compile(r'\s*AM/PM', re.IGNORECASE)
+_MERIDIEM = re.compile(r'^(\d{1,2}):(\d{2})\s*(AM|PM)$', re.IGNORECASE)
+_CLOCK = re.compile(r'^(\d{1,2}):(\d{2})$')
+
+
+def eorzea_minute(real_seconds=None):
+    """Minute of the Eorzean day (0-1439) at a real Unix time (default: now)."""
+    if real_seconds is None:
+        real_seconds = time.time()
+    epoch = int(real_seconds * 1000) * ET_RATIO
+    return int(epoch // 60000) % ET_DAY
+
+
+def eorzea_minutes(real_seconds):
+    """Vectorized eorzea_minute: array of real Unix times -> array of ET minutes of day."""
+    import numpy as np
+    epoch = np.floor(np.asarray(real_seconds, dtype=float) * 1000) * ET_RATIO
+    return (np.floor_divide(epoch, 60000) % ET_DAY).astype(np.int64)
+
+
+def eorzea_epoch_minutes(real_seconds):
+    """Vectorized real Unix time -> absolute ET minutes since the epoch (float)."""
+    import numpy as np
+    return np.asarray(real_seconds, dtype=float) * ET_RATIO / 60
+
+
+def real_seconds_from_eorzea(et_minutes):
+    """Inverse of eorzea_epoch_minutes: absolute ET minutes -> real Unix seconds."""
+    import numpy as np
+    return np.asarray(et_minutes, dtype=float) * 60 / ET_RATIO
+
+
+def parse_spawn_times(time_str):
+    """
+    Spawn minutes of the ET day for a Time cell.
+
+    '2:00 AM/PM' (or '2:00AM/PM') spawns twice a day; '9:00 AM', '5:00 PM' and
+    '14:00' spawn once. '12:00 AM/PM' means 00:00 and 12:00.
+    """
+    time_str = time_str.strip()
+    if "AM/PM" in time_str.upper():
+        match = _CLOCK.match(_AMBIGUOUS.sub('', time_str).strip())
+        if not match:
+            raise ValueError(f"Unrecognised node time '{time_str}'")
+        hour, minute = int(match.group(1)) % 12, int(match.group(2))
+        return [hour * 60 + minute, (hour + 12) * 60 + minute]
+    match = _MERIDIEM.match(time_str)
+    if match:
+        hour = int(match.group(1)) % 12 + (12 if match.group(3).upper() == "PM" else 0)
+        return [hour * 60 + int(match.group(2))]
+    match = _CLOCK.match(time_str)
+    if match:
+        return [int(match.group(1)) * 60 + int(match.group(2))]
+    raise ValueError(f"Unrecognised node time '{time_str}'")
+
+
+class NodeWindow:
+    """One spawn window of one node: [start, start + duration) in ET minutes of the day."""
+    __slots__ = ("start", "duration", "row")
+
+    def __init__(self, start, duration, row):
+        self.start = start
+        self.duration = duration
+        self.row = row  # the node's CSV fields (ID, Time, Item Name, Location, Coordinates)
+
+    @property
+    def end(self):
+        return self.start + self.duration
+
+    def __repr__(self):
+        return f"NodeWindow({self.start // 60:02d}:{self.start % 60:02d}+{self.duration}, {self.row.get('Item Name')!r})"
+
+
+class NodeSchedule:
+    """
+    Every node's spawn windows as integer ET minutes, sorted by start time and
+    then item name, so windows starting the same minute always come out in the
+    same order whatever the file order.
+
+    Starts are kept for three consecutive days (yesterday, today, tomorrow) so
+    that windows wrapping past midnight are found with a plain binary search.
+    """
+
+    def __init__(self, windows):
+        self.windows = sorted(windows, key=lambda w: (w.start, str(w.row.get("Item Name", ""))))
+        self.max_duration = max((w.duration for w in self.windows), default=0)
+        self._starts = []
+        self._unrolled = []
+        for day in (-1, 0, 1):
+            for w in self.windows:
+                self._starts.append(w.start + day * ET_DAY)
+                self._unrolled.append(w)
+
+    @classmethod
+    def from_rows(cls, rows, uptime=DEFAULT_UPTIME):
+        """Build from dicts with a 'Time' field; AM/PM rows become two windows."""
+        windows = []
+        for row in rows:
+            for start in parse_spawn_times(row["Time"]):
+                windows.append(NodeWindow(start, uptime, row))
+        return cls(windows)
+
+    @classmethod
+    def from_csv(cls, filename, uptime=DEFAULT_UPTIME):
+        """Build from final_nodes_with_ids.csv (read with the csv module, no pandas)."""
+        with open(filename, newline='', encoding='utf-8') as f:
+            return cls.from_rows(list(csv.DictReader(f)), uptime)
+
+    def __len__(self):
+        return len(self.windows)
+
+    def _occurrences(self, lo, hi):
+        # (absolute start, window) for starts in [lo, hi), lo/hi within [-1440, 2880),
+        # already in start order because the unrolled starts are sorted.
+        i = bisect.bisect_left(self._starts, lo)
+        j = bisect.bisect_left(self._starts, hi)
+        return list(zip(self._starts[i:j], self._unrolled[i:j]))
+
+    def active_at(self, et_minute):
+        """[(minutes_left, window)] for windows up at et_minute, soonest to close first."""
+        now = et_minute % ET_DAY
+        active = [
+            (start + w.duration - now, w)
+            for start, w in self._occurrences(now - self.max_duration + 1, now + 1)
+            if start + w.duration > now
+        ]
+        return sorted(active, key=lambda pair: pair[0])
+
+    def spawning_within(self, et_minute, minutes):
+        """[(minutes_until, window)] for windows starting in the next `minutes` ET minutes."""
+        now = et_minute % ET_DAY
+        minutes = min(minutes, ET_DAY)
+        return [(start - now, w) for start, w in self._occurrences(now + 1, now + minutes + 1)]
+
+    def overlapping(self, t0, t1):
+        """
+        [(start, window)] for windows overlapping [t0, t1) ET minutes. t0 is taken
+        modulo a day and t1 may run past midnight (t1 - t0 <= 1440). Starts are
+        relative to the same day as t0, so they can be negative or >= 1440.
+        """
+        length = min(t1 - t0, ET_DAY)
+        t0 %= ET_DAY
+        t1 = t0 + length
+        seen, found = set(), []
+        for start, w in self._occurrences(t0 - self.max_duration + 1, t1):
+            if start + w.duration > t0 and (id(w), start % ET_DAY) not in seen:
+                seen.add((id(w), start % ET_DAY))
+                found.append((start, w))
+        return found
+
+    def upcoming(self, et_minute, since=50, limit=None):
+        """
+        [(time_diff, window)] ordered like sort_for_current_time: windows that
+        spawned at most `since` minutes ago or spawn within the next 12 ET
+        hours, soonest first (same-minute ties by item name).
+        """
+        now = et_minute % ET_DAY
+        found = [(start - now, w) for start, w in self._occurrences(now - since, now + 720)]
+        return found[:limit] if limit is not None else found
+
+    def forecast(self, real_start, real_end):
+        """
+        Every spawn between two real Unix times, computed in one vectorized pass.
+
+        Returns a list of (real_spawn_seconds, real_despawn_seconds, window),
+        sorted by spawn time; windows already up at real_start are included.
+        """
+        import numpy as np
+        if not self.windows:
+            return []
+        e0, e1 = eorzea_epoch_minutes([real_start, real_end])
+        starts = np.array([w.start for w in self.windows], dtype=float)
+        durations = np.array([w.duration for w in self.windows], dtype=float)
+        first_day = np.floor((e0 - self.max_duration) / ET_DAY)
+        days = np.arange(first_day, np.floor(e1 / ET_DAY) + 1)
+        spawn = days[None, :] * ET_DAY + starts[:, None]
+        despawn = spawn + durations[:, None]
+        hit = (spawn < e1) & (despawn > e0)
+        node_idx, day_idx = np.nonzero(hit)
+        spawn_real = real_seconds_from_eorzea(spawn[node_idx, day_idx])
+        despawn_real = real_seconds_from_eorzea(despawn[node_idx, day_idx])
+        order = np.argsort(spawn_real, kind="stable")
+        return [
+            (float(spawn_real[k]), float(despawn_real[k]), self.windows[node_idx[k]])
+            for k in order
+        ]
+
+
+_loaded = {}
+
+def load_node_schedule(filename, uptime=DEFAULT_UPTIME):
+    """NodeSchedule for a nodes CSV, rebuilt only when the file changes."""
+    key = (os.path.abspath(filename), uptime)
+    stamp = os.path.getmtime(filename)
+    cached = _loaded.get(key)
+    if cached is None or cached[0] != stamp:
+        cached = _loaded[key] = (stamp, NodeSchedule.from_csv(filename, uptime))
+    return cached[1]
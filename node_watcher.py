@@ -0,0 +1,288 @@
+# Resident asyncio watcher that announces upcoming timed-node spawns
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+import sys
+import time
+
+from node_schedule import ET_DAY, ET_RATIO, load_node_schedule
+
+NODES_CSV = os.path.join("data", "timed_nodes", "final_nodes_with_ids.csv")
+
+# Real seconds per ET minute.
+ET_MINUTE_SECONDS = 60 / ET_RATIO
+
+
+# --- Clocks ---
+
+class RealClock:
+    def time(self):
+        return time.time()
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(max(0.0, seconds))
+
+
+class FakeClock:
+    """
+    Manually driven clock for tests: sleep() only returns once advance() moves
+    time past its wake-up point, so a whole ET day can be replayed instantly.
+    """
+
+    def __init__(self, start=0.0, settle_timeout=1.0):
+        self.now = start
+        self.settle_timeout = settle_timeout
+        self._sleepers = []
+        self._order = itertools.count()
+        self._slept = None
+
+    def time(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (self.now + max(0.0, seconds), next(self._order), future))
+        if self._slept is not None:
+            self._slept.set()
+        await future
+
+    async def advance(self, seconds):
+        """
+        Move time forward, waking sleepers in order. After each wake-up this waits
+        (up to settle_timeout real seconds) for the woken task to go back to sleep,
+        so work it hands to threads finishes before time moves on.
+        """
+        target = self.now + seconds
+        self._slept = asyncio.Event()
+        await asyncio.sleep(0)
+        while self._sleepers and self._sleepers[0][0] <= target:
+            wake, _, future = heapq.heappop(self._sleepers)
+            self.now = max(self.now, wake)
+            if future.done():
+                continue
+            self._slept.clear()
+            future.set_result(None)
+            try:
+                await asyncio.wait_for(self._slept.wait(), self.settle_timeout)
+            except asyncio.TimeoutError:
+                pass
+        self.now = target
+
+
+# --- Subscribers ---
+
+class StdoutSubscriber:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    async def send(self, event):
+        price = (event.get("prices") or {}).get("minListing_world")
+        price_text = f", {price} gil" if price is not None else ""
+        self.stream.write(
+            f"[ET {event['spawn_et']}] {event['item']} @ {event['location']} {event['coordinates']} "
+            f"spawns in {event['minutes_until']} ET min (~{event['real_seconds_until'] / 60:.1f} real min){price_text}\n"
+        )
+        self.stream.flush()
+
+    async def close(self):
+        pass
+
+
+class JsonLinesSubscriber:
+    """Appends one JSON object per event to a file."""
+
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+
+    async def send(self, event):
+        self.file.write(json.dumps(event) + "\n")
+        self.file.flush()
+
+    async def close(self):
+        self.file.close()
+
+
+class SocketSubscriber:
+    """Local TCP server that streams JSON-lines events to every connected client."""
+
+    def __init__(self, host="127.0.0.1", port=8765):
+        self.host = host
+        self.port = port
+        self.server = None
+        self.writers = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._on_connect, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def _on_connect(self, reader, writer):
+        self.writers.add(writer)
+
+    async def send(self, event):
+        line = (json.dumps(event) + "\n").encode("utf-8")
+        for writer in list(self.writers):
+            try:
+                writer.write(line)
+                await writer.drain()
+            except (ConnectionError, OSError):
+                self.writers.discard(writer)
+
+    async def close(self):
+        for writer in self.writers:
+            writer.close()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+# --- Watcher ---
+
+class NodeWatcher:
+    """
+    Keeps the node schedule (and optionally prices) in memory and wakes on each
+    Eorzean hour boundary, when timed nodes spawn, to announce every window
+    starting within the next `lead` ET minutes.
+
+    - schedule: a NodeSchedule
+    - market: anything with fetch(item_ids) -> {item_id: {field: value}}, e.g. a
+      CachedMarketClient; fetched on a worker thread so the loop never blocks
+      and kept in memory for price_ttl real seconds
+    - clock: RealClock() or FakeClock() for tests
+    """
+
+    def __init__(self, schedule, subscribers, market=None, clock=None, lead=60, skip_rarefied=True, price_ttl=300):
+        self.schedule = schedule
+        self.subscribers = list(subscribers)
+        self.market = market
+        self.clock = clock or RealClock()
+        self.lead = lead
+        self.skip_rarefied = skip_rarefied
+        self.price_ttl = price_ttl
+        self.prices = {}
+        self._priced_at = {}
+        self._announced = set()
+        self._stopped = asyncio.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _et_now(self):
+        # Absolute ET minutes since the epoch, as a float.
+        return self.clock.time() * 1000 * ET_RATIO / 60000
+
+    async def _refresh_prices(self, windows):
+        if self.market is None:
+            return
+        now = self.clock.time()
+        ids = {w.row.get("ID") for w in windows if w.row.get("ID")}
+        missing = [i for i in ids if i not in self.prices or now - self._priced_at[i] >= self.price_ttl]
+        if missing:
+            fetched = await asyncio.to_thread(self.market.fetch, missing)
+            for item_id in missing:
+                self.prices[item_id] = fetched.get(int(float(item_id)))
+                self._priced_at[item_id] = now
+
+    async def check(self):
+        """Announce windows spawning within `lead` ET minutes that haven't been announced yet."""
+        et_abs = self._et_now()
+        now = int(et_abs)
+        due = []
+        # Ask from one minute back so windows starting this very minute are included.
+        for minutes_until, window in self.schedule.spawning_within(now - 1, self.lead + 1):
+            if self.skip_rarefied and "rarefied" in window.row.get("Item Name", "").lower():
+                continue
+            spawn_abs = now + minutes_until - 1
+            if (id(window), spawn_abs) in self._announced:
+                continue
+            self._announced.add((id(window), spawn_abs))
+            due.append((spawn_abs, window))
+
+        await self._refresh_prices([w for _, w in due])
+        events = []
+        for spawn_abs, window in due:
+            minutes_until = spawn_abs - now
+            events.append({
+                "event": "spawn_soon",
+                "id": window.row.get("ID"),
+                "item": window.row.get("Item Name"),
+                "location": window.row.get("Location"),
+                "coordinates": window.row.get("Coordinates"),
+                "spawn_et": f"{window.start // 60:02d}:{window.start % 60:02d}",
+                "minutes_until": minutes_until,
+                "real_seconds_until": round((spawn_abs - et_abs) * ET_MINUTE_SECONDS, 1),
+                "uptime_minutes": window.duration,
+                "prices": self.prices.get(window.row.get("ID")),
+            })
+        for event in events:
+            for subscriber in self.subscribers:
+                await subscriber.send(event)
+
+        # Forget announcements for spawns that are long past.
+        self._announced = {a for a in self._announced if a[1] > now - ET_DAY}
+        return events
+
+    def seconds_to_next_hour(self):
+        et_abs = self._et_now()
+        next_hour = (math.floor(et_abs / 60) + 1) * 60
+        return (next_hour - et_abs) * ET_MINUTE_SECONDS
+
+    async def run(self, until=None):
+        """Check now, then on every ET hour boundary until stop() or the real time `until`."""
+        while not self._stopped.is_set():
+            await self.check()
+            if until is not None and self.clock.time() >= until:
+                break
+            delay = self.seconds_to_next_hour()
+            if until is not None:
+                delay = min(delay, until - self.clock.time())
+            sleeper = asyncio.ensure_future(self.clock.sleep(delay + 0.001))
+            stopper = asyncio.ensure_future(self._stopped.wait())
+            await asyncio.wait({sleeper, stopper}, return_when=asyncio.FIRST_COMPLETED)
+            for task in (sleeper, stopper):
+                task.cancel()
+        for subscriber in self.subscribers:
+            await subscriber.close()
+
+
+async def _main(args):
+    schedule = load_node_schedule(args.nodes)
+    subscribers = [StdoutSubscriber()]
+    if args.jsonl:
+        subscribers.append(JsonLinesSubscriber(args.jsonl))
+    if args.port:
+        socket_subscriber = SocketSubscriber(port=args.port)
+        await socket_subscriber.start()
+        subscribers.append(socket_subscriber)
+    market = None
+    if not args.no_prices:
+        from price_cache import CachedMarketClient
+        market = CachedMarketClient(world=args.world, stale_while_revalidate=True)
+    watcher = NodeWatcher(schedule, subscribers, market=market, lead=args.lead)
+    try:
+        await watcher.run()
+    finally:
+        if market is not None:
+            market.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream upcoming timed-node spawns.")
+    parser.add_argument("--nodes", default=NODES_CSV, help="nodes CSV with IDs")
+    parser.add_argument("--lead", type=int, default=60, help="announce spawns this many ET minutes ahead")
+    parser.add_argument("--jsonl", help="also append events to this JSON-lines file")
+    parser.add_argument("--port", type=int, help="also serve events on this local TCP port")
+    parser.add_argument("--world", default="Seraph")
+    parser.add_argument("--no-prices", action="store_true", help="don't attach market prices")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# Indexed catalog of the part CSVs under data/
+import hashlib
+import json
+import os
+
+DATA_DIR = "data"
+INDEX_PATH = os.path.join("utilities", "parts_catalog.json")
+INDEX_VERSION = 1
+
+# Folders under data/ that hold something other than workshop part lists.
+SKIP_DIRS = {"timed_nodes"}
+
+# Categories where every part file is a complete build on its own.
+STANDALONE_CATEGORIES = {"aetherial_wheels"}
+
+
+def parse_part_file(filepath):
+    """Read an 'item,quantity' part CSV into {item: quantity}, skipping unreadable lines."""
+    items = {}
+    with open(filepath, encoding='utf-8') as f:
+        for line in f:
+            parts = line.strip().split(',', 1)
+            if len(parts) == 2:
+                try:
+                    items[parts[0].strip()] = items.get(parts[0].strip(), 0) + int(parts[1])
+                except ValueError:
+                    continue
+    return items
+
+
+def catalog_key(relpath):
+    """
+    Map a part file path (relative to data/) to (category, model, size, component).
+
+    - airships/bronco_type/bronco_type_hull_parts.csv  -> ("airships", "bronco_type", None, "hull")
+    - estates/cafe/large/cafe_large_door.csv           -> ("estates", "cafe", "large", "door")
+    - aetherial_wheels/ii/g2_capacity_wheel.csv        -> ("aetherial_wheels", "ii", None, "g2_capacity_wheel")
+
+    Returns None for paths that don't follow the layout.
+    """
+    parts = relpath.replace(os.sep, "/").split("/")
+    if len(parts) == 3:
+        category, model, filename = parts
+        size = None
+    elif len(parts) == 4:
+        category, model, size, filename = parts
+    else:
+        return None
+
+    component = os.path.splitext(filename)[0]
+    for prefix in (model, size):
+        if prefix and component.startswith(prefix + "_"):
+            component = component[len(prefix) + 1:]
+    if component.endswith("_parts"):
+        component = component[:-len("_parts")]
+    return (category, model, size, component)
+
+
+def _key_path(key):
+    return "/".join(v for v in key if v)
+
+
+def build_name(key):
+    """
+    Name of the build a part belongs to: "airships/bronco_type" for an airship
+    component, "estates/shirogane/large" for an estate part, and the full path
+    for standalone parts such as "aetherial_wheels/ii/g2_capacity_wheel".
+    """
+    if key[0] in STANDALONE_CATEGORIES:
+        return _key_path(key)
+    return _key_path(key[:3])
+
+
+class PartsCatalog:
+    """
+    On-disk index of every part CSV in data/, keyed by (category, model, size, component).
+
+    Each entry keeps the file's mtime, size and content hash next to its item
+    quantities, so refresh() only re-reads files that changed since the index
+    was written. Totalling a build is then a dictionary lookup.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, index_path=INDEX_PATH):
+        self.data_dir = data_dir
+        self.index_path = index_path
+        self.entries = {}  # relpath -> {"key", "mtime", "size", "hash", "items"}
+
+    @classmethod
+    def load(cls, data_dir=DATA_DIR, index_path=INDEX_PATH):
+        """Load the saved index (if any), bring it up to date and save it back when it changed."""
+        catalog = cls(data_dir, index_path)
+        if index_path and os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("version") == INDEX_VERSION:
+                catalog.entries = {
+                    relpath: dict(entry, key=tuple(entry["key"]))
+                    for relpath, entry in saved["entries"].items()
+                }
+        if catalog.refresh() and index_path:
+            catalog.save()
+        return catalog
+
+    def refresh(self):
+        """
+        Rescan data/, re-reading only new files and files whose mtime or size changed.
+        Files with a new mtime but identical contents keep their parsed items.
+
+        Returns the number of index entries added, updated or removed.
+        """
+        changed = 0
+        seen = set()
+        for root, dirs, files in os.walk(self.data_dir):
+            dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+            for filename in sorted(files):
+                if not filename.endswith(".csv"):
+                    continue
+                path = os.path.join(root, filename)
+                relpath = os.path.relpath(path, self.data_dir).replace(os.sep, "/")
+                key = catalog_key(relpath)
+                if key is None:
+                    continue
+                seen.add(relpath)
+
+                stat = os.stat(path)
+                entry = self.entries.get(relpath)
+                if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                    continue
+                with open(path, "rb") as f:
+                    digest = hashlib.sha1(f.read()).hexdigest()
+                if entry is None or entry["hash"] != digest:
+                    entry = {"key": key, "hash": digest, "items": parse_part_file(path)}
+                entry.update(mtime=stat.st_mtime, size=stat.st_size)
+                self.entries[relpath] = entry
+                changed += 1
+
+        for relpath in set(self.entries) - seen:
+            del self.entries[relpath]
+            changed += 1
+        return changed
+
+    def save(self):
+        """Write the index atomically to index_path."""
+        directory = os.path.dirname(self.index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "entries": self.entries}, f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+
+    def keys(self):
+        return sorted(
+            (entry["key"] for entry in self.entries.values()),
+            key=lambda k: tuple("" if v is None else v for v in k),
+        )
+
+    def select(self, pattern):
+        """
+        Keys matching a pattern, which is either
+        - a tuple (category, model, size, component) where missing/None fields match anything, or
+        - a path prefix such as "estates/shirogane/large" or "airships/bronco_type".
+        """
+        if isinstance(pattern, str):
+            prefix = pattern.strip("/")
+            return [
+                key for key in self.keys()
+                if _key_path(key) == prefix or _key_path(key).startswith(prefix + "/")
+            ]
+        pattern = tuple(pattern) + (None,) * (4 - len(pattern))
+        return [
+            key for key in self.keys()
+            if all(want is None or want == have for want, have in zip(pattern, key))
+        ]
+
+    def items(self, key):
+        """Item quantities for a single (category, model, size, component) key."""
+        for entry in self.entries.values():
+            if entry["key"] == tuple(key):
+                return dict(entry["items"])
+        raise KeyError(key)
+
+    def totals(self, patterns):
+        """
+        Sum item quantities over every key matched by the given patterns, e.g.
+        totals(["estates/shirogane/large", "airships/bronco_type"]).
+        Each matched part is counted once even if several patterns select it.
+        """
+        wanted = set()
+        for pattern in patterns:
+            matched = self.select(pattern)
+            if not matched:
+                print(f"Warning: no catalog entries match {pattern!r}")
+            wanted.update(matched)
+
+        totals = {}
+        for entry in self.entries.values():
+            if entry["key"] in wanted:
+                for item, qty in entry["items"].items():
+                    totals[item] = totals.get(item, 0) + qty
+        return totals
@@ -0,0 +1,308 @@
+# Declarative runner for the node and workshop pipelines that skips unchanged stages
+import hashlib
+import importlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import tracing
+from parts_catalog import SKIP_DIRS
+
+STATE_PATH = os.path.join("utilities", "pipeline_state.json")
+STATE_VERSION = 1
+
+
+class Stage:
+    """
+    One step of a pipeline: func(*args, **params), reading `inputs` and writing `outputs`.
+
+    - func: a callable, or "module:function" so the module is only imported when the stage runs
+    - inputs: files or folders the stage reads; a stage runs after whichever stages write them
+    - outputs: files the stage writes
+    - always: rerun every time (for stages whose result depends on the clock)
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), args=(), params=None, always=False):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.args = tuple(args)
+        self.params = dict(params or {})
+        self.always = always
+
+    def __repr__(self):
+        return f"Stage({self.name!r})"
+
+    def resolve(self):
+        if callable(self.func):
+            return self.func
+        module, _, attr = self.func.partition(":")
+        return getattr(importlib.import_module(module), attr)
+
+    def describe(self):
+        # Everything about the call except input contents, for the stage key.
+        func = self.func if isinstance(self.func, str) else f"{self.func.__module__}:{self.func.__qualname__}"
+        return json.dumps([func, [repr(a) for a in self.args], sorted((k, repr(v)) for k, v in self.params.items()),
+                           self.outputs])
+
+
+class Pipeline:
+    """
+    Runs stages in dependency order and skips any stage whose function, arguments
+    and input contents are unchanged since it last succeeded, as long as its
+    outputs are still the files it wrote. Inputs are compared by content hash
+    (a file's hash is reused while its mtime and size stay the same), so a
+    stage that reruns but writes identical output doesn't wake its dependents.
+    Stages that don't depend on each other run in parallel threads.
+
+    State is kept in state_path (JSON).
+    """
+
+    def __init__(self, stages, state_path=STATE_PATH, max_workers=4):
+        self.stages = list(stages)
+        names = [stage.name for stage in self.stages]
+        if len(set(names)) != len(names):
+            raise ValueError("Stage names must be unique")
+        self.state_path = state_path
+        self.max_workers = max_workers
+        self.state = {"version": STATE_VERSION, "stages": {}, "files": {}}
+        if state_path and os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("version") == STATE_VERSION:
+                self.state = saved
+
+        writers = {}
+        for stage in self.stages:
+            for path in stage.outputs:
+                writers[os.path.normpath(path)] = stage.name
+        self.upstream = {
+            stage.name: {writers[os.path.normpath(p)] for p in stage.inputs if os.path.normpath(p) in writers} - {stage.name}
+            for stage in self.stages
+        }
+        self._order()
+
+    def _order(self):
+        # Fails early on cycles; returns the stages in a valid run order.
+        order, done = [], set()
+        pending = {stage.name: stage for stage in self.stages}
+        while pending:
+            ready = [name for name in pending if self.upstream[name] <= done]
+            if not ready:
+                raise ValueError(f"Pipeline cycle involving: {', '.join(sorted(pending))}")
+            for name in ready:
+                order.append(pending.pop(name))
+                done.add(name)
+        return order
+
+    # --- Hashing ---
+
+    def _file_hash(self, path):
+        stat = os.stat(path)
+        stamp = [stat.st_mtime_ns, stat.st_size]
+        cached = self.state["files"].get(path)
+        if cached is not None and cached[:2] == stamp:
+            return cached[2]
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        self.state["files"][path] = stamp + [digest.hexdigest()]
+        return digest.hexdigest()
+
+    def content_hash(self, path):
+        """sha1 of a file, of every file under a folder (with their relative paths), or None if missing."""
+        if os.path.isfile(path):
+            return self._file_hash(path)
+        if os.path.isdir(path):
+            digest = hashlib.sha1()
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for filename in sorted(files):
+                    full = os.path.join(root, filename)
+                    digest.update(os.path.relpath(full, path).replace(os.sep, "/").encode("utf-8"))
+                    digest.update(self._file_hash(full).encode("ascii"))
+            return digest.hexdigest()
+        return None
+
+    def stage_key(self, stage):
+        digest = hashlib.sha1(stage.describe().encode("utf-8"))
+        for path in stage.inputs:
+            digest.update(f"{path}={self.content_hash(path)}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _up_to_date(self, stage, key):
+        previous = self.state["stages"].get(stage.name)
+        if stage.always or previous is None or previous["key"] != key:
+            return False
+        return all(self.content_hash(path) == previous["outputs"].get(path) for path in stage.outputs)
+
+    # --- Running ---
+
+    def _select(self, only):
+        # The named stages plus everything they depend on.
+        if not only:
+            return {stage.name for stage in self.stages}
+        unknown = set(only) - set(self.upstream)
+        if unknown:
+            raise KeyError(f"Unknown stage(s): {', '.join(sorted(unknown))}")
+        selected, stack = set(), list(only)
+        while stack:
+            name = stack.pop()
+            if name not in selected:
+                selected.add(name)
+                stack.extend(self.upstream[name])
+        return selected
+
+    def run(self, only=None, force=False, dry_run=False):
+        """
+        Bring the pipeline (or the `only` stages and their dependencies) up to date.
+
+        Returns {stage name: status}, status being "ran", "skipped", "failed",
+        "blocked" (an upstream stage failed) or, with dry_run, "would run" or
+        "may run" (an upstream stage would run, so its inputs may change).
+        """
+        selected = self._select(only)
+        stages = {stage.name: stage for stage in self._order() if stage.name in selected}
+        status, running, keys = {}, {}, {}
+
+        def start_ready(pool):
+            for name, stage in stages.items():
+                if name in status or name in running.values():
+                    continue
+                upstream = self.upstream[name] & selected
+                if any(status.get(u) in ("failed", "blocked") for u in upstream):
+                    status[name] = "blocked"
+                    continue
+                if not all(status.get(u) in ("ran", "skipped", "would run", "may run") for u in upstream):
+                    continue
+                if dry_run and not force and any(status.get(u) in ("would run", "may run") for u in upstream):
+                    # Its inputs haven't been regenerated yet, so hashing them now says nothing.
+                    status[name] = "may run"
+                    continue
+                key = self.stage_key(stage)
+                if not force and self._up_to_date(stage, key):
+                    status[name] = "skipped"
+                    tracing.count("pipeline.skipped")
+                elif dry_run:
+                    status[name] = "would run"
+                else:
+                    running[pool.submit(self._run_stage, stage)] = name
+                    keys[name] = key
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                before = len(status)
+                start_ready(pool)
+                if not running:
+                    if len(status) == before:
+                        break
+                    continue
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    stage = stages[name]
+                    try:
+                        elapsed = future.result()
+                    except Exception as e:
+                        print(f"Stage {name} failed: {e!r}")
+                        status[name] = "failed"
+                        self.state["stages"].pop(name, None)
+                        continue
+                    status[name] = "ran"
+                    tracing.count("pipeline.ran")
+                    self.state["stages"][name] = {
+                        "key": keys[name],
+                        "outputs": {path: self.content_hash(path) for path in stage.outputs},
+                        "seconds": round(elapsed, 3),
+                    }
+        if not dry_run:
+            self.save()
+        return {name: status.get(name, "blocked") for name in stages}
+
+    @staticmethod
+    def _run_stage(stage):
+        start = time.perf_counter()
+        with tracing.stage(f"pipeline.{stage.name}"):
+            stage.resolve()(*stage.args, **stage.params)
+        return time.perf_counter() - start
+
+    def save(self):
+        """Write the state atomically to state_path."""
+        if not self.state_path:
+            return
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+
+# --- The repository's pipelines ---
+
+def _consolidate(parts_folder, totals_csv, recipe_book_csv, recipe_gathering_csv):
+    # consolidate_csv_files always writes utilities/workshop_output.csv; this honours totals_csv.
+    from workshop_items import WorkshopConsolidator
+    consolidator = WorkshopConsolidator(parts_folder, totals_csv, recipe_book_csv, recipe_gathering_csv)
+    if not consolidator.scan():
+        consolidator.write()  # an empty folder still gets an (empty) totals file
+
+
+def node_stages(nodes_dir=os.path.join("data", "timed_nodes"), utils_dir="utilities", world="Seraph", market=True):
+    """clean_unspoiled_data -> assign_ids -> sort_for_current_time -> generate_market_data."""
+    def path(name):
+        return os.path.join(nodes_dir, name)
+    stages = [
+        Stage("nodes.clean", "timed_nodes:clean_unspoiled_data",
+              inputs=[path("unspoiled_nodes.txt")], outputs=[path("cleaned_nodes.csv")],
+              args=(path("unspoiled_nodes.txt"), path("cleaned_nodes.csv"))),
+        # assign_ids reads the item list from utilities/ itself.
+        Stage("nodes.assign_ids", "timed_nodes:assign_ids",
+              inputs=[path("cleaned_nodes.csv"), os.path.join(utils_dir, "item_ids.json")],
+              outputs=[path("final_nodes_with_ids.csv")],
+              args=(path("cleaned_nodes.csv"), path("final_nodes_with_ids.csv"))),
+        # The order depends on the current Eorzean time, so this always reruns.
+        Stage("nodes.sort", "timed_nodes:sort_for_current_time",
+              inputs=[path("final_nodes_with_ids.csv")], outputs=[path("final_nodes_with_ids_sorted.csv")],
+              args=(path("final_nodes_with_ids.csv"), path("final_nodes_with_ids_sorted.csv")), always=True),
+    ]
+    if market:
+        stages.append(
+            Stage("nodes.market", "timed_nodes:generate_market_data",
+                  inputs=[path("final_nodes_with_ids_sorted.csv")], outputs=[path("final_nodes_with_ids_market.csv")],
+                  args=(path("final_nodes_with_ids_sorted.csv"), path("final_nodes_with_ids_market.csv")),
+                  params={"world": world})
+        )
+    return stages
+
+
+def workshop_stages(utils_dir="utilities", data_dir="data"):
+    """consolidate -> gathering list, and the catalog materials (independent of the two)."""
+    def path(name):
+        return os.path.join(utils_dir, name)
+    book, gathering = path("recipe_book.csv"), path("recipe_gathering.csv")
+    # The catalog folders only: data/timed_nodes is rewritten by the node stages.
+    catalog_dirs = sorted(
+        os.path.join(data_dir, entry) for entry in (os.listdir(data_dir) if os.path.isdir(data_dir) else [])
+        if entry not in SKIP_DIRS and os.path.isdir(os.path.join(data_dir, entry))
+    )
+    return [
+        Stage("workshop.consolidate", _consolidate,
+              inputs=[path("workshop_parts"), book, gathering], outputs=[path("workshop_output.csv")],
+              args=(path("workshop_parts"), path("workshop_output.csv"), book, gathering)),
+        Stage("workshop.gathering_list", "workshop_items:generate_gathering_list",
+              inputs=[path("workshop_output.csv"), book, gathering], outputs=[path("gathering_list.csv")],
+              args=(path("workshop_output.csv"), book, gathering, path("gathering_list.csv"))),
+        Stage("workshop.materialize", "workshop_items:materialize_catalog",
+              inputs=catalog_dirs + [book, gathering], outputs=[path("catalog_materials.csv")],
+              args=(path("catalog_materials.csv"), book, gathering)),
+    ]
+
+
+def default_pipeline(state_path=STATE_PATH, market=True, **options):
+    """Both pipelines in one Pipeline; they share no files, so they run side by side."""
+    return Pipeline(node_stages(market=market) + workshop_stages(), state_path, **options)
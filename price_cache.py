@@ -0,0 +1,221 @@
+# Persistent market price cache that sits in front of MarketClient
+import os
+import sqlite3
+import threading
+import time
+
+import tracing
+from market_client import MARKET_COLUMNS, MarketClient, empty_market_fields, normalize_item_id
+
+CACHE_PATH = os.path.join("utilities", "market_cache.sqlite")
+
+# Seconds each field stays fresh: listings move quickly, averages slowly.
+DEFAULT_TTLS = {
+    "minListing_world": 5 * 60,
+    "minListing_dc": 5 * 60,
+    "recentPurchase_world": 15 * 60,
+    "recentPurchase_dc": 15 * 60,
+    "averageSalePrice_dc": 60 * 60,
+    "dailySaleVelocity_dc": 60 * 60,
+}
+
+
+class PriceCache:
+    """
+    SQLite-backed cache of market fields keyed by (world/DC, item ID).
+
+    - ttls: per-field freshness in seconds (defaults to DEFAULT_TTLS)
+    - max_entries: LRU bound; the least recently read entries are evicted past it
+    - path: database file, or ":memory:" for a throwaway cache
+
+    An entry is fresh for a set of fields when every one of them is younger
+    than its TTL. Counters for hits, stale hits, misses and evictions are kept
+    in `stats`.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttls=None, max_entries=20000, clock=time.time):
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.max_entries = max_entries
+        self.clock = clock
+        self.stats = {"hits": 0, "stale": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        columns = ", ".join(f"{col} REAL" for col in MARKET_COLUMNS)
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS prices (world TEXT, item_id INTEGER, {columns}, "
+            "fetched_at REAL, last_access REAL, PRIMARY KEY (world, item_id))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS prices_lru ON prices (last_access)")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def max_age(self, fields=MARKET_COLUMNS):
+        """Seconds an entry stays fresh for all of fields (the shortest of their TTLs)."""
+        return min(self.ttls[f] for f in fields)
+
+    def lookup(self, world, item_ids, fields=MARKET_COLUMNS):
+        """
+        Split item_ids into cached values and IDs that need fetching.
+
+        Returns (fresh, stale, missing): fresh and stale map item_id -> {field: value};
+        missing is a list of IDs with no cached entry at all.
+        """
+        ids = [normalize_item_id(i) for i in item_ids]
+        ids = list(dict.fromkeys(i for i in ids if i is not None))
+        now = self.clock()
+        max_age = self.max_age(fields)
+        fresh, stale = {}, {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT item_id, fetched_at, {', '.join(MARKET_COLUMNS)} FROM prices "
+                    f"WHERE world = ? AND item_id IN ({','.join('?' * len(chunk))})",
+                    [world, *chunk],
+                ).fetchall()
+                for item_id, fetched_at, *values in rows:
+                    entry = dict(zip(MARKET_COLUMNS, values))
+                    if now - fetched_at < max_age:
+                        fresh[item_id] = entry
+                    else:
+                        stale[item_id] = entry
+            if fresh or stale:
+                self.conn.executemany(
+                    "UPDATE prices SET last_access = ? WHERE world = ? AND item_id = ?",
+                    [(now, world, i) for i in (*fresh, *stale)],
+                )
+                self.conn.commit()
+            missing = [i for i in ids if i not in fresh and i not in stale]
+            self.stats["hits"] += len(fresh)
+            self.stats["stale"] += len(stale)
+            self.stats["misses"] += len(missing)
+        tracing.count("price_cache.hit", len(fresh))
+        tracing.count("price_cache.stale", len(stale))
+        tracing.count("price_cache.miss", len(missing))
+        return fresh, stale, missing
+
+    def expiring(self, world, item_ids, at, fields=MARKET_COLUMNS):
+        """
+        IDs among item_ids whose entry is missing or will no longer be fresh at
+        the time `at`. A peek: stats and LRU order are left alone.
+        """
+        ids = [normalize_item_id(i) for i in item_ids]
+        ids = list(dict.fromkeys(i for i in ids if i is not None))
+        max_age = self.max_age(fields)
+        fresh_until = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                fresh_until.update(self.conn.execute(
+                    f"SELECT item_id, fetched_at + ? FROM prices "
+                    f"WHERE world = ? AND item_id IN ({','.join('?' * len(chunk))})",
+                    [max_age, world, *chunk],
+                ).fetchall())
+        return [i for i in ids if fresh_until.get(i, float("-inf")) <= at]
+
+    def store(self, world, market):
+        """Save {item_id: {field: value}} fetched just now and enforce the LRU bound."""
+        now = self.clock()
+        rows = [
+            (world, normalize_item_id(item_id), *(fields.get(col) for col in MARKET_COLUMNS), now, now)
+            for item_id, fields in market.items()
+        ]
+        with self._lock:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO prices VALUES ({','.join('?' * (len(MARKET_COLUMNS) + 4))})", rows
+            )
+            (count,) = self.conn.execute("SELECT COUNT(*) FROM prices").fetchone()
+            if count > self.max_entries:
+                evict = count - self.max_entries
+                self.conn.execute(
+                    "DELETE FROM prices WHERE rowid IN "
+                    "(SELECT rowid FROM prices ORDER BY last_access LIMIT ?)", (evict,)
+                )
+                self.stats["evictions"] += evict
+            self.conn.commit()
+
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["stale"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+
+class CachedMarketClient:
+    """
+    MarketClient look-alike that answers from a PriceCache and only goes to the
+    network for entries that are missing or expired.
+
+    With stale_while_revalidate=True, expired entries are returned immediately
+    and refreshed on a background thread; call wait() to let refreshes finish.
+    Failed requests are never cached, so an outage leaves entries stale (or
+    missing) rather than replacing them with fresh None prices.
+    """
+
+    def __init__(self, world="Seraph", cache=None, client=None, stale_while_revalidate=False, **client_options):
+        self.world = world
+        self._owns_cache = cache is None
+        self.cache = cache if cache is not None else PriceCache()
+        self.client = client if client is not None else MarketClient(world=world, **client_options)
+        self.stale_while_revalidate = stale_while_revalidate
+        self._refreshes = []
+
+    def close(self):
+        self.wait()
+        self.client.close()
+        if self._owns_cache:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def stats(self):
+        return self.cache.stats
+
+    def _refresh(self, item_ids, stale=None):
+        # Only real answers are cached; items whose request failed keep their stale
+        # value (or None values) for this call and are tried again on the next read.
+        market, failed = self.client.fetch_with_failures(item_ids)
+        self.cache.store(self.world, market)
+        if failed:
+            tracing.count("price_cache.fetch_failed", len(failed))
+        for item_id in failed:
+            market[item_id] = (stale or {}).get(item_id) or empty_market_fields()
+        return market
+
+    def fetch(self, item_ids, fields=MARKET_COLUMNS):
+        """Same contract as MarketClient.fetch, served from the cache where possible."""
+        fresh, stale, missing = self.cache.lookup(self.world, item_ids, fields)
+        market = dict(fresh)
+
+        if self.stale_while_revalidate and stale:
+            market.update(stale)
+            thread = threading.Thread(target=self._refresh, args=(list(stale),), daemon=True)
+            thread.start()
+            self._refreshes.append(thread)
+            to_fetch = missing
+        else:
+            to_fetch = missing + list(stale)
+
+        if to_fetch:
+            market.update(self._refresh(to_fetch, stale))
+        return market
+
+    def fetch_one(self, item_id):
+        item_id = normalize_item_id(item_id)
+        if item_id is None:
+            return empty_market_fields()
+        return self.fetch([item_id])[item_id]
+
+    def wait(self):
+        """Block until background revalidations have finished."""
+        for thread in self._refreshes:
+            thread.join()
+        self._refreshes = []
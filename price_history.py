@@ -0,0 +1,393 @@
+# Append-only, date-partitioned history of market snapshots with vectorized queries
+import glob
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from market_client import MARKET_COLUMNS
+from node_schedule import ET_DAY, ET_RATIO
+
+HISTORY_DIR = os.path.join("utilities", "price_history")
+
+# File under the history root holding the last date auto-compaction has finished.
+COMPACTED_MARKER = "compacted_through"
+
+# Parquet needs pyarrow; without it each snapshot is an .npz of the same columns
+# (uncompressed: prices barely compress and plain .npz loads several times faster).
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+HISTORY_COLUMNS = ["fetched_at", "world", "item_id", "item_name", "spawn_minute"] + MARKET_COLUMNS
+
+# Real days per ET day.
+_REAL_DAYS_PER_ET_DAY = 1 / ET_RATIO
+
+
+def _spawn_minutes(times):
+    # "HH:MM" (as written by sort_for_current_time) -> minute of the ET day, -1 if unknown.
+    parts = pd.Series(times, dtype=object).astype(str).str.extract(r'^(\d{1,2}):(\d{2})')
+    minutes = pd.to_numeric(parts[0], errors="coerce") * 60 + pd.to_numeric(parts[1], errors="coerce")
+    return minutes.fillna(-1).astype(np.int16).to_numpy()
+
+
+class PriceHistory:
+    """
+    Market snapshots stored as one file per append under
+    <root>/date=YYYY-MM-DD/, never rewritten except by compact(), which merges a
+    finished day's files into one. With auto_compact, the first append of a new
+    day compacts the days since the last compacted one (kept in a marker file
+    under root), so other appends don't scan older partitions. Reads prune partitions by date and keep
+    loaded partitions in memory until their files change, so repeated queries
+    over months of snapshots only pay for the concatenation.
+
+    Files are Parquet when pyarrow is installed, else .npz with the same columns
+    (item names stored once per file as categories).
+    """
+
+    def __init__(self, root=HISTORY_DIR, auto_compact=True):
+        self.root = root
+        self.auto_compact = auto_compact
+        self._partitions = {}  # date -> (file stamps, DataFrame)
+        self._combined = (None, None, False)  # (partition frames, their concatenation, sorted by time?)
+        self._compacted_before = None  # appends for this date have already compacted older days
+
+    # --- Writing ---
+
+    def _partition_dir(self, date):
+        return os.path.join(self.root, f"date={date}")
+
+    def dates(self):
+        """Sorted partition dates ("YYYY-MM-DD") in the store."""
+        found = glob.glob(os.path.join(self.root, "date=*"))
+        return sorted(os.path.basename(p)[len("date="):] for p in found if os.path.isdir(p))
+
+    def append(self, snapshot, fetched_at=None, world="Seraph"):
+        """
+        Append one snapshot: a DataFrame with ID, Item Name, optional Time (the
+        node's spawn "HH:MM") and the MARKET_COLUMNS, as generate_market_data
+        writes. Returns the path written, or None for an empty snapshot.
+        """
+        if snapshot is None or len(snapshot) == 0:
+            return None
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        n = len(snapshot)
+        frame = pd.DataFrame({
+            "fetched_at": np.full(n, fetched_at, dtype=np.float64),
+            "world": pd.Categorical([world] * n),
+            "item_id": pd.to_numeric(snapshot["ID"], errors="coerce").fillna(-1).astype(np.int64).to_numpy(),
+            "item_name": pd.Categorical(snapshot["Item Name"].astype(str).to_numpy()),
+            "spawn_minute": _spawn_minutes(snapshot["Time"]) if "Time" in snapshot else np.full(n, -1, np.int16),
+        })
+        for col in MARKET_COLUMNS:
+            values = snapshot[col] if col in snapshot else np.nan
+            frame[col] = pd.to_numeric(pd.Series(values, index=snapshot.index), errors="coerce").to_numpy(np.float64)
+
+        date = datetime.fromtimestamp(fetched_at, timezone.utc).strftime("%Y-%m-%d")
+        if self.auto_compact and self._compacted_before != date:
+            self._compact_before(date)
+        folder = self._partition_dir(date)
+        os.makedirs(folder, exist_ok=True)
+        stem = os.path.join(folder, f"snapshot-{int(fetched_at * 1000)}-{os.getpid()}")
+        return self._write(frame, stem)
+
+    def _compact_before(self, date):
+        # Compact the finished days after the marker's date, so each day is merged once
+        # rather than every append globbing every older partition.
+        marker = os.path.join(self.root, COMPACTED_MARKER)
+        try:
+            with open(marker, "r", encoding="utf-8") as f:
+                done = f.read().strip()
+        except FileNotFoundError:
+            done = ""
+        older = [d for d in self.dates() if done < d < date]
+        for older_date in older:
+            self.compact(older_date)
+        if older:
+            tmp_path = f"{marker}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(older[-1])
+            os.replace(tmp_path, marker)
+        self._compacted_before = date
+
+    @staticmethod
+    def _write(frame, stem):
+        if HAS_PARQUET:
+            path = stem + ".parquet"
+            frame.to_parquet(path + ".tmp", index=False)
+        else:
+            path = stem + ".npz"
+            arrays = {}
+            for col in frame.columns:
+                if isinstance(frame[col].dtype, pd.CategoricalDtype):
+                    arrays[col + "__codes"] = frame[col].cat.codes.to_numpy()
+                    arrays[col + "__categories"] = frame[col].cat.categories.to_numpy(dtype=str)
+                else:
+                    arrays[col] = frame[col].to_numpy()
+            with open(path + ".tmp", "wb") as f:
+                np.savez(f, **arrays)
+        os.replace(path + ".tmp", path)
+        return path
+
+    @staticmethod
+    def _read(path):
+        # {column: array or Categorical}; DataFrames are only built once per load (see load).
+        if path.endswith(".parquet"):
+            frame = pd.read_parquet(path)
+            return {col: frame[col].array if isinstance(frame[col].dtype, pd.CategoricalDtype)
+                    else frame[col].to_numpy() for col in frame.columns}
+        with np.load(path, allow_pickle=False) as data:
+            columns = {}
+            for col in HISTORY_COLUMNS:
+                if col + "__codes" in data:
+                    columns[col] = pd.Categorical.from_codes(data[col + "__codes"], data[col + "__categories"])
+                elif col in data:
+                    columns[col] = data[col]
+            return columns
+
+    def _files(self, date):
+        return sorted(
+            glob.glob(os.path.join(self._partition_dir(date), "*.parquet"))
+            + glob.glob(os.path.join(self._partition_dir(date), "*.npz"))
+        )
+
+    def compact(self, date):
+        """
+        Merge a partition's snapshot files into one; returns the number of files merged.
+        An earlier compacted file is merged too, whichever format it was written in.
+        Safe to race with another process compacting the same day: whichever
+        finishes second finds the files gone and leaves the other's result.
+        """
+        files = self._files(date)
+        if len(files) <= 1:
+            return 0
+        try:
+            merged = pd.DataFrame(self._concat([self._read(p) for p in files]))
+        except FileNotFoundError:
+            return 0  # another process compacted this day first
+        written = self._write(merged, os.path.join(self._partition_dir(date), "compacted"))
+        for path in files:
+            if path != written:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        self._partitions.pop(date, None)
+        return len(files)
+
+    # --- Reading ---
+
+    @staticmethod
+    def _concat(parts):
+        # Categories differ between files, so merge them rather than let concat fall back to objects.
+        if len(parts) == 1:
+            return parts[0]
+        columns = {}
+        for col, first in parts[0].items():
+            if isinstance(first, pd.Categorical):
+                columns[col] = union_categoricals([p[col] for p in parts])
+            else:
+                columns[col] = np.concatenate([p[col] for p in parts])
+        return columns
+
+    def _partition(self, date):
+        files = self._files(date)
+        stamps = tuple((p, os.path.getmtime(p)) for p in files)
+        cached = self._partitions.get(date)
+        if cached is None or cached[0] != stamps:
+            frame = self._concat([self._read(p) for p in files]) if files else None
+            cached = self._partitions[date] = (stamps, frame)
+        return cached[1]
+
+    def load(self, start=None, end=None, items=None, world=None):
+        """
+        Snapshots between two real Unix times (None = open-ended) as one DataFrame
+        with HISTORY_COLUMNS. items filters by item name or ID.
+        """
+        first = datetime.fromtimestamp(start, timezone.utc).strftime("%Y-%m-%d") if start is not None else None
+        last = datetime.fromtimestamp(end, timezone.utc).strftime("%Y-%m-%d") if end is not None else None
+        frames = [
+            self._partition(date) for date in self.dates()
+            if (first is None or date >= first) and (last is None or date <= last)
+        ]
+        frames = [f for f in frames if f is not None]
+        if not frames:
+            return pd.DataFrame({col: pd.Series(dtype=float) for col in HISTORY_COLUMNS})
+        parts, combined, ordered = self._combined
+        if parts is None or len(parts) != len(frames) or any(a is not b for a, b in zip(parts, frames)):
+            combined = pd.DataFrame(self._concat(frames))
+            ordered = bool(np.all(np.diff(combined["fetched_at"].to_numpy()) >= 0))
+            self._combined = (frames, combined, ordered)
+        frame = combined
+
+        fetched = frame["fetched_at"].to_numpy()
+        if ordered:
+            # Snapshots are appended in time order, so the time range is a slice.
+            lo = np.searchsorted(fetched, start, "left") if start is not None else 0
+            hi = np.searchsorted(fetched, end, "left") if end is not None else len(frame)
+            frame = frame.iloc[lo:hi]
+            start = end = None
+        mask = np.ones(len(frame), dtype=bool)
+        if start is not None:
+            mask &= frame["fetched_at"].to_numpy() >= start
+        if end is not None:
+            mask &= frame["fetched_at"].to_numpy() < end
+        if world is not None:
+            mask &= (frame["world"] == world).to_numpy()
+        if items is not None:
+            items = list(items)
+            mask &= (frame["item_name"].isin([i for i in items if isinstance(i, str)])
+                     | frame["item_id"].isin([i for i in items if not isinstance(i, str)])).to_numpy()
+        return frame[mask] if not mask.all() else frame
+
+    # --- Queries ---
+    # Everything below works on integer item codes with bincount / one grouped
+    # median, which keeps months of snapshots well under a second.
+
+    @staticmethod
+    def _codes(frame):
+        names = frame["item_name"].astype("category")
+        return names.cat.codes.to_numpy().astype(np.int64), names.cat.categories
+
+    @staticmethod
+    def _group_median(keys, values, size):
+        ok = ~np.isnan(values)
+        medians = pd.Series(values[ok]).groupby(keys[ok]).median()
+        out = np.full(size, np.nan)
+        out[medians.index.to_numpy()] = medians.to_numpy()
+        return out
+
+    @staticmethod
+    def _group_mean(codes, values, size):
+        ok = ~np.isnan(values)
+        counts = np.bincount(codes[ok], minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.bincount(codes[ok], values[ok], minlength=size) / counts, counts
+
+    def trend(self, field="minListing_world", freq="D", days=30, now=None):
+        """
+        Median of `field` per item per period (columns, fixed-length periods such
+        as "D" or "6h") over the last `days`, plus a "slope" column: the
+        least-squares change per day, fitted to every snapshot at once.
+        """
+        now = time.time() if now is None else now
+        frame = self.load(now - days * 86400, now)
+        if frame.empty:
+            return pd.DataFrame()
+        codes, names = self._codes(frame)
+        k = len(names)
+        fetched = frame["fetched_at"].to_numpy()
+        values = frame[field].to_numpy(np.float64)
+
+        step = pd.tseries.frequencies.to_offset(freq).nanos / 1e9
+        period = (fetched // step).astype(np.int64)
+        first = period.min()
+        n_periods = int(period.max() - first + 1)
+        medians = self._group_median(codes * n_periods + (period - first), values, k * n_periods)
+        table = pd.DataFrame(
+            medians.reshape(k, n_periods),
+            index=pd.Index(names, name="item_name"),
+            columns=pd.to_datetime((np.arange(n_periods) + first) * step, unit="s"),
+        )
+
+        # Per-item slope: cov(t, y) / var(t), with t in days, from bincount sums.
+        ok = ~np.isnan(values)
+        c, t, y = codes[ok], (fetched[ok] - now) / 86400, values[ok]
+        n = np.bincount(c, minlength=k)
+        st, sy = np.bincount(c, t, k), np.bincount(c, y, k)
+        stt, sty = np.bincount(c, t * t, k), np.bincount(c, t * y, k)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = stt - st * st / n
+            table["slope"] = np.where(var > 0, (sty - st * sy / n) / var, np.nan)
+        return table.dropna(how="all")
+
+    def velocity(self, days=7, now=None):
+        """Mean DC sale velocity (units/day), its spread and sample count per item over the last `days`."""
+        now = time.time() if now is None else now
+        frame = self.load(now - days * 86400, now)
+        codes, names = self._codes(frame)
+        k = len(names)
+        values = frame["dailySaleVelocity_dc"].to_numpy(np.float64)
+        mean, count = self._group_mean(codes, values, k)
+        ok = ~np.isnan(values)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sq = np.bincount(codes[ok], (values[ok] - mean[codes[ok]]) ** 2, k)
+            std = np.sqrt(sq / (count - 1))
+        result = pd.DataFrame({"mean": mean, "std": std, "count": count}, index=pd.Index(names, name="item_name"))
+        return result[result["count"] > 0]
+
+    def _window_stats(self, frame, price_field, units_per_window):
+        codes, names = self._codes(frame)
+        k = len(names)
+        price = frame[price_field].to_numpy(np.float64)
+        velocity, _ = self._group_mean(codes, frame["dailySaleVelocity_dc"].to_numpy(np.float64), k)
+        item_ids = np.full(k, -1, dtype=np.int64)
+        item_ids[codes] = frame["item_id"].to_numpy()
+
+        # Distinct spawn minutes seen for the item = windows per ET day (AM/PM nodes have two).
+        spawn = frame["spawn_minute"].to_numpy().astype(np.int64)
+        known = spawn >= 0
+        seen = np.zeros(k * ET_DAY, dtype=bool)
+        seen[codes[known] * ET_DAY + spawn[known]] = True
+        per_et_day = np.maximum(seen.reshape(k, ET_DAY).sum(axis=1), 1)
+
+        stats = pd.DataFrame({
+            "item_id": item_ids,
+            "price": self._group_median(codes, price, k),
+            "velocity": velocity,
+            "availability": np.bincount(codes[~np.isnan(price)], minlength=k) / np.maximum(np.bincount(codes, minlength=k), 1),
+            "windows_per_day": per_et_day / _REAL_DAYS_PER_ET_DAY,
+        }, index=pd.Index(names, name="item_name"))
+        sellable = stats["velocity"].fillna(0) / stats["windows_per_day"]
+        stats["units"] = np.minimum(units_per_window, sellable)
+        stats["gil_per_window"] = (stats["price"] * stats["units"]).fillna(0)
+        return stats[np.bincount(codes, minlength=k) > 0], codes, spawn
+
+    def gil_per_window(self, days=7, price_field="minListing_world", units_per_window=20, now=None):
+        """
+        Expected gil from one spawn window of each item:
+
+        price (median) × units sellable per window, where units is the smaller
+        of units_per_window (what one window yields) and the DC sale velocity
+        spread over the item's windows per real day. availability is the share
+        of snapshots that had a listing at all.
+        """
+        now = time.time() if now is None else now
+        frame = self.load(now - days * 86400, now)
+        stats, _, _ = self._window_stats(frame, price_field, units_per_window)
+        return stats.sort_values("gil_per_window", ascending=False)
+
+    def rank_for_hour(self, et_hour, days=7, uptime=120, price_field="minListing_world", units_per_window=20, now=None):
+        """
+        Node items up during ET hour `et_hour`, best expected profit first:
+        gil_per_window × availability, for items whose recorded spawn window
+        (spawn minute + uptime) overlaps that hour.
+        """
+        now = time.time() if now is None else now
+        frame = self.load(now - days * 86400, now)
+        stats, codes, spawn = self._window_stats(frame, price_field, units_per_window)
+        minute = (et_hour % 24) * 60
+        known = spawn >= 0
+        # Up at some point in [minute, minute + 60): already up at its start, or spawning during it.
+        up = ((minute - spawn) % ET_DAY < uptime) | ((spawn - minute) % ET_DAY < 60)
+        names = frame["item_name"].astype("category").cat.categories
+        hit = np.bincount(codes[known & up], minlength=len(names)) > 0
+        ranked = stats[stats.index.isin(names[hit])].copy()
+        ranked["expected_gil"] = ranked["gil_per_window"] * ranked["availability"]
+        return ranked.sort_values("expected_gil", ascending=False)
+
+
+_stores = {}
+
+def get_price_history(root=HISTORY_DIR):
+    """Shared PriceHistory for a directory, so its partition cache survives between calls."""
+    key = os.path.abspath(root)
+    if key not in _stores:
+        _stores[key] = PriceHistory(root)
+    return _stores[key]
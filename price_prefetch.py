@@ -0,0 +1,149 @@
+# Warms the price cache for timed nodes that are about to spawn
+import threading
+import time
+
+import tracing
+from market_client import MARKET_COLUMNS, MarketClient, normalize_item_id
+from node_schedule import ET_RATIO, load_node_schedule
+from price_cache import PriceCache
+
+# Real seconds per ET hour (about 175).
+ET_HOUR_SECONDS = 3600 / ET_RATIO
+
+
+class PricePrefetcher:
+    """
+    Fetches prices for the nodes that will be up in the next `hours` ET hours
+    before anyone asks for them, so generate_market_data finds them fresh in
+    the PriceCache instead of waiting on Universalis.
+
+    Each prefetch() works out, from the NodeSchedule, every window overlapping
+    [now, now + hours ET] and the real time it's needed (its spawn, or now if
+    it's already up). An item is fetched when its cached entry would be stale
+    by then *and* a fetch made now would still be fresh then; items further out
+    are left for a later cycle. Soonest spawns go first, and at most `budget`
+    requests (of up to client.batch_size IDs each) are made per cycle.
+
+    - schedule: a NodeSchedule (see node_schedule.load_node_schedule)
+    - cache / client: the PriceCache to warm and the MarketClient to fetch with
+    - fields: the market fields that must be fresh (TTL is the shortest of them)
+    - clock: real-time source, time.time by default
+
+    start() runs prefetch() every `interval` real seconds on a daemon thread;
+    stop() ends it. Counters are kept in `stats`.
+    """
+
+    def __init__(self, schedule, cache=None, client=None, world="Seraph", hours=2, budget=5,
+                 fields=MARKET_COLUMNS, skip_rarefied=True, clock=time.time):
+        self.schedule = schedule
+        self.world = world
+        self._owns_cache = cache is None
+        self.cache = cache if cache is not None else PriceCache()
+        self._owns_client = client is None
+        self.client = client if client is not None else MarketClient(world=world)
+        self.hours = hours
+        self.budget = budget
+        self.fields = fields
+        self.skip_rarefied = skip_rarefied
+        self.clock = clock
+        self.stats = {"cycles": 0, "requests": 0, "prefetched": 0, "failed": 0, "deferred": 0, "over_budget": 0}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def close(self):
+        self.stop()
+        if self._owns_client:
+            self.client.close()
+        if self._owns_cache:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def upcoming(self, now=None):
+        """[(needed_at, item_id)] for windows up within the horizon, soonest first, one entry per item."""
+        now = self.clock() if now is None else now
+        needed = {}
+        for spawn, _, window in self.schedule.forecast(now, now + self.hours * ET_HOUR_SECONDS):
+            if self.skip_rarefied and "rarefied" in window.row.get("Item Name", "").lower():
+                continue
+            item_id = normalize_item_id(window.row.get("ID"))
+            if item_id is not None:
+                needed[item_id] = min(needed.get(item_id, float("inf")), max(spawn, now))
+        return sorted((at, item_id) for item_id, at in needed.items())
+
+    def plan(self, now=None):
+        """
+        (to_fetch, deferred, over_budget) item ID lists for one cycle: what
+        prefetch() would fetch now, what isn't worth fetching yet, and what
+        didn't fit in the request budget.
+        """
+        now = self.clock() if now is None else now
+        max_age = self.cache.max_age(self.fields)
+        upcoming = self.upcoming(now)
+        # The cache is asked per distinct "needed at" time; there are only a few (one per ET hour).
+        stale = set()
+        for at in sorted({at for at, _ in upcoming}):
+            stale.update(self.cache.expiring(self.world, [i for t, i in upcoming if t == at], at, self.fields))
+        wanted = [(at, i) for at, i in upcoming if i in stale]
+        ready = [i for at, i in wanted if at - now < max_age]
+        deferred = [i for at, i in wanted if at - now >= max_age]
+        limit = max(0, self.budget) * getattr(self.client, "batch_size", 100)
+        return ready[:limit], deferred, ready[limit:]
+
+    def prefetch(self, now=None):
+        """Run one cycle and return its plan sizes and the requests it took."""
+        to_fetch, deferred, over_budget = self.plan(now)
+        requests_before = getattr(self.client, "requests_made", 0)
+        failed = []
+        if to_fetch:
+            with tracing.stage("prices.prefetch", items=len(to_fetch)):
+                # Failed requests aren't stored, so the items stay due for the next cycle.
+                market, failed = self.client.fetch_with_failures(to_fetch)
+                self.cache.store(self.world, market)
+        requests = getattr(self.client, "requests_made", 0) - requests_before
+        self.stats["cycles"] += 1
+        self.stats["requests"] += requests
+        self.stats["prefetched"] += len(to_fetch) - len(failed)
+        self.stats["failed"] += len(failed)
+        self.stats["deferred"] += len(deferred)
+        self.stats["over_budget"] += len(over_budget)
+        tracing.count("prefetch.items", len(to_fetch))
+        tracing.count("prefetch.over_budget", len(over_budget))
+        return {"fetched": len(to_fetch) - len(failed), "failed": len(failed), "deferred": len(deferred),
+                "over_budget": len(over_budget), "requests": requests}
+
+    # --- Background thread ---
+
+    def start(self, interval=60):
+        """prefetch() now and then every `interval` real seconds on a daemon thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.prefetch()
+                except Exception as e:  # keep the thread alive through network trouble
+                    print(f"Price prefetch failed: {e}")
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=loop, name="price-prefetch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+
+def prefetch_prices(nodes_csv, world="Seraph", hours=2, budget=5, cache=None, client=None):
+    """One prefetch cycle for a nodes CSV (as written by assign_ids); returns the cycle summary."""
+    with PricePrefetcher(load_node_schedule(nodes_csv), cache=cache, client=client,
+                         world=world, hours=hours, budget=budget) as prefetcher:
+        return prefetcher.prefetch()
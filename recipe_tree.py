@@ -0,0 +1,219 @@
+# Streaming recipe tree renderer (text, JSON, HTML) used by print_recipe_tree
+import html
+import json
+import sys
+
+
+class RecipeTreeRenderer:
+    """
+    Walks the crafting tree of a {product: qty} mapping once and streams it to
+    a text, JSON or HTML writer.
+
+    - graph: anything with .recipes ({product: [(ingredient, qty), …]}) and
+      .gathering ({ingredient: [(method, location), …]}), e.g. a RecipeGraph
+    - backrefs: a crafted item that appears under more than one parent is
+      expanded the first time only and tagged [#n]; later occurrences point
+      back to it instead of repeating the whole sub-tree
+    - max_depth: don't expand below this depth (top-level products are depth 0)
+    - collapse: show at most this many ingredients per product, then "… N more"
+
+    Nodes are produced by a generator and written as they are produced, so even
+    a very large tree never has to be held in memory.
+    """
+
+    def __init__(self, graph, backrefs=True, max_depth=None, collapse=None):
+        self.recipes = graph.recipes
+        # leaf: show the last gathering entry, as print_recipe_tree always has
+        self.gather_info = {ing: entries[-1] for ing, entries in graph.gathering.items()}
+        self.backrefs = backrefs
+        self.max_depth = max_depth
+        self.collapse = collapse
+
+    def _shared(self, top_level):
+        # Crafted items reachable from top_level through more than one parent edge.
+        parents = {}
+        stack = list(top_level)
+        for item in stack:
+            parents[item] = parents.get(item, 0) + 1
+        seen = set()
+        while stack:
+            item = stack.pop()
+            if item in seen or item not in self.recipes:
+                continue
+            seen.add(item)
+            for child, _ in self.recipes[item]:
+                parents[child] = parents.get(child, 0) + 1
+                stack.append(child)
+        return {item for item, n in parents.items() if n > 1 and item in self.recipes}
+
+    def walk(self, top_level):
+        """
+        Yield ("node", node) for every line of the tree and ("close", node) after
+        the children of each expanded product. A node is a dict with item, qty,
+        depth, last and kind:
+
+        - "leaf": not craftable; has method/location when gathering info exists
+        - "craft": expanded product; has anchor (int) when it's referenced later
+        - "ref": product already expanded above; ref is that node's anchor
+        - "truncated": product not expanded because of max_depth
+        - "more": placeholder for `hidden` ingredients cut by collapse
+        """
+        shared = self._shared(top_level) if self.backrefs else set()
+        anchors = {}
+
+        def visit(item, qty, depth, last):
+            node = {"item": item, "qty": qty, "depth": depth, "last": last}
+            if item not in self.recipes:
+                node["kind"] = "leaf"
+                if item in self.gather_info:
+                    node["method"], node["location"] = self.gather_info[item]
+                yield "node", node
+                return
+            if item in anchors:
+                node["kind"], node["ref"] = "ref", anchors[item]
+                yield "node", node
+                return
+            if self.max_depth is not None and depth >= self.max_depth:
+                node["kind"] = "truncated"
+                yield "node", node
+                return
+            node["kind"] = "craft"
+            if item in shared:
+                node["anchor"] = anchors[item] = len(anchors) + 1
+            yield "node", node
+            children = self.recipes[item]
+            shown = children if self.collapse is None else children[:self.collapse]
+            hidden = len(children) - len(shown)
+            for idx, (child, child_qty) in enumerate(shown):
+                yield from visit(child, child_qty * qty, depth + 1, idx == len(shown) - 1 and not hidden)
+            if hidden:
+                yield "node", {"kind": "more", "hidden": hidden, "depth": depth + 1, "last": True}
+            yield "close", node
+
+        items = list(top_level.items())
+        for idx, (product, qty) in enumerate(items):
+            yield from visit(product, qty, 0, idx == len(items) - 1)
+
+    # --- Writers ---
+
+    def write_text(self, top_level, out=None, buffer_lines=500):
+        """
+        The classic ├──/└── tree, written to out (default stdout) in chunks of
+        buffer_lines. Labels keep print_recipe_tree's non-breaking spaces in
+        "(x qty)" and "method @ location" so notebook output doesn't wrap inside them.
+        """
+        out = out or sys.stdout
+        lines = ["=== Recipe Breakdown ==="]
+        prefixes = [""]  # prefix for the children of each open product
+        for event, node in self.walk(top_level):
+            if event == "close":
+                prefixes.pop()
+                continue
+            prefix = prefixes[-1]
+            line = prefix + ("└── " if node["last"] else "├── ")
+            kind = node["kind"]
+            if kind == "more":
+                line += f"… {node['hidden']} more"
+            else:
+                line += f"{node['item']} (x {node['qty']:g})"
+                if kind == "leaf" and "method" in node:
+                    line += f"  [{node['method']} @ {node['location']}]"
+                elif kind == "craft" and "anchor" in node:
+                    line += f"  [#{node['anchor']}]"
+                elif kind == "ref":
+                    line += f"  → see #{node['ref']} above"
+                elif kind == "truncated":
+                    line += "  […]"
+            if kind == "craft":
+                prefixes.append(prefix + ("    " if node["last"] else "│   "))
+            lines.append(line)
+            if len(lines) >= buffer_lines:
+                out.write("\n".join(lines) + "\n")
+                lines = []
+        if lines:
+            out.write("\n".join(lines) + "\n")
+
+    @staticmethod
+    def _fields(node):
+        return {k: v for k, v in node.items() if k not in ("depth", "last")}
+
+    def write_json(self, top_level, out):
+        """{"products": [node, …]} with nested "children" lists, written incrementally."""
+        out.write('{"products": [')
+        first = [True]
+        for event, node in self.walk(top_level):
+            if event == "close":
+                out.write("]}")
+                first.pop()
+                continue
+            if not first[-1]:
+                out.write(", ")
+            first[-1] = False
+            body = json.dumps(self._fields(node))
+            if node["kind"] == "craft":
+                out.write(body[:-1] + ', "children": [')
+                first.append(True)
+            else:
+                out.write(body)
+        out.write("]}\n")
+
+    def write_html(self, top_level, out, title="Recipe Breakdown"):
+        """A standalone page of nested <details> elements, so every product can be folded."""
+        out.write(
+            f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title>\n"
+            "<style>body{font-family:sans-serif} ul{list-style:none;padding-left:1.2em;margin:0}"
+            " summary{cursor:pointer} .info{color:#777} .ref a{color:#36c} :target>summary{background:#ffc}</style>\n"
+            f"</head><body><h1>{html.escape(title)}</h1>\n<ul>\n"
+        )
+        for event, node in self.walk(top_level):
+            if event == "close":
+                out.write("</ul></details></li>\n")
+                continue
+            kind = node["kind"]
+            if kind == "more":
+                out.write(f"<li class=\"info\">… {node['hidden']} more</li>\n")
+                continue
+            label = f"{html.escape(str(node['item']))} (x {node['qty']:g})"
+            if kind == "craft":
+                anchor = node.get("anchor")
+                attrs = f" id=\"ref-{anchor}\"" if anchor else ""
+                tag = f" <span class=\"info\">[#{anchor}]</span>" if anchor else ""
+                open_attr = "" if self.max_depth is None and node["depth"] >= 2 else " open"
+                out.write(f"<li><details{attrs}{open_attr}><summary>{label}{tag}</summary><ul>\n")
+            elif kind == "leaf":
+                info = ""
+                if "method" in node:
+                    info = f" <span class=\"info\">[{html.escape(str(node['method']))} @ {html.escape(str(node['location']))}]</span>"
+                out.write(f"<li>{label}{info}</li>\n")
+            elif kind == "ref":
+                out.write(f"<li class=\"ref\">{label} → <a href=\"#ref-{node['ref']}\">see #{node['ref']}</a></li>\n")
+            else:
+                out.write(f"<li>{label} <span class=\"info\">[…]</span></li>\n")
+        out.write("</ul>\n</body></html>\n")
+
+
+def render_recipe_tree(graph, top_level, path=None, fmt=None, **options):
+    """
+    Render the tree for top_level with RecipeTreeRenderer(graph, **options).
+
+    fmt is "text", "json" or "html" (default: from path's extension, else text).
+    With a path the output is streamed to that file; otherwise text goes to
+    stdout and JSON/HTML is returned as a string.
+    """
+    import io
+
+    if fmt is None:
+        ext = path.rsplit(".", 1)[-1].lower() if path and "." in path else "text"
+        fmt = {"json": "json", "html": "html", "htm": "html"}.get(ext, "text")
+    renderer = RecipeTreeRenderer(graph, **options)
+    write = {"text": renderer.write_text, "json": renderer.write_json, "html": renderer.write_html}[fmt]
+    if path is not None:
+        with open(path, "w", encoding="utf-8") as f:
+            write(top_level, f)
+        return None
+    if fmt == "text":
+        write(top_level, sys.stdout)
+        return None
+    buffer = io.StringIO()
+    write(top_level, buffer)
+    return buffer.getvalue()
@@ -0,0 +1,303 @@
+"""
+tanuki: command-line entry point for the timed-node and workshop pipelines.
+
+    python tanuki.py next-nodes                 # what's up now / next (standard library only)
+    python tanuki.py clean [dump.txt ...]       # wiki dump(s) -> cleaned_nodes.csv
+    python tanuki.py assign-ids                 # cleaned_nodes.csv -> final_nodes_with_ids.csv
+    python tanuki.py market                     # sort by current ET, attach Universalis prices
+    python tanuki.py prefetch [--watch]         # warm the price cache for nodes spawning soon
+    python tanuki.py consolidate [--catalog KEY ...]
+    python tanuki.py gathering-list [--cheapest | --net]
+    python tanuki.py tree
+    python tanuki.py route [--at 14:00]         # plan the gathering run for gathering_list.csv
+    python tanuki.py materialize                # every data/ build -> utilities/catalog_materials.csv
+    python tanuki.py refresh [--dry-run]        # rerun only the pipeline stages whose inputs changed
+
+Each subcommand imports only what it needs, so next-nodes never loads pandas,
+numpy or requests and starts in a few tens of milliseconds.
+"""
+import argparse
+import json
+import os
+import sys
+
+NODES_DIR = os.path.join("data", "timed_nodes")
+UTILS_DIR = "utilities"
+
+
+def _nodes_path(name):
+    return os.path.join(NODES_DIR, name)
+
+
+def _utils_path(name):
+    return os.path.join(UTILS_DIR, name)
+
+
+# --- Timed nodes ---
+
+def cmd_next_nodes(args):
+    from node_schedule import eorzea_minute, load_node_schedule, parse_spawn_times
+
+    if args.at:
+        now = parse_spawn_times(args.at)[0]
+    else:
+        now = eorzea_minute()
+    schedule = load_node_schedule(args.nodes)
+    rows = []
+    for time_diff, window in schedule.upcoming(now, since=args.since):
+        if not args.include_rarefied and "rarefied" in window.row.get("Item Name", "").lower():
+            continue
+        rows.append({
+            "ID": window.row.get("ID"),
+            "Time": f"{window.start // 60:02d}:{window.start % 60:02d}",
+            "Item Name": window.row.get("Item Name"),
+            "Location": window.row.get("Location"),
+            "Coordinates": window.row.get("Coordinates"),
+            "time_diff": time_diff,
+        })
+        if len(rows) == args.limit:
+            break
+
+    if args.json:
+        json.dump({"et": f"{now // 60:02d}:{now % 60:02d}", "nodes": rows}, sys.stdout)
+        sys.stdout.write("\n")
+        return
+    print(f"Eorzean time {now // 60:02d}:{now % 60:02d}")
+    for row in rows:
+        status = f"up, spawned {-row['time_diff']}m ago" if row["time_diff"] <= 0 else f"in {row['time_diff']}m"
+        print(f"  {row['Time']}  {row['Item Name']:<32} {row['Location']} {row['Coordinates']}  ({status})")
+
+
+def cmd_clean(args):
+    import timed_nodes as tn
+
+    inputs = args.inputs or [_nodes_path("unspoiled_nodes.txt")]
+    if len(inputs) == 1 and not args.all_columns:
+        tn.clean_unspoiled_data(inputs[0], args.output)
+        print(f"Wrote {args.output}")
+    else:
+        written = tn.clean_wiki_dumps(inputs, args.output, processes=args.processes)
+        print(f"Wrote {written} nodes to {args.output}")
+
+
+def cmd_assign_ids(args):
+    import timed_nodes as tn
+
+    tn.assign_ids(args.input, args.output)
+    print(f"Wrote {args.output}")
+
+
+def cmd_market(args):
+    import timed_nodes as tn
+
+    tn.sort_for_current_time(args.input, args.sorted)
+    tn.generate_market_data(args.sorted, args.output, world=args.world)
+    print(f"Wrote {args.output}")
+
+
+def cmd_prefetch(args):
+    import time
+    from node_schedule import load_node_schedule
+    from price_prefetch import PricePrefetcher
+
+    with PricePrefetcher(load_node_schedule(args.nodes), world=args.world, hours=args.hours,
+                         budget=args.budget) as prefetcher:
+        while True:
+            summary = prefetcher.prefetch()
+            print(f"Prefetched {summary['fetched']} item(s) in {summary['requests']} request(s); "
+                  f"{summary['failed']} failed, {summary['deferred']} not due yet, "
+                  f"{summary['over_budget']} over budget")
+            if not args.watch:
+                break
+            time.sleep(args.interval)
+
+
+# --- Workshop ---
+
+def cmd_consolidate(args):
+    import workshop_items as w
+
+    df = w.consolidate_csv_files(args.folder, catalog_keys=args.catalog)
+    if df is None:
+        print("No parts found.")
+        return
+    print(df[["Item", "Quantity", "Crystals Needed"]].to_string(index=False))
+
+
+def cmd_gathering_list(args):
+    import workshop_items as w
+
+    if args.cheapest:
+        inventory = [p for p in args.inventory if os.path.exists(p)]
+        df, _ = w.generate_cheapest_gathering_list(
+            args.totals, args.recipes, args.gathering, args.output,
+            inventory_csvs=inventory, world=args.world,
+        )
+    else:
+        inventory = [p for p in args.inventory if os.path.exists(p)] if args.net else None
+        df = w.generate_gathering_list(args.totals, args.recipes, args.gathering, args.output,
+                                       inventory_csvs=inventory)
+    for method, group in df.groupby("Method"):
+        print(f"\n=== {method} ===")
+        print(group.drop(columns="Method").to_string(index=False))
+
+
+def cmd_tree(args):
+    import workshop_items as w
+
+    w.print_recipe_tree(args.totals, args.recipes, args.gathering, output=args.output, fmt=args.format,
+                        backrefs=not args.no_backrefs, max_depth=args.max_depth, collapse=args.collapse)
+    if args.output:
+        print(f"Wrote {args.output}")
+
+
+def cmd_route(args):
+    import time
+    from gathering_route import RoutePlanner, plan_gathering_route
+    from node_schedule import ET_DAY, ET_RATIO, eorzea_minute, parse_spawn_times
+
+    start = time.time()
+    if args.at:
+        # Start at the next time the ET clock shows --at.
+        start += (parse_spawn_times(args.at)[0] - eorzea_minute(start)) % ET_DAY * 60 / ET_RATIO
+    planner = RoutePlanner(timed_yield=args.timed_yield, max_visits=args.max_visits)
+    nodes = args.nodes if os.path.exists(args.nodes) else None
+    route, unrouted = plan_gathering_route(args.list, args.output, nodes_csv=nodes, start=start, planner=planner)
+    print(route.to_string(index=False))
+    print(f"\n{len(route)} stops, {route['Leave'].max() if len(route) else 0:.0f} real minutes. "
+          f"Wrote {args.output}")
+    if len(unrouted):
+        print(f"Not routed ({len(unrouted)}): " + ", ".join(sorted(set(unrouted["Ingredient"]))))
+
+
+def cmd_materialize(args):
+    import workshop_items as w
+
+    df = w.materialize_catalog(args.output, args.recipes, args.gathering, processes=args.processes, full=args.full)
+    print(f"Wrote {len(df)} rows to {args.output}")
+
+
+# --- Pipelines ---
+
+def cmd_refresh(args):
+    import pipeline
+
+    stages = pipeline.node_stages(world=args.world, market=not args.no_market) + pipeline.workshop_stages()
+    try:
+        status = pipeline.Pipeline(stages, max_workers=args.jobs).run(only=args.only, force=args.force,
+                                                                      dry_run=args.dry_run)
+    except KeyError as e:
+        sys.exit(e.args[0])
+    for name, outcome in status.items():
+        print(f"  {name:<26} {outcome}")
+    if any(outcome in ("failed", "blocked") for outcome in status.values()):
+        sys.exit(1)
+
+
+def _add_recipe_arguments(parser):
+    parser.add_argument("--totals", default=_utils_path("workshop_output.csv"))
+    parser.add_argument("--recipes", default=_utils_path("recipe_book.csv"))
+    parser.add_argument("--gathering", default=_utils_path("recipe_gathering.csv"))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="tanuki", description="FFXIV timed-node and workshop helpers.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("next-nodes", help="timed nodes up now or spawning soon (no pandas)")
+    p.add_argument("--nodes", default=_nodes_path("final_nodes_with_ids.csv"))
+    p.add_argument("--limit", type=int, default=14)
+    p.add_argument("--since", type=int, default=50, help="include nodes that spawned up to this many ET minutes ago")
+    p.add_argument("--at", help="ET time to ask about instead of now, e.g. 14:00")
+    p.add_argument("--include-rarefied", action="store_true")
+    p.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    p.set_defaults(func=cmd_next_nodes)
+
+    p = commands.add_parser("clean", help="parse wiki node dumps into a CSV")
+    p.add_argument("inputs", nargs="*", help=f"dump files (default {_nodes_path('unspoiled_nodes.txt')})")
+    p.add_argument("-o", "--output", default=_nodes_path("cleaned_nodes.csv"))
+    p.add_argument("--all-columns", action="store_true", help="write level, class, expansion, … as well")
+    p.add_argument("--processes", type=int)
+    p.set_defaults(func=cmd_clean)
+
+    p = commands.add_parser("assign-ids", help="add item IDs to the cleaned nodes")
+    p.add_argument("-i", "--input", default=_nodes_path("cleaned_nodes.csv"))
+    p.add_argument("-o", "--output", default=_nodes_path("final_nodes_with_ids.csv"))
+    p.set_defaults(func=cmd_assign_ids)
+
+    p = commands.add_parser("market", help="sort nodes by current ET and attach market prices")
+    p.add_argument("-i", "--input", default=_nodes_path("final_nodes_with_ids.csv"))
+    p.add_argument("--sorted", default=_nodes_path("final_nodes_with_ids_sorted.csv"))
+    p.add_argument("-o", "--output", default=_nodes_path("final_nodes_with_ids_market.csv"))
+    p.add_argument("--world", default="Seraph")
+    p.set_defaults(func=cmd_market)
+
+    p = commands.add_parser("prefetch", help="fetch prices for nodes spawning in the next few ET hours")
+    p.add_argument("--nodes", default=_nodes_path("final_nodes_with_ids.csv"))
+    p.add_argument("--hours", type=float, default=2, help="ET hours to look ahead")
+    p.add_argument("--budget", type=int, default=5, help="most Universalis requests per cycle")
+    p.add_argument("--watch", action="store_true", help="keep prefetching every --interval seconds")
+    p.add_argument("--interval", type=float, default=60)
+    p.add_argument("--world", default="Seraph")
+    p.set_defaults(func=cmd_prefetch)
+
+    p = commands.add_parser("consolidate", help="total the workshop part CSVs")
+    p.add_argument("--folder", default=_utils_path("workshop_parts"))
+    p.add_argument("--catalog", nargs="+", metavar="KEY", help="total catalog builds instead, e.g. airships/bronco_type")
+    p.set_defaults(func=cmd_consolidate)
+
+    p = commands.add_parser("gathering-list", help="base materials for the consolidated totals")
+    _add_recipe_arguments(p)
+    p.add_argument("-o", "--output", default=_utils_path("gathering_list.csv"))
+    p.add_argument("--cheapest", action="store_true", help="resolve '|' alternatives by market price")
+    p.add_argument("--net", action="store_true", help="subtract --inventory stock at every recipe level")
+    p.add_argument("--inventory", nargs="*",
+                   default=[_utils_path("surplus_crafting.csv"), _utils_path("surplus_gathering.csv")],
+                   help="stock on hand, used with --cheapest or --net")
+    p.add_argument("--world", default="Seraph")
+    p.set_defaults(func=cmd_gathering_list)
+
+    p = commands.add_parser("tree", help="print the recipe tree for the consolidated totals")
+    _add_recipe_arguments(p)
+    p.add_argument("-o", "--output", help="write to a file instead (.txt, .json or .html)")
+    p.add_argument("--format", choices=["text", "json", "html"])
+    p.add_argument("--max-depth", type=int)
+    p.add_argument("--collapse", type=int, metavar="N", help="show at most N ingredients per product")
+    p.add_argument("--no-backrefs", action="store_true", help="repeat shared sub-trees in full")
+    p.set_defaults(func=cmd_tree)
+
+    p = commands.add_parser("route", help="plan the gathering run for a gathering list")
+    p.add_argument("--list", default=_utils_path("gathering_list.csv"))
+    p.add_argument("--nodes", default=_nodes_path("final_nodes_with_ids.csv"), help="spawn times for timed items")
+    p.add_argument("-o", "--output", default=_utils_path("gathering_route.csv"))
+    p.add_argument("--at", help="ET time to start at instead of now, e.g. 14:00")
+    p.add_argument("--timed-yield", type=int, default=30, help="items one timed node visit gives")
+    p.add_argument("--max-visits", type=int, default=8, help="most visits planned per timed item")
+    p.set_defaults(func=cmd_route)
+
+    p = commands.add_parser("materialize", help="materials of every build in data/, with per-category rollups")
+    p.add_argument("--recipes", default=_utils_path("recipe_book.csv"))
+    p.add_argument("--gathering", default=_utils_path("recipe_gathering.csv"))
+    p.add_argument("-o", "--output", default=_utils_path("catalog_materials.csv"))
+    p.add_argument("--processes", type=int)
+    p.add_argument("--full", action="store_true", help="recompute every build, not just changed ones")
+    p.set_defaults(func=cmd_materialize)
+
+    p = commands.add_parser("refresh", help="rerun the node and workshop pipelines, skipping unchanged stages")
+    p.add_argument("--only", nargs="+", metavar="STAGE", help="these stages and what they depend on, e.g. workshop.gathering_list")
+    p.add_argument("--force", action="store_true", help="rerun every stage")
+    p.add_argument("--dry-run", action="store_true", help="show what would run")
+    p.add_argument("--no-market", action="store_true", help="skip the Universalis price stage")
+    p.add_argument("--jobs", type=int, default=4, help="stages run at once")
+    p.add_argument("--world", default="Seraph")
+    p.set_defaults(func=cmd_refresh)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,110 +1,203 @@
 # setup file for timed_nodes.py
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
 import re
 import csv
-import pandas as pd
-import json
-import time
-import requests
-
-def clean_unspoiled_data(input_filename, output_filename):
-    # Read the entire file as a string
+import itertools
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import tracing
+from node_schedule import eorzea_minute, load_node_schedule
+
+# pandas, the item index and the market client are imported inside the functions
+# that use them, so parsing dumps (and the tanuki CLI) start without them.
+
+# --- Wiki Dump Parsing ---
+
+# Patterns used on every table line, compiled once.
+_QUESTLINK = re.compile(r'questlink', re.IGNORECASE)
+_ITEM_TEMPLATE = re.compile(r'\{\{.*?\|([^\}]+)\}\}')
+_ITEM_NOISE = re.compile(r'[{}]|\(Item\)|Collectable')
+_CLUSTER = re.compile(r'cluster', re.IGNORECASE)
+_WIKI_LINK = re.compile(r'\[\[|\]\]')
+_HEADING = re.compile(r'^(={2,})\s*(.*?)\s*\1$')
+_PAGE_TITLE = re.compile(r"'''\s*(\w+) Nodes\s*'''")
+_UPTIME = re.compile(r'\blasts?\s+(?:for\s+)?(\w+)\s+(?:in-game\s+)?hours?', re.IGNORECASE)
+_NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6}
+
+# Columns written by clean_unspoiled_data, and the fuller set from iter_wiki_nodes.
+NODE_COLUMNS = ["Time", "Item Name", "Location", "Coordinates"]
+WIKI_NODE_COLUMNS = NODE_COLUMNS + ["Slot", "Level", "Uptime", "Class", "Expansion", "Node Type", "Source"]
+
+
+def _node_type_from_filename(filename):
+    # e.g. data/timed_nodes/legendary_nodes.txt -> "Legendary"
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return stem.split('_')[0].capitalize()
+
+
+def iter_wiki_nodes(input_filename, node_type=None):
+    """
+    Stream node rows out of a wiki table dump, one line at a time.
+
+    Yields dicts with WIKI_NODE_COLUMNS. Class and Expansion come from the
+    surrounding ==Class== / ===Expansion=== headings, Level from the table's own
+    "! Level" header, and Uptime (ET minutes) from the section's "lasts N hours"
+    note. Node Type is taken from node_type, else the page's bold
+    "'''X Nodes'''" title, else the file name. Rows mentioning a questlink and
+    cluster items are skipped as before.
+    """
+    gathering_class = expansion = uptime = None
+    title_type = None
+    headers = []
     with open(input_filename, 'r', encoding='utf-8') as f:
-        data = f.read()
-    
-    lines = data.split('\n')
-
-    # We’ll store rows of [Time, Item Name, Location, Coordinates].
-    rows = []
-
-    for line in lines:
-        line = line.strip()
-
-        # We're looking for lines in the format:
-        # |Time || {{item icon|Item Name}} || Slot || [[Location]] || (x..,y..) ...
-        if not line.startswith('|'):
-            continue
-        
-        # Split on '||'
-        parts = [p.strip() for p in line.split('||')]
-        if len(parts) < 5:
-            continue
-
-        # Extract the fields we care about:
-        # parts[0] -> time  (remove leading '|')
-        # parts[1] -> item
-        # parts[3] -> location
-        # parts[4] -> coordinate
-        time = parts[0].lstrip('|').strip()
-        item = parts[1]
-        location = parts[3]
-        coordinate = parts[4]
-
-        # Combine entire line to detect questlink if needed
-        entire_line = ' '.join(parts)
-
-        # Skip if 'questlink' is in the line
-        if re.search(r'questlink', entire_line, re.IGNORECASE):
-            continue
-
-        # Clean up the item name:
-        # e.g., {{item icon|Broad Beans}} => Broad Beans
-        item_clean = re.sub(r'\{\{.*?\|([^\}]+)\}\}', r'\1', item)
-        # Remove leftover braces, "Collectable", "(Item)" text, etc.
-        item_clean = re.sub(r'[{}]|\(Item\)|Collectable', '', item_clean).strip()
-
-        # Skip if the item name has the word "cluster" (case-insensitive)
-        if re.search(r'cluster', item_clean, re.IGNORECASE):
-            continue
-
-        # Clean up location, e.g. [[Il Mheg]] => Il Mheg
-        location_clean = re.sub(r'\[\[|\]\]', '', location).strip()
-
-        # Add the row
-        rows.append([time, item_clean, location_clean, coordinate])
-
-    # Write results to a CSV
+        for line in f:
+            line = line.strip()
+
+            heading = _HEADING.match(line)
+            if heading:
+                if len(heading.group(1)) == 2:
+                    gathering_class, expansion = heading.group(2), None
+                elif len(heading.group(1)) == 3:
+                    expansion = heading.group(2)
+                uptime = None
+                continue
+            if title_type is None:
+                title = _PAGE_TITLE.search(line)
+                if title:
+                    title_type = title.group(1)
+            if line.startswith('{|'):
+                headers = []
+                continue
+            if line.startswith('!'):
+                headers.append(line.lstrip('!').strip())
+                continue
+            lasts = _UPTIME.search(line)
+            if lasts:
+                hours = lasts.group(1).lower()
+                hours = int(hours) if hours.isdigit() else _NUMBER_WORDS.get(hours)
+                uptime = hours * 60 if hours else uptime
+
+            # We're looking for lines in the format:
+            # |Time || {{item icon|Item Name}} || Slot || [[Location]] || (x..,y..) || Level ...
+            if not line.startswith('|'):
+                continue
+            parts = [p.strip() for p in line.split('||')]
+            if len(parts) < 5:
+                continue
+            if _QUESTLINK.search(line):
+                continue
+
+            # {{item icon|Broad Beans}} => Broad Beans, minus "Collectable", "(Item)" and braces.
+            item = _ITEM_NOISE.sub('', _ITEM_TEMPLATE.sub(r'\1', parts[1])).strip()
+            if _CLUSTER.search(item):
+                continue
+
+            level_col = headers.index("Level") if "Level" in headers else None
+            yield {
+                "Time": parts[0].lstrip('|').strip(),
+                "Item Name": item,
+                "Location": _WIKI_LINK.sub('', parts[3]).strip(),
+                "Coordinates": parts[4],
+                "Slot": parts[2],
+                "Level": parts[level_col] if level_col is not None and level_col < len(parts) else "",
+                "Uptime": uptime,
+                "Class": gathering_class,
+                "Expansion": expansion,
+                "Node Type": node_type or title_type or _node_type_from_filename(input_filename),
+                "Source": os.path.basename(input_filename),
+            }
+
+
+@tracing.traced("nodes.clean_unspoiled")
+def clean_unspoiled_data(input_filename, output_filename):
+    # Stream the dump and write [Time, Item Name, Location, Coordinates] rows as they're parsed.
     with open(output_filename, 'w', encoding='utf-8', newline='') as out_csv:
         writer = csv.writer(out_csv)
-        writer.writerow(["Time", "Item Name", "Location", "Coordinates"])
-        writer.writerows(rows)
-
+        writer.writerow(NODE_COLUMNS)
+        for node in iter_wiki_nodes(input_filename):
+            writer.writerow([node[col] for col in NODE_COLUMNS])
+            tracing.add_rows(1)
+
+
+def _parse_wiki_dump(input_filename, shard_filename):
+    # Worker: stream one dump into its own headerless CSV shard; returns the row count.
+    written = 0
+    with open(shard_filename, 'w', encoding='utf-8', newline='') as shard:
+        writer = csv.DictWriter(shard, fieldnames=WIKI_NODE_COLUMNS)
+        for row in iter_wiki_nodes(input_filename):
+            writer.writerow(row)
+            written += 1
+    return written
+
+
+@tracing.traced("nodes.clean_wiki_dumps")
+def clean_wiki_dumps(input_filenames, output_filename, processes=None):
+    """
+    Parse several wiki dumps (legendary, unspoiled, ephemeral, folklore, …) into
+    one CSV with WIKI_NODE_COLUMNS.
+
+    Files are spread over a process pool. Each worker streams its file into a
+    temporary CSV shard, and shards are copied into the output in input order,
+    a block at a time. Only a couple of files per worker are in flight at once,
+    so memory stays flat however many or however large the dumps are.
+    Returns the number of rows written.
+    """
+    input_filenames = list(input_filenames)
+    written = 0
+    with open(output_filename, 'w', encoding='utf-8', newline='') as out_csv:
+        writer = csv.DictWriter(out_csv, fieldnames=WIKI_NODE_COLUMNS)
+        writer.writeheader()
+        if len(input_filenames) <= 1 or processes == 1:
+            for name in input_filenames:
+                for row in iter_wiki_nodes(name):
+                    writer.writerow(row)
+                    written += 1
+        else:
+            workers = processes or os.cpu_count() or 1
+            shard_dir = os.path.dirname(os.path.abspath(output_filename))
+            with tempfile.TemporaryDirectory(dir=shard_dir) as tmp, \
+                    ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+                names = iter(enumerate(input_filenames))
+                while True:
+                    # Keep at most two files per worker queued or finished-but-unwritten.
+                    for i, name in itertools.islice(names, 2 * workers - len(pending)):
+                        shard = os.path.join(tmp, f"{i}.csv")
+                        pending.append((pool.submit(_parse_wiki_dump, name, shard), shard))
+                    if not pending:
+                        break
+                    future, shard = pending.popleft()
+                    written += future.result()
+                    with open(shard, 'r', encoding='utf-8', newline='') as f:
+                        shutil.copyfileobj(f, out_csv, 1 << 20)
+                    os.remove(shard)
+    tracing.add_rows(written)
+    return written
+
+
+@tracing.traced("nodes.assign_ids")
 def assign_ids(input_filename, output_filename):
-    # Load the JSON file with item IDs.
-    utils_dir = 'utilities/'
-    with open(os.path.join(utils_dir, "item_ids.json"), "r", encoding="utf-8") as f:
-        item_json = json.load(f)
+    import pandas as pd
+    from item_index import get_item_index
 
-    # Build a mapping: lower-case English item name -> item ID
-    item_mapping = {}
-    for item_id, names in item_json.items():
-        en_name = names.get("en", "").strip().lower()
-        item_mapping[en_name] = item_id
+    # Open the prebuilt item name -> ID index (rebuilt only when item_ids.json changes).
+    utils_dir = 'utilities/'
+    index = get_item_index(os.path.join(utils_dir, "item_ids.json"), os.path.join(utils_dir, "item_ids.idx"))
 
     # Read in the cleaned nodes CSV.
     nodes_df = pd.read_csv(input_filename)
 
-    # Function to clean item names for matching:
-    # Remove occurrences of "(Rare)" (case-insensitive), then lower-case and strip.
-    def clean_item_name(name):
-        # Remove the substring (Rare) along with any extra spaces
-        name_clean = re.sub(r'\s*\(rare\)', '', name, flags=re.IGNORECASE)
-        return name_clean.strip().lower()
-        
-    nodes_df["Item Name Clean"] = nodes_df["Item Name"].apply(clean_item_name)
-
-    # Function to look up the item ID using the cleaned item name.
-    def get_item_id(row):
-        name = row["Item Name Clean"]
-        if name in item_mapping:
-            return item_mapping[name]
-        else:
-            print(f"Error: No ID found for item '{row['Item Name']}' (cleaned as '{name}').")
-            return None
-        
-    # Apply the lookup function to each row.
-    nodes_df["ID"] = nodes_df.apply(get_item_id, axis=1)
+    # Look up every item name in one vectorized pass. Names are cleaned the same way
+    # as before ("(Rare)" removed, lower-cased, stripped), with a token-based fuzzy
+    # retry for near misses; anything still missing is reported with suggestions.
+    with tracing.stage("nodes.id_lookup"):
+        nodes_df["ID"] = index.lookup(nodes_df["Item Name"])
+        tracing.add_rows(len(nodes_df))
+    index.report_missing(nodes_df["Item Name"], nodes_df["ID"])
 
     # Reorder columns to prepend the ID.
     final_df = nodes_df[["ID", "Time", "Item Name", "Location", "Coordinates"]]
@@ -112,85 +205,37 @@ def assign_ids(input_filename, output_filename):
     # Write the final merged CSV.
     final_df.to_csv(output_filename, index=False)
 
+@tracing.traced("nodes.sort_for_current_time")
 def sort_for_current_time(input_filename, output_filename):
+    import pandas as pd
+
     # -----------------------
     # 1. Compute current Eorzean time in 24-hour format
     # -----------------------
-    local_epoch = int(time.time() * 1000)
-    epoch = local_epoch * 20.571428571428573
-    minutes = int((epoch / (1000 * 60)) % 60)
-    hours_24 = int((epoch / (1000 * 60 * 60)) % 24)
-    et_time_str = f"{hours_24:02d}:{minutes:02d}"
-    print("Current Eorzean time (raw):", et_time_str)
-    current_time = datetime.strptime(et_time_str, "%H:%M")
+    now = eorzea_minute()
+    print("Current Eorzean time (raw):", f"{now // 60:02d}:{now % 60:02d}")
 
     # -----------------------
-    # 2. Load final_nodes_with_ids.csv and duplicate ambiguous AM/PM entries
+    # 2. Load the spawn-window index for final_nodes_with_ids.csv (built once per file
+    #    version; ambiguous AM/PM entries are already split into two windows).
     # -----------------------
-    df = pd.read_csv(input_filename)
-
-    new_rows = []
-
-    def standard_parse_time(time_str):
-        # If the string contains "AM" or "PM" (but not ambiguous "AM/PM"), parse using 12-hour clock.
-        if re.search(r'\b(AM|PM)\b', time_str, re.IGNORECASE) and "AM/PM" not in time_str.upper():
-            time_str_fixed = re.sub(r'(\d)(AM|PM)', r'\1 \2', time_str, flags=re.IGNORECASE)
-            return datetime.strptime(time_str_fixed, "%I:%M %p")
-        else:
-            # Otherwise, assume it’s already in 24-hour format.
-            return datetime.strptime(time_str, "%H:%M")
-
-    for idx, row in df.iterrows():
-        time_str = row["Time"].strip()
-        # If the time is ambiguous (contains "AM/PM"), duplicate the row.
-        if "AM/PM" in time_str.upper():
-            base_time_str = re.sub(r'\s*AM/PM', '', time_str, flags=re.IGNORECASE).strip()
-            base_time = datetime.strptime(base_time_str, "%H:%M")
-            # Create two interpretations:
-            # AM version: keep the base time as-is (special handling for 12:00).
-            # PM version: add 12 hours (unless base time is 12:00).
-            if base_time.hour == 12:
-                am_time = base_time.replace(hour=0)
-                pm_time = base_time
-            else:
-                am_time = base_time
-                pm_time = base_time + timedelta(hours=12)
-            
-            row_am = row.copy()
-            row_am["Parsed Time"] = am_time
-            row_am["Time"] = am_time.strftime("%H:%M")
-            new_rows.append(row_am)
-            
-            row_pm = row.copy()
-            row_pm["Parsed Time"] = pm_time
-            row_pm["Time"] = pm_time.strftime("%H:%M")
-            new_rows.append(row_pm)
-        else:
-            parsed = standard_parse_time(time_str)
-            row_new = row.copy()
-            row_new["Parsed Time"] = parsed
-            row_new["Time"] = parsed.strftime("%H:%M")
-            new_rows.append(row_new)
-
-    df_new = pd.DataFrame(new_rows)
+    schedule = load_node_schedule(input_filename)
 
     # -----------------------
-    # 3. Compute the time difference (in minutes) between each node’s spawn time and the current time.
-    #    (The difference is computed on a circular 24-hour scale, ranging from -720 to 720.)
-    def compute_time_diff_minutes(node_time, current_time):
-        node_minutes = node_time.hour * 60 + node_time.minute
-        current_minutes = current_time.hour * 60 + current_time.minute
-        diff = ((node_minutes - current_minutes + 720) % 1440) - 720
-        return diff
-
-    df_new["time_diff"] = df_new["Parsed Time"].apply(lambda t: compute_time_diff_minutes(t, current_time))
-
+    # 3. Take nodes that are active (spawned up to 50 minutes ago or later). The time
+    #    difference is on a circular 24-hour scale, from -720 to 720 minutes, and the
+    #    index returns windows already ordered by it, ties by item name, so the 14
+    #    kept don't depend on the CSV's row order.
     # -----------------------
-    # 4. Filter nodes that are active (spawned up to 50 minutes ago or later).
-    #    (No upper bound is set; we simply require time_diff >= -50.)
-    active_df = df_new[df_new["time_diff"] >= -50]
-    active_sorted = active_df.sort_values(by="time_diff")
-    df_active_top10 = active_sorted.head(14)
+    rows = []
+    for time_diff, window in schedule.upcoming(now, since=50, limit=14):
+        parsed = datetime(1900, 1, 1, window.start // 60, window.start % 60)
+        row = dict(window.row)
+        row["Time"] = parsed.strftime("%H:%M")
+        row["Parsed Time"] = parsed
+        row["time_diff"] = time_diff
+        rows.append(row)
+    df_active_top10 = pd.DataFrame(rows, columns=["ID", "Time", "Item Name", "Location", "Coordinates", "Parsed Time", "time_diff"])
 
     print("\nActive nodes (with time difference in minutes):")
     print(df_active_top10[["ID", "Time", "Item Name", "Location", "Coordinates", "time_diff"]])
@@ -200,7 +245,26 @@ def sort_for_current_time(input_filename, output_filename):
 
 
 
-def generate_market_data(input_filename, output_filename):
+def _fetch_reporting_hits(client, item_ids):
+    # client.fetch, plus how many prices were already fresh in the cache (clients with cache stats only).
+    before = dict(getattr(client, "stats", None) or {})
+    market = client.fetch(item_ids)
+    after = getattr(client, "stats", None)
+    if before and after:
+        hits = after["hits"] - before["hits"]
+        total = hits + (after["stale"] - before["stale"]) + (after["misses"] - before["misses"])
+        if total:
+            print(f"Prices: {hits} of {total} already fresh in the cache ({hits / total:.0%})")
+    return market
+
+
+@tracing.traced("nodes.market_data")
+def generate_market_data(input_filename, output_filename, world="Seraph", client=None, history=None):
+    import pandas as pd
+    from market_client import MARKET_COLUMNS, empty_market_fields, normalize_item_id
+    from price_cache import CachedMarketClient
+    from price_history import get_price_history
+
     # -----------------------
     # 1. Read the active nodes CSV and filter out any rows with "Rarefied" in the Item Name.
     # -----------------------
@@ -208,67 +272,32 @@ def generate_market_data(input_filename, output_filename):
     df_filtered = df_sorted[~df_sorted["Item Name"].str.contains("Rarefied", case=False, na=False)]
     df_top10 = df_filtered.head(14).copy()
 
-    # Define new column names for the market data we want to add.
-    market_columns = [
-        "minListing_world", 
-        "minListing_dc", 
-        "recentPurchase_world", 
-        "recentPurchase_dc", 
-        "averageSalePrice_dc", 
-        "dailySaleVelocity_dc"
-    ]
-
-    # Initialize the new columns with None.
-    for col in market_columns:
-        df_top10[col] = None
-
     # -----------------------
-    # 2. Set default world and define a function to fetch market data.
+    # 2. Fetch market data for every item, answering from the local price cache
+    #    where possible and batching the rest. (Pass a client to reuse it across calls.)
+    #    Prices warmed by price_prefetch.PricePrefetcher show up as cache hits.
     # -----------------------
-    world = "Seraph"
-
-    def fetch_market_data(item_id, world):
-        url = f"https://universalis.app/api/v2/aggregated/{world}/{item_id}"
-        try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                if "results" in data and len(data["results"]) > 0:
-                    result = data["results"][0]
-                    # Extract the required market values.
-                    minListing_world = result.get("nq", {}).get("minListing", {}).get("world", {}).get("price")
-                    minListing_dc = result.get("nq", {}).get("minListing", {}).get("dc", {}).get("price")
-                    recentPurchase_world = result.get("nq", {}).get("recentPurchase", {}).get("world", {}).get("price")
-                    recentPurchase_dc = result.get("nq", {}).get("recentPurchase", {}).get("dc", {}).get("price")
-                    averageSalePrice_dc = result.get("nq", {}).get("averageSalePrice", {}).get("dc", {}).get("price")
-                    dailySaleVelocity_dc = result.get("nq", {}).get("dailySaleVelocity", {}).get("dc", {}).get("quantity")
-                    return {
-                        "minListing_world": minListing_world,
-                        "minListing_dc": minListing_dc,
-                        "recentPurchase_world": recentPurchase_world,
-                        "recentPurchase_dc": recentPurchase_dc,
-                        "averageSalePrice_dc": averageSalePrice_dc,
-                        "dailySaleVelocity_dc": dailySaleVelocity_dc,
-                    }
-                else:
-                    print(f"No results found for item ID {item_id}")
-            else:
-                print(f"Error fetching data for item ID {item_id}. Status code: {response.status_code}")
-        except Exception as e:
-            print(f"Exception for item ID {item_id}: {e}")
-        # Return a dict with None values if something went wrong.
-        return {col: None for col in market_columns}
+    if client is None:
+        with CachedMarketClient(world=world) as client:
+            market = _fetch_reporting_hits(client, df_top10["ID"])
+    else:
+        market = _fetch_reporting_hits(client, df_top10["ID"])
 
     # -----------------------
-    # 3. Loop through the filtered top 10 rows, fetch market data for each item, and update the DataFrame.
+    # 3. Add the market columns to the top rows.
     # -----------------------
-    for idx, row in df_top10.iterrows():
-        item_id = row["ID"]
-        market_data = fetch_market_data(item_id, world)
-        for key, value in market_data.items():
-            df_top10.at[idx, key] = value
+    rows = [market.get(normalize_item_id(item_id), empty_market_fields()) for item_id in df_top10["ID"]]
+    for col in MARKET_COLUMNS:
+        df_top10[col] = pd.Series([row[col] for row in rows], index=df_top10.index, dtype=object)
 
     # -----------------------
     # 4. Save the augmented DataFrame to a new CSV file and display it.
     # -----------------------
-    df_top10.to_csv(output_filename, index=False)
\ No newline at end of file
+    df_top10.to_csv(output_filename, index=False)
+
+    # -----------------------
+    # 5. Keep the snapshot in the price history (utilities/price_history/ unless a
+    #    PriceHistory is passed; history=False skips it).
+    # -----------------------
+    if history is not False:
+        (history or get_price_history()).append(df_top10, world=world)
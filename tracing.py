@@ -0,0 +1,260 @@
+# Opt-in stage timing, counters and HTTP latency histograms for the pipelines
+import atexit
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+# Set TANUKI_TRACE=path to trace a whole process (.jsonl for JSON lines, else Chrome trace JSON).
+ENV_VAR = "TANUKI_TRACE"
+
+# Upper bounds (ms) of the HTTP latency histogram buckets; the last bucket is open-ended.
+LATENCY_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+# The active Tracer, or None. Everything below checks this first and does nothing when off.
+_active = None
+
+
+class _Stage:
+    __slots__ = ("tracer", "name", "args", "start", "rows")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.rows = 0
+
+    def __enter__(self):
+        self.tracer._stack().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.tracer._stack().pop()
+        self.tracer._finish(self, end)
+
+
+class _NoStage:
+    # Shared do-nothing stand-in for _Stage when tracing is off.
+    rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+class Tracer:
+    """
+    Collects one event per finished stage plus aggregate statistics:
+
+    - stages: {name: {"calls", "total_s", "max_s", "rows"}}
+    - counters: {name: int}, e.g. "recipe_graph.cache_hit"
+    - latencies: {name: [count per LATENCY_BUCKETS_MS bucket]}, plus raw samples
+
+    Stage events become Chrome trace "complete" events (chrome://tracing or
+    https://ui.perfetto.dev) or one JSON object per line.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events = []
+        self.stages = {}
+        self.counters = {}
+        self.latencies = {}
+        self.samples = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _finish(self, stage, end):
+        duration = end - stage.start
+        event = {
+            "name": stage.name,
+            "ph": "X",
+            "ts": round((stage.start - self.origin) * 1e6, 1),
+            "dur": round(duration * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": dict(stage.args, rows=stage.rows) if stage.rows else dict(stage.args),
+        }
+        with self._lock:
+            self.events.append(event)
+            stats = self.stages.setdefault(stage.name, {"calls": 0, "total_s": 0.0, "max_s": 0.0, "rows": 0})
+            stats["calls"] += 1
+            stats["total_s"] += duration
+            stats["max_s"] = max(stats["max_s"], duration)
+            stats["rows"] += stage.rows
+
+    def stage(self, name, **args):
+        return _Stage(self, name, args)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_rows(self, n):
+        stack = self._stack()
+        if stack:
+            stack[-1].rows += n
+
+    def latency(self, name, seconds, **args):
+        ms = seconds * 1000
+        with self._lock:
+            buckets = self.latencies.setdefault(name, [0] * (len(LATENCY_BUCKETS_MS) + 1))
+            buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+            self.samples.setdefault(name, []).append(ms)
+            self.events.append({
+                "name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                "ts": round((time.perf_counter() - seconds - self.origin) * 1e6, 1),
+                "dur": round(seconds * 1e6, 1), "args": args,
+            })
+
+    # --- Output ---
+
+    def write(self, path):
+        """Chrome trace JSON, or JSON lines when path ends in .jsonl (events, then counters and histograms)."""
+        if path.endswith(".jsonl"):
+            with open(path, "w", encoding="utf-8") as f:
+                for event in self.events:
+                    f.write(json.dumps(event) + "\n")
+                for name, value in self.counters.items():
+                    f.write(json.dumps({"counter": name, "value": value}) + "\n")
+                for name, buckets in self.latencies.items():
+                    f.write(json.dumps({"histogram": name, "buckets_ms": LATENCY_BUCKETS_MS, "counts": buckets}) + "\n")
+        else:
+            counters = [
+                {"name": name, "ph": "C", "ts": 0, "pid": os.getpid(), "args": {"value": value}}
+                for name, value in self.counters.items()
+            ]
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"traceEvents": self.events + counters, "displayTimeUnit": "ms"}, f)
+
+    def summary(self):
+        """Plain-text tables of stages (slowest first), counters and HTTP latencies."""
+        lines = [f"{'stage':<40} {'calls':>6} {'total ms':>10} {'mean ms':>9} {'max ms':>9} {'rows':>9}"]
+        for name, s in sorted(self.stages.items(), key=lambda kv: -kv[1]["total_s"]):
+            lines.append(
+                f"{name:<40} {s['calls']:>6} {s['total_s'] * 1000:>10.1f} "
+                f"{s['total_s'] * 1000 / s['calls']:>9.1f} {s['max_s'] * 1000:>9.1f} {s['rows'] or '':>9}"
+            )
+        if self.counters:
+            lines.append("")
+            lines.append(f"{'counter':<40} {'value':>6}")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name:<40} {value:>6}")
+        for name, buckets in self.latencies.items():
+            samples = sorted(self.samples[name])
+            p50 = samples[len(samples) // 2]
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            lines.append("")
+            lines.append(f"{name}: {len(samples)} calls, p50 {p50:.0f} ms, p95 {p95:.0f} ms, max {samples[-1]:.0f} ms")
+            bounds = [f"<={b}" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}"]
+            for bound, n in zip(bounds, buckets):
+                if n:
+                    lines.append(f"  {bound:>7} ms  {n:>5}  {'#' * min(n, 50)}")
+        return "\n".join(lines)
+
+    def print_summary(self):
+        print(self.summary())
+
+
+# --- Module-level hooks (no-ops unless a Tracer is active) ---
+
+def active():
+    """The running Tracer, or None."""
+    return _active
+
+
+def stage(name, **args):
+    """Context manager timing one pipeline stage: `with tracing.stage("assign_ids"): ...`."""
+    if _active is None:
+        return _NO_STAGE
+    return _active.stage(name, **args)
+
+
+def traced(name):
+    """Decorator form of stage()."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, n=1):
+    """Bump a counter (cache hits, retries, …)."""
+    if _active is not None:
+        _active.count(name, n)
+
+
+def add_rows(n):
+    """Add to the rows-processed figure of the innermost running stage."""
+    if _active is not None:
+        _active.add_rows(n)
+
+
+def latency(name, seconds, **args):
+    """Record one timed call (e.g. an HTTP request) in the named histogram."""
+    if _active is not None:
+        _active.latency(name, seconds, **args)
+
+
+class trace:
+    """
+    Turn tracing on for a block and get the Tracer back:
+
+        with tracing.trace("run.json") as t:
+            generate_gathering_list(...)
+        t.print_summary()
+
+    The file (optional) is written when the block exits.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.tracer = Tracer()
+        self._previous = None
+
+    def __enter__(self):
+        global _active
+        self._previous, _active = _active, self.tracer
+        return self.tracer
+
+    def __exit__(self, *exc):
+        global _active
+        _active = self._previous
+        if self.path:
+            self.tracer.write(self.path)
+
+
+def _trace_from_environment():
+    global _active
+    path = os.environ.get(ENV_VAR)
+    if not path:
+        return
+    tracer = _active = Tracer()
+
+    def _finish():
+        tracer.write(path)
+        print(tracer.summary())
+    atexit.register(_finish)
+
+
+_trace_from_environment()
@@ -1,76 +1,681 @@
 import csv
+import hashlib
+import heapq
 import json
-import re
+import math
 import time
-import requests
+import numpy as np
 import pandas as pd
 import os
 import glob
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import tracing
+from item_index import get_item_index
+from item_model import CompactCatalog, CompactRecipes
+from parts_catalog import PartsCatalog, build_name, parse_part_file
+from recipe_tree import render_recipe_tree
 
 # --- Helper Functions ---
 
-def max_columns_in_csv(filepath):
-    """Determine the maximum number of columns in a CSV file."""
-    with open(filepath, newline='') as f:
+def load_csv_with_max_columns(filepath):
+    """
+    Load a ragged CSV into a NaN-padded DataFrame.
+
+    Rows are streamed once through iter_csv_rows (blank rows are skipped, as in
+    iter_recipe_book); the frame is as wide as the widest row, and columns that
+    are entirely numeric become floats.
+    """
+    rows = [fields for _, fields in iter_csv_rows(filepath)]
+    df = pd.DataFrame(rows, columns=range(max(map(len, rows), default=0))).replace('', np.nan)
+    for col in df.columns:
+        try:
+            df[col] = pd.to_numeric(df[col])
+        except (ValueError, TypeError):
+            pass
+    return df
+
+def iter_csv_rows(filepath):
+    """Yield (line_number, fields) for every non-blank row of a ragged CSV, in one pass."""
+    with open(filepath, newline='', encoding='utf-8') as f:
         reader = csv.reader(f)
-        return max(len(row) for row in reader)
+        for fields in reader:
+            if any(v.strip() for v in fields):
+                yield reader.line_num, fields
+
+def _report_malformed(filepath, line_number, reason):
+    print(f"Warning: {filepath} line {line_number}: {reason}")
+
+def iter_recipe_book(filepath):
+    """
+    Yield (product, [(ingredient, qty), …]) for each recipe in a recipe book CSV.
+
+    Rows are product followed by ingredient/quantity pairs. An ingredient with a
+    missing quantity counts as 0 and a non-numeric quantity drops that ingredient;
+    both are reported with their line number.
+    """
+    for line_number, fields in iter_csv_rows(filepath):
+        ingredients = []
+        for i in range(1, len(fields), 2):
+            ingredient = fields[i]
+            if not ingredient.strip():
+                break
+            raw_qty = fields[i + 1].strip() if i + 1 < len(fields) else ''
+            if not raw_qty:
+                _report_malformed(filepath, line_number, f"no quantity for '{ingredient}', using 0")
+                qty = 0
+            else:
+                try:
+                    qty = float(raw_qty)
+                except ValueError:
+                    _report_malformed(filepath, line_number, f"bad quantity '{raw_qty}' for '{ingredient}', skipped")
+                    continue
+            ingredients.append((ingredient, qty))
+        yield fields[0], ingredients
+
+def iter_recipe_gathering(filepath):
+    """Yield (ingredient, method, location_info) for each row of a gathering CSV."""
+    for line_number, fields in iter_csv_rows(filepath):
+        if len(fields) < 2 or not fields[1].strip():
+            _report_malformed(filepath, line_number, f"no gathering method for '{fields[0]}'")
+            continue
+        location = ", ".join(v.strip() for v in fields[2:] if v.strip())
+        yield fields[0], fields[1], location
+
+def read_totals(filepath):
+    """Read an 'item,quantity' totals CSV into {item: quantity} (last row wins)."""
+    totals = {}
+    for line_number, fields in iter_csv_rows(filepath):
+        try:
+            totals[fields[0]] = float(fields[1])
+        except (IndexError, ValueError):
+            _report_malformed(filepath, line_number, f"no usable quantity for '{fields[0]}', skipped")
+    return totals
+
+def read_inventory(csv_paths):
+    """Stock on hand summed over 'item,quantity' CSVs such as utilities/surplus_crafting.csv."""
+    inventory = {}
+    for path in csv_paths or []:
+        for item, qty in read_totals(path).items():
+            inventory[item] = inventory.get(item, 0) + qty
+    return inventory
+
+# --- Recipe Graph ---
+
+class RecipeGraph:
+    """
+    Parsed recipe book plus gathering info, shared by every BOM expansion.
+
+    The recipe book is parsed once and topologically sorted so each product's
+    expansion is built from its (already expanded) ingredients. Expansions are
+    cached per item at a multiplier of 1 and scaled on lookup, so the work grows
+    with the number of distinct items rather than the number of tree paths.
+
+    - recipes: {product: [(ingredient, qty), …]} (ingredient may hold '|' alternatives)
+    - gathering: {ingredient: [(method, location_info), …]} in file order
+    """
+
+    def __init__(self, recipes, gathering=None):
+        self.recipes = recipes
+        self.gathering = gathering or {}
+        self.order = self._topological_order()
+        self._crystal_terms = {}
+        self._compact = None
+        self._base = {}
+        for item in self.order:
+            self._base[item] = self._expand_base(item)
+
+    @classmethod
+    def from_csv(cls, recipe_book_csv, recipe_gathering_csv=None):
+        """Build a graph straight from the recipe book and gathering CSVs."""
+        with tracing.stage("recipe_graph.parse"):
+            recipes = dict(iter_recipe_book(recipe_book_csv))
+            gathering = defaultdict(list)
+            if recipe_gathering_csv is not None:
+                for ingredient, method, location in iter_recipe_gathering(recipe_gathering_csv):
+                    gathering[ingredient].append((method, location))
+            tracing.add_rows(len(recipes))
+        with tracing.stage("recipe_graph.build"):
+            return cls(recipes, dict(gathering))
+
+    @staticmethod
+    def options(ingredient):
+        """Split an ingredient cell into its '|' alternatives."""
+        return [opt.strip() for opt in str(ingredient).split('|')]
+
+    def _topological_order(self):
+        # Kahn's algorithm: ingredients come before the products that use them.
+        dependents = defaultdict(list)
+        pending = {}
+        for product, ingredients in self.recipes.items():
+            needs = {opt for ing, _ in ingredients for opt in self.options(ing) if opt in self.recipes}
+            pending[product] = len(needs)
+            for opt in needs:
+                dependents[opt].append(product)
+        ready = [p for p, n in pending.items() if n == 0]
+        order = []
+        while ready:
+            item = ready.pop()
+            order.append(item)
+            for parent in dependents[item]:
+                pending[parent] -= 1
+                if pending[parent] == 0:
+                    ready.append(parent)
+        if len(order) != len(self.recipes):
+            stuck = sorted(str(p) for p, n in pending.items() if n > 0)
+            raise ValueError(f"Recipe cycle detected involving: {', '.join(stuck)}")
+        return order
+
+    def method(self, item):
+        """Gathering method for an item (last entry wins), or None if unknown."""
+        entries = self.gathering.get(item)
+        return entries[-1][0] if entries else None
+
+    def is_crystal(self, item):
+        return str(self.method(item) or '').lower() == "crystal"
+
+    # Base materials: alternatives share the quantity evenly.
+    def _expand_base(self, item):
+        totals = defaultdict(float)
+        for ingredient, qty in self.recipes[item]:
+            options = self.options(ingredient)
+            for opt in options:
+                share = qty / len(options)
+                if opt in self._base:
+                    for base, amount in self._base[opt].items():
+                        totals[base] += amount * share
+                else:
+                    totals[opt] += share
+        return dict(totals)
+
+    def base_requirements(self, item, multiplier=1):
+        """Base (non-craftable) ingredients needed for `multiplier` of `item`."""
+        if item not in self._base:
+            return {item: multiplier}
+        return {base: amount * multiplier for base, amount in self._base[item].items()}
+
+    def expand(self, top_level):
+        """Total base requirements for a {product: quantity} mapping."""
+        requirements = defaultdict(float)
+        for product, qty in top_level.items():
+            for base, amount in self.base_requirements(product, qty).items():
+                requirements[base] += amount
+        return requirements
+
+    # Bulk expansion: the recipe book as interned, array-backed adjacency.
+    @property
+    def compact(self):
+        """The recipes as a CompactRecipes (item_model.py), built once per graph."""
+        if self._compact is None:
+            self._compact = CompactRecipes.from_recipes(self.recipes)
+        return self._compact
+
+    def expand_many(self, projects):
+        """
+        Base requirements for many projects in one vectorized pass.
+
+        projects: {project_name: {item: quantity}}. Returns a DataFrame with one
+        row per project and one column per base item (crystals included), with
+        the same totals expand() gives for each project on its own.
+        """
+        names = self.compact.names.copy()  # project-only items get IDs without touching the graph's table
+        item_ids, project_rows, qty = [], [], []
+        for p, demand in enumerate(projects.values()):
+            for item, amount in demand.items():
+                item_ids.append(names.intern(item))
+                project_rows.append(p)
+                qty.append(amount)
+        return self._expand_demand(list(projects), names, np.array(item_ids, dtype=np.int32),
+                                   np.array(project_rows, dtype=np.int32), np.array(qty, dtype=float))
+
+    def _expand_demand(self, project_names, names, item_ids, project_rows, qty):
+        # Demand given as (item ID, project row, qty) triples over `names`, a superset of compact.names.
+        totals = np.zeros((len(names), len(project_names)))
+        np.add.at(totals, (item_ids, project_rows), qty)
+        self.compact.push_down(totals)
+
+        base_ids = np.arange(self.compact.n_products, len(names))
+        base_ids = base_ids[totals[base_ids].any(axis=1)]
+        base_ids = base_ids[np.argsort([names[i] for i in base_ids], kind="stable")]
+        return pd.DataFrame(totals[base_ids].T, index=project_names, columns=[names[i] for i in base_ids])
+
+    # Cheapest alternatives: memoized DP over the DAG, ingredients first.
+    def unit_costs(self, prices):
+        """
+        Cheapest cost of one unit of every item and the option picked at each '|'.
+
+        Leaves cost their price in `prices` ({item: gil}); products cost the sum
+        of their ingredients, taking the cheapest option of each alternative.
+        Unpriced leaves count as infinitely expensive, so a priced option always
+        wins; if no option is priced the first one is kept.
+
+        Returns (costs, choices) where choices maps (product, ingredient_cell) to
+        the chosen option.
+        """
+        costs, choices = {}, {}
+
+        def cost_of(item):
+            if item in costs:
+                return costs[item]
+            price = prices.get(item)
+            return float(price) if price is not None and not pd.isna(price) else math.inf
+
+        for product in self.order:
+            total = 0.0
+            for ingredient, qty in self.recipes[product]:
+                options = self.options(ingredient)
+                best = min(options, key=cost_of)
+                if len(options) > 1:
+                    choices[(product, ingredient)] = best
+                total += qty * cost_of(best)
+            costs[product] = total
+        return costs, choices
+
+    def cheapest_plan(self, top_level, prices, inventory=None):
+        """
+        Concrete gathering/crafting quantities for {product: qty} using the
+        cheapest option at every choice point.
+
+        Stock in `inventory` is used up before an item is crafted or gathered.
+        At a '|' choice only the shortfall (quantity needed less the stock still
+        free after other demand) is priced, at the unit_costs market cost, so a
+        few units on hand don't make an expensive option win. Demand is pushed
+        down in topological order, so every item is expanded once however many
+        parents share it.
+
+        Returns {"gather": {item: qty}, "craft": {item: qty},
+                 "used": {item: qty taken from inventory}, "choices": {...}}.
+        """
+        inventory = dict(inventory or {})
+        costs, _ = self.unit_costs(prices)
+        demand = defaultdict(float)
+        for product, qty in top_level.items():
+            demand[product] += qty
+
+        def unit_cost(item):
+            if item in costs:
+                return costs[item]
+            price = prices.get(item)
+            return float(price) if price is not None and not pd.isna(price) else math.inf
+
+        def shortfall_cost(option, qty):
+            short = qty - max(0.0, inventory.get(option, 0) - demand.get(option, 0))
+            return (short * unit_cost(option) if short > 0 else 0.0), unit_cost(option)
+
+        choices = {}
+        used, craft, gather = {}, {}, {}
+
+        def settle(item):
+            qty = demand.pop(item, 0)
+            take = min(qty, inventory.get(item, 0))
+            if take > 0:
+                used[item] = take
+                inventory[item] -= take
+            return qty - take
+
+        for product in reversed(self.order):
+            qty = settle(product)
+            if qty <= 0:
+                continue
+            craft[product] = qty
+            for ingredient, per_unit in self.recipes[product]:
+                options = self.options(ingredient)
+                option = options[0]
+                if len(options) > 1:
+                    option = choices[(product, ingredient)] = min(
+                        options, key=lambda o: shortfall_cost(o, per_unit * qty))
+                demand[option] += per_unit * qty
+        for item in list(demand):
+            qty = settle(item)
+            if qty > 0:
+                gather[item] = qty
+        return {"gather": gather, "craft": craft, "used": used, "choices": choices}
+
+    def net_requirements(self, top_level, inventory=None):
+        """NetRequirements for {product: qty} less the stock in `inventory`."""
+        return NetRequirements(self, top_level, inventory)
+
+    # Crystals: each term is a tuple of (crystal, qty) alternatives.
+    def crystal_terms(self, item):
+        """Crystal terms needed for one unit of `item`, cached per item."""
+        if item in self._crystal_terms:
+            return self._crystal_terms[item]
+        if item not in self.recipes:
+            terms = (((item, 1),),) if self.is_crystal(item) else ()
+        else:
+            ingredients = [(self.options(ing), qty) for ing, qty in self.recipes[item]]
+            if all(len(opts) == 1 and self._is_crystal_leaf(opts[0]) for opts, _ in ingredients):
+                # Every ingredient is a bare crystal: they read as a single term.
+                terms = (tuple((opts[0], qty) for opts, qty in ingredients),)
+            else:
+                terms = ()
+                for opts, qty in ingredients:
+                    if len(opts) > 1 and all(self._is_crystal_leaf(o) for o in opts):
+                        terms += (tuple((o, qty) for o in opts),)
+                    else:
+                        for o in opts:
+                            terms += self._scale(self.crystal_terms(o), qty)
+        self._crystal_terms[item] = terms
+        return terms
+
+    def _is_crystal_leaf(self, item):
+        return item not in self.recipes and self.is_crystal(item)
+
+    @staticmethod
+    def _scale(terms, multiplier):
+        return tuple(tuple((name, qty * multiplier) for name, qty in term) for term in terms)
+
+    def crystals_needed(self, item, multiplier=1):
+        """Crystals for `multiplier` of `item`, formatted as 'A x n | B x n & C x n'."""
+        return " & ".join(
+            " | ".join(f"{name} x {int(qty)}" for name, qty in term)
+            for term in self._scale(self.crystal_terms(item), multiplier)
+        )
+
+
+# --- Inventory Netting ---
+
+# Net amounts at or below this are treated as fully covered.
+_NET_EPSILON = 1e-9
+
+class NetRequirements:
+    """
+    What still has to be crafted and gathered for {product: qty} once stock on
+    hand is used, kept up to date as stock or demand changes.
+
+    Stock is netted at every level: 5 crafted sub-parts in the inventory remove
+    the demand for 5 of them and for everything they'd be crafted from.
+    Alternatives ('A|B') share the quantity evenly, as in generate_gathering_list.
+
+    Per item (on the graph's CompactRecipes IDs):
+    - gross: demand from the top level and from the net demand of its parents
+    - net: max(gross - stock, 0), the amount to craft or gather
+
+    The constructor computes everything level by level in one vectorized pass.
+    After that, set_stock() / set_demand() push only the change down the DAG,
+    parents before ingredients, and stop wherever the net amount is unaffected
+    (e.g. stock still covers the new demand).
+    """
+
+    def __init__(self, graph, top_level, inventory=None):
+        self.graph = graph
+        compact = graph.compact
+        self.n_products = compact.n_products
+        self.offsets = compact.offsets
+        self.ingredient = compact.ingredient
+        self.shares = compact.qty / compact.options
+        self.names = compact.names.copy()
+        # Topological rank: every product ranks above its ingredients; leaves are -1.
+        self.rank = np.full(len(self.names), -1, dtype=np.int64)
+        self.rank[compact.names.lookup(graph.order)] = np.arange(len(graph.order))
+        self.demand, self.stock, self.gross, self.net = (np.zeros(len(self.names)) for _ in range(4))
+        for item, qty in top_level.items():
+            i = self._id(item)
+            self.demand[i] += qty
+        for item, qty in (inventory or {}).items():
+            i = self._id(item)
+            self.stock[i] += qty
+
+        gross = self.demand.copy()
+        net = np.zeros_like(gross)
+        for rows, cols, shares in compact.levels():
+            net[rows] = self._clip(gross[rows] - self.stock[rows])
+            np.add.at(gross, cols, net[rows] * shares)
+        self.gross = gross
+        self.net = self._clip(gross - self.stock)
+
+    @staticmethod
+    def _clip(values):
+        # Negative (covered by stock) and float round-off both count as nothing needed.
+        return np.where(values > _NET_EPSILON, values, 0.0)
+
+    def _id(self, item):
+        item_id = self.names.intern(item)
+        if item_id == len(self.demand):
+            # An item the recipe book doesn't know: a leaf nobody else depends on.
+            self.rank = np.append(self.rank, -1)
+            self.demand, self.stock, self.gross, self.net = (
+                np.append(a, 0.0) for a in (self.demand, self.stock, self.gross, self.net)
+            )
+        return item_id
+
+    def _propagate(self, item_ids):
+        # Re-net the given items and push every change in net demand to their
+        # ingredients, highest topological rank first, so each item is settled
+        # once after all of its changed parents. Returns the IDs whose net changed.
+        heap = [(-self.rank[i], i) for i in set(item_ids)]
+        heapq.heapify(heap)
+        queued = set(item_ids)
+        changed = set()
+        gross, net = self.gross, self.net
+        while heap:
+            _, i = heapq.heappop(heap)
+            queued.discard(i)
+            new = gross[i] - self.stock[i]
+            new = new if new > _NET_EPSILON else 0.0
+            delta = new - net[i]
+            if delta == 0:
+                continue
+            net[i] = new
+            changed.add(i)
+            if i >= self.n_products:
+                continue
+            lo, hi = self.offsets[i], self.offsets[i + 1]
+            for child, share in zip(self.ingredient[lo:hi].tolist(), self.shares[lo:hi].tolist()):
+                gross[child] += delta * share
+                if child not in queued:
+                    queued.add(child)
+                    heapq.heappush(heap, (-self.rank[child], child))
+        return changed
+
+    def set_stock(self, item, qty):
+        """Set the stock of one item; returns the names whose net amount changed."""
+        return self.update_stock({item: qty})
+
+    def set_demand(self, item, qty):
+        """Set the top-level quantity of one item; returns the names whose net amount changed."""
+        return self.update_demand({item: qty})
+
+    def update_stock(self, inventory):
+        """Set several stock counts at once ({item: qty}); items not listed keep theirs."""
+        ids = []
+        for item, qty in inventory.items():
+            i = self._id(item)
+            self.stock[i] = qty
+            ids.append(i)
+        return {self.names[i] for i in self._propagate(ids)}
+
+    def update_demand(self, top_level):
+        """Set several top-level quantities at once ({item: qty}; 0 removes an item)."""
+        ids = []
+        for item, qty in top_level.items():
+            i = self._id(item)
+            self.gross[i] += qty - self.demand[i]
+            self.demand[i] = qty
+            ids.append(i)
+        return {self.names[i] for i in self._propagate(ids)}
+
+    def _amounts(self, values, mask):
+        ids = np.flatnonzero(mask)
+        return {self.names[i]: float(values[i]) for i in ids}
+
+    def gather(self):
+        """{item: qty} of base materials still to gather."""
+        leaves = np.arange(len(self.net)) >= self.n_products
+        return self._amounts(self.net, leaves & (self.net > 0))
+
+    def craft(self):
+        """{product: qty} still to craft."""
+        products = np.arange(len(self.net)) < self.n_products
+        return self._amounts(self.net, products & (self.net > 0))
+
+    def used(self):
+        """{item: qty} taken from stock."""
+        used = np.minimum(self.gross, self.stock)
+        return self._amounts(used, used > _NET_EPSILON)
+
+
+_recipe_graph_cache = {}
+
+def load_recipe_graph(recipe_book_csv, recipe_gathering_csv):
+    """
+    Return the RecipeGraph for the given CSVs, reusing the cached one when
+    neither file has been modified since it was built.
+    """
+    key = (os.path.abspath(recipe_book_csv), os.path.abspath(recipe_gathering_csv))
+    stamp = tuple(os.path.getmtime(p) for p in key)
+    cached = _recipe_graph_cache.get(key)
+    if cached is not None and cached[0] == stamp:
+        tracing.count("recipe_graph.cache_hit")
+        return cached[1]
+    tracing.count("recipe_graph.cache_miss")
+    graph = RecipeGraph.from_csv(recipe_book_csv, recipe_gathering_csv)
+    _recipe_graph_cache[key] = (stamp, graph)
+    return graph
 
-def load_csv_with_max_columns(filepath):
-    """Load a CSV file using the Python engine and ensure uniform column count."""
-    max_fields = max_columns_in_csv(filepath)
-    return pd.read_csv(
-        filepath,
-        header=None,
-        engine='python',
-        names=range(max_fields),
-        on_bad_lines='skip'  # Skip lines with too many fields
-    )
 
 # Function to consolidate CSV contents
-def consolidate_csv_files(folder_path="utilities/workshop_parts"):
+@tracing.traced("workshop.consolidate")
+def consolidate_csv_files(folder_path="utilities/workshop_parts", catalog_keys=None):
+    """
+    Total the part CSVs in folder_path, or, when catalog_keys is given, the parts
+    selected from the data/ catalog (e.g. ["estates/shirogane/large", "airships/bronco_type"]).
+    """
     item_quantities = {}
-    for f in glob.glob(os.path.join(folder_path, "*.csv")):
-        with open(f, encoding='utf-8') as x:
-            for l in x:
-                p = l.strip().split(',', 1)
-                if len(p) == 2:
-                    try: item_quantities[p[0].strip()] = item_quantities.get(p[0].strip(), 0) + int(p[1])
-                    except: continue
+    if catalog_keys is not None:
+        item_quantities = PartsCatalog.load().totals(catalog_keys)
+    else:
+        for f in glob.glob(os.path.join(folder_path, "*.csv")):
+            for item, qty in parse_part_file(f).items():
+                item_quantities[item] = item_quantities.get(item, 0) + qty
+            tracing.add_rows(1)
+    graph = load_recipe_graph(os.path.join("utilities", "recipe_book.csv"), os.path.join("utilities", "recipe_gathering.csv"))
+    return _consolidated(item_quantities, graph, os.path.join("utilities", "workshop_output.csv"))
+
+
+def _consolidated(item_quantities, graph, output_csv):
+    # Totals -> Item / Quantity / Crystals Needed frame, also written to output_csv (None when empty).
     if not item_quantities: return None
     df = pd.DataFrame([[k, v] for k, v in item_quantities.items()], columns=["Item", "Quantity"]).sort_values("Item")
-
-    r, g = load_csv_with_max_columns(os.path.join("utilities", "recipe_book.csv")), load_csv_with_max_columns(os.path.join("utilities", "recipe_gathering.csv"))
-    recipes, gather = {}, {row[0]: row[1] for _, row in g.iterrows()}
-    for _, row in r.iterrows():
-        recipes[row[0]] = [(row[i], float(row[i + 1])) for i in range(1, r.shape[1], 2) if not pd.isna(row[i])]
-
-    def comp(it, m=1):
-        if it in recipes:
-            res = []
-            for ing, qty in recipes[it]:
-                opts = [o.strip() for o in str(ing).split('|')]
-                res.append([comp(o, qty * m) for o in opts] if len(opts) > 1 else comp(opts[0], qty * m))
-            return res
-        if gather.get(it, '').lower() == "crystal": return {it: m}
-        return {}
-
-    def flat(g):
-        if isinstance(g, dict): return [f"{k} x {int(v)}" for k, v in g.items()]
-        if isinstance(g, list) and all(isinstance(x, dict) and x for x in g): return [" | ".join(flat(x)[0] for x in g)]
-        out = []
-        for sub in g:
-            out += flat(sub)
-        return out
-
-    df["Crystals Needed"] = [" & ".join(flat(comp(row["Item"], row["Quantity"]))) for _, row in df.iterrows()]
-    df[["Item", "Quantity"]].to_csv(os.path.join("utilities", "workshop_output.csv"), index=False, header=False)
+    df["Crystals Needed"] = [graph.crystals_needed(item, qty) for item, qty in zip(df["Item"], df["Quantity"])]
+    df[["Item", "Quantity"]].to_csv(output_csv, index=False, header=False)
     return df
 
 
+# --- Incremental Consolidation ---
+
+class WorkshopConsolidator:
+    """
+    Keeps consolidate_csv_files' totals for a parts folder in memory and applies
+    per-file deltas as part CSVs are added, changed or removed.
+
+    Only the items touched by a delta get their "Crystals Needed" recomputed, and
+    workshop_output.csv is rewritten (atomically) only when the totals change.
+    Use scan() for a single update or watch() to poll the folder.
+    """
+
+    def __init__(self, folder_path="utilities/workshop_parts", output_csv=None,
+                 recipe_book_csv=None, recipe_gathering_csv=None):
+        self.folder_path = folder_path
+        self.output_csv = output_csv or os.path.join("utilities", "workshop_output.csv")
+        self.recipe_book_csv = recipe_book_csv or os.path.join("utilities", "recipe_book.csv")
+        self.recipe_gathering_csv = recipe_gathering_csv or os.path.join("utilities", "recipe_gathering.csv")
+        self.files = {}  # path -> ((mtime, size), {item: qty})
+        self.totals = {}
+        self.crystals = {}
+        self.graph = None
+
+    def _apply(self, items, sign, before):
+        for item, qty in items.items():
+            before.setdefault(item, self.totals.get(item))
+            total = self.totals.get(item, 0) + sign * qty
+            if total:
+                self.totals[item] = total
+            else:
+                self.totals.pop(item, None)
+
+    @tracing.traced("workshop.scan")
+    def scan(self):
+        """
+        Pick up changes in the folder since the last scan.
+        Returns the set of items whose totals changed (empty if nothing did).
+        """
+        before = {}
+        seen = set()
+        for path in glob.glob(os.path.join(self.folder_path, "*.csv")):
+            seen.add(path)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            stamp = (stat.st_mtime, stat.st_size)
+            previous = self.files.get(path)
+            if previous is not None and previous[0] == stamp:
+                continue
+            items = parse_part_file(path)
+            if previous is not None:
+                self._apply(previous[1], -1, before)
+            self._apply(items, 1, before)
+            self.files[path] = (stamp, items)
+        for path in set(self.files) - seen:
+            self._apply(self.files.pop(path)[1], -1, before)
+        changed = {item for item, old in before.items() if self.totals.get(item) != old}
+
+        graph = load_recipe_graph(self.recipe_book_csv, self.recipe_gathering_csv)
+        if graph is not self.graph:
+            # The recipe book or gathering list changed, so every crystal string may differ.
+            self.graph = graph
+            self.crystals = {}
+            stale = set(self.totals)
+        else:
+            stale = changed
+        for item in stale:
+            if item in self.totals:
+                self.crystals[item] = graph.crystals_needed(item, self.totals[item])
+            else:
+                self.crystals.pop(item, None)
+
+        if changed:
+            self.write()
+        return changed
+
+    def write(self):
+        """Write the current totals to output_csv (atomically); scan() calls this when they change."""
+        frame = self.frame()
+        if frame is None:
+            frame = pd.DataFrame(columns=["Item", "Quantity"])
+        tmp_path = self.output_csv + ".tmp"
+        frame[["Item", "Quantity"]].to_csv(tmp_path, index=False, header=False)
+        os.replace(tmp_path, self.output_csv)
+
+    def frame(self):
+        """The current totals as the DataFrame consolidate_csv_files returns (None when empty)."""
+        if not self.totals:
+            return None
+        items = sorted(self.totals)
+        return pd.DataFrame({
+            "Item": items,
+            "Quantity": [self.totals[item] for item in items],
+            "Crystals Needed": [self.crystals[item] for item in items],
+        })
+
+    def watch(self, interval=1.0, on_change=None, stop=None):
+        """
+        Poll the folder every `interval` seconds until stop() returns True (or
+        forever), calling on_change(changed_items, frame) after each update.
+        """
+        while stop is None or not stop():
+            changed = self.scan()
+            if changed and on_change is not None:
+                on_change(changed, self.frame())
+            time.sleep(interval)
+
+
 # --- Gathering List Generation ---
 
-def generate_gathering_list(total_csv, recipe_book_csv, recipe_gathering_csv, output_csv):
+@tracing.traced("workshop.gathering_list")
+def generate_gathering_list(total_csv, recipe_book_csv, recipe_gathering_csv, output_csv, inventory_csvs=None):
     """
     Generate the comprehensive list of base ingredients needed (gathering list).
     
@@ -78,54 +683,39 @@ def generate_gathering_list(total_csv, recipe_book_csv, recipe_gathering_csv, ou
     - recipe_book_csv: path to recipe_book.csv (crafting recipes)
     - recipe_gathering_csv: path to recipe_gathering.csv (gathering locations)
     - output_csv: file name to write the final gathering list.
+    - inventory_csvs: optional 'item,quantity' stock files (e.g. utilities/surplus_crafting.csv,
+      utilities/surplus_gathering.csv), netted at every level (see NetRequirements)
     
     Returns the resulting DataFrame.
     """
-    df_total = load_csv_with_max_columns(total_csv)
-    df_recipe_book = load_csv_with_max_columns(recipe_book_csv)
-    df_recipe_gathering = load_csv_with_max_columns(recipe_gathering_csv)
-
-    max_fields_recipe_book = df_recipe_book.shape[1]
-    recipes = {}
-    for _, row in df_recipe_book.iterrows():
-        product = row[0]
-        ingredients = []
-        for i in range(1, max_fields_recipe_book, 2):
-            if pd.isna(row[i]):
-                break
-            ingredient = row[i]
-            qty = float(row[i + 1]) if i + 1 < max_fields_recipe_book and not pd.isna(row[i + 1]) else 0
-            ingredients.append((ingredient, qty))
-        recipes[product] = ingredients
+    graph = load_recipe_graph(recipe_book_csv, recipe_gathering_csv)
+    top_level = read_totals(total_csv)
+    return _gathering_list(graph, top_level, read_inventory(inventory_csvs) if inventory_csvs else None, output_csv)
 
-    top_level = {row[0]: float(row[1]) for _, row in df_total.iterrows()}
 
-    requirements = defaultdict(float)
-
-    def compute_requirements(item, multiplier):
-        if item in recipes:
-            for ingredient, qty in recipes[item]:
-                # Handle alternative ingredients split by '|'
-                options = [opt.strip() for opt in str(ingredient).split('|')]
-                for opt in options:
-                    compute_requirements(opt, qty * multiplier / len(options))
+def _gathering_list(graph, top_level, inventory, output_csv):
+    with tracing.stage("workshop.expand"):
+        if inventory:
+            requirements = graph.net_requirements(top_level, inventory).gather()
         else:
-            requirements[item] += multiplier
-
-    for product, qty in top_level.items():
-        compute_requirements(product, qty)
+            requirements = graph.expand(top_level)
+        tracing.add_rows(len(top_level))
 
     df_requirements = pd.DataFrame(list(requirements.items()), columns=["Ingredient", "Total Quantity"])
 
-    df_recipe_gathering.rename(columns={0: "Ingredient", 1: "Method"}, inplace=True)
+    with tracing.stage("workshop.write_gathering_list"):
+        df_output = _with_gathering_info(df_requirements, graph)
+        df_output.to_csv(output_csv, index=False)
+        tracing.add_rows(len(df_output))
+    return df_output
 
-    def combine_location(row):
-        return ", ".join(
-            str(v).strip() for v in row[2:] if pd.notna(v) and str(v).strip()
-        )
 
-    df_recipe_gathering["Location Info"] = df_recipe_gathering.apply(combine_location, axis=1)
-    df_recipe_gathering = df_recipe_gathering[["Ingredient", "Method", "Location Info"]]
+def _with_gathering_info(df_requirements, graph):
+    # Attach Method / Location Info (one row per known location) and sort by ingredient.
+    df_recipe_gathering = pd.DataFrame(
+        [(ing, method, loc) for ing, entries in graph.gathering.items() for method, loc in entries],
+        columns=["Ingredient", "Method", "Location Info"],
+    )
 
     df_output = pd.merge(df_requirements, df_recipe_gathering, on="Ingredient", how="left")
 
@@ -133,14 +723,245 @@ def generate_gathering_list(total_csv, recipe_book_csv, recipe_gathering_csv, ou
     df_output["Method"] = df_output["Method"].fillna("unknown")
     df_output["Location Info"] = df_output["Location Info"].fillna("")
 
-    df_output = df_output.sort_values("Ingredient")
-    df_output.to_csv(output_csv, index=False)
-    return df_output
+    return df_output.sort_values("Ingredient")
+
+
+def market_prices(item_names, field="minListing_world", world="Seraph", item_ids_json=None):
+    """
+    {item name: price} for the given names, using the item index and the cached
+    market client; names without an ID or a price are left out.
+    """
+    # Imported here so the rest of this module loads without requests.
+    from market_client import normalize_item_id
+    from price_cache import CachedMarketClient
+
+    index = get_item_index(item_ids_json or os.path.join("utilities", "item_ids.json"))
+    names = pd.Series(sorted(set(item_names)), dtype=object)
+    ids = index.lookup(names)
+    with CachedMarketClient(world=world) as client:
+        market = client.fetch(ids.dropna())
+    prices = {}
+    for name, item_id in zip(names, ids):
+        price = market.get(normalize_item_id(item_id), {}).get(field)
+        if price is not None:
+            prices[name] = price
+    return prices
+
+
+@tracing.traced("workshop.cheapest_gathering_list")
+def generate_cheapest_gathering_list(total_csv, recipe_book_csv, recipe_gathering_csv, output_csv,
+                                     prices=None, inventory_csvs=None, world="Seraph"):
+    """
+    Like generate_gathering_list, but every '|' alternative is resolved to its
+    cheapest option instead of splitting the quantity evenly.
+
+    - prices: {item: gil}; fetched from the market for every leaf when omitted
+    - inventory_csvs: 'item,quantity' files of stock on hand (e.g.
+      utilities/surplus_crafting.csv, utilities/surplus_gathering.csv)
+
+    Writes the gathering list (with Unit Price and Cost columns) to output_csv and
+    returns (gathering DataFrame, crafting DataFrame).
+    """
+    graph = load_recipe_graph(recipe_book_csv, recipe_gathering_csv)
+    top_level = read_totals(total_csv)
+    return _cheapest_gathering_list(graph, top_level, read_inventory(inventory_csvs), prices, output_csv, world)
+
+
+def _cheapest_gathering_list(graph, top_level, inventory, prices, output_csv, world, item_ids_json=None):
+    if prices is None:
+        leaves = {
+            opt for ingredients in graph.recipes.values()
+            for ingredient, _ in ingredients for opt in graph.options(ingredient)
+            if opt not in graph.recipes
+        }
+        prices = market_prices(leaves | set(top_level), world=world, item_ids_json=item_ids_json)
+
+    plan = graph.cheapest_plan(top_level, prices, inventory)
+
+    df_gather = pd.DataFrame(list(plan["gather"].items()), columns=["Ingredient", "Total Quantity"])
+    df_gather["Unit Price"] = [prices.get(item) for item in df_gather["Ingredient"]]
+    df_gather["Cost"] = df_gather["Total Quantity"] * pd.to_numeric(df_gather["Unit Price"])
+    df_gather = _with_gathering_info(df_gather, graph)
+    df_gather.to_csv(output_csv, index=False)
+
+    df_craft = pd.DataFrame(
+        [(item, qty, plan["used"].get(item, 0)) for item, qty in plan["craft"].items()],
+        columns=["Product", "Craft Quantity", "From Inventory"],
+    ).sort_values("Product")
+    return df_gather, df_craft
+
+
+
+# --- Bulk Project Totals ---
+
+@tracing.traced("workshop.catalog_requirements")
+def catalog_requirements(group_by="build", patterns=None, recipe_book_csv=None, recipe_gathering_csv=None,
+                         catalog=None):
+    """
+    Base material and crystal totals for every build in the data/ catalog at once.
+
+    - group_by: "build" totals each build together (see parts_catalog.build_name),
+      e.g. a whole large Shirogane house or a whole Bronco airship; "component"
+      keeps each part CSV (hull, roof, …) as its own row.
+    - patterns: optional catalog patterns to restrict the builds (see PartsCatalog.select).
+    - catalog: an already loaded PartsCatalog (default: PartsCatalog.load()).
+
+    Returns a DataFrame with one row per build/component and one column per base item.
+    """
+    recipe_book_csv = recipe_book_csv or os.path.join("utilities", "recipe_book.csv")
+    recipe_gathering_csv = recipe_gathering_csv or os.path.join("utilities", "recipe_gathering.csv")
+    graph = load_recipe_graph(recipe_book_csv, recipe_gathering_csv)
+    catalog = catalog or PartsCatalog.load()
+
+    keys = catalog.keys()
+    if patterns is not None:
+        wanted = {key for pattern in patterns for key in catalog.select(pattern)}
+        keys = [key for key in keys if key in wanted]
+
+    names = graph.compact.names.copy()
+    parts = CompactCatalog.from_catalog(catalog, names, keys)
+    project_of = {}
+    part_project = np.array([
+        project_of.setdefault("/".join(v for v in key if v) if group_by == "component" else build_name(key),
+                              len(project_of))
+        for key in keys
+    ], dtype=np.int32)
+    return graph._expand_demand(list(project_of), names, parts.item,
+                                part_project[parts.part_index()], parts.qty.astype(float))
+
+
+# --- Catalog Materialization ---
+
+CATALOG_MATERIALS_CSV = os.path.join("utilities", "catalog_materials.csv")
+MATERIALS_COLUMNS = ["Level", "Name", "Kind", "Item", "Quantity"]
+
+
+def _file_fingerprint(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _materialize_builds(task):
+    # Worker: (Name, Kind, Item, Quantity) rows for a chunk of {build: {item: qty}}.
+    # Each process loads the recipe graph once and keeps it for later chunks.
+    recipe_book_csv, recipe_gathering_csv, builds = task
+    graph = load_recipe_graph(recipe_book_csv, recipe_gathering_csv)
+    compact = graph.compact
+    names = compact.names.copy()
+    demands = [(names.intern_many(demand), np.fromiter(demand.values(), dtype=float)) for demand in builds.values()]
+    totals = np.zeros((len(names), len(builds)))
+    for b, (item_ids, qty) in enumerate(demands):
+        np.add.at(totals[:, b], item_ids, qty)
+    compact.push_down(totals)
+
+    rows = []
+    for b, build in enumerate(builds):
+        for i in np.flatnonzero(totals[:, b]):
+            item = names[i]
+            if i < compact.n_products:
+                kind = "crafted"
+            else:
+                kind = "crystal" if graph.is_crystal(item) else "base"
+            rows.append((build, kind, item, float(totals[i, b])))
+    return rows
+
+
+@tracing.traced("workshop.materialize_catalog")
+def materialize_catalog(output_csv=CATALOG_MATERIALS_CSV, recipe_book_csv=None, recipe_gathering_csv=None,
+                        processes=None, full=False, catalog=None):
+    """
+    Precompute the materials of every build in the data/ catalog into one CSV
+    with MATERIALS_COLUMNS:
 
+    - Level "build": one row per build (see parts_catalog.build_name) and item
+    - Level "category": the same summed per catalog category (airships, estates, …)
+    - Kind: "base" (gathered or bought), "crystal", or "crafted" for every crafted
+      intermediate, parts included; quantities are gross, before any stock
+
+    Builds are spread over a process pool in chunks (processes=1 runs inline).
+    A manifest next to output_csv keeps a fingerprint of each build's part files
+    and of the recipe CSVs, so a re-run only recomputes builds whose parts
+    changed (everything when a recipe CSV changed or full=True). catalog is an
+    already loaded PartsCatalog (default: PartsCatalog.load()).
+
+    Returns the results DataFrame.
+    """
+    recipe_book_csv = recipe_book_csv or os.path.join("utilities", "recipe_book.csv")
+    recipe_gathering_csv = recipe_gathering_csv or os.path.join("utilities", "recipe_gathering.csv")
+    manifest_path = os.path.splitext(output_csv)[0] + ".json"
+    catalog = catalog or PartsCatalog.load()
+
+    builds, part_hashes = {}, {}
+    for entry in sorted(catalog.entries.values(), key=lambda e: tuple("" if v is None else v for v in e["key"])):
+        build = build_name(entry["key"])
+        demand = builds.setdefault(build, {})
+        for item, qty in entry["items"].items():
+            demand[item] = demand.get(item, 0) + qty
+        part_hashes.setdefault(build, []).append(entry["hash"])
+    fingerprints = {build: hashlib.sha1("".join(sorted(h)).encode()).hexdigest() for build, h in part_hashes.items()}
+    recipes = [_file_fingerprint(recipe_book_csv), _file_fingerprint(recipe_gathering_csv)]
+
+    previous = {}
+    if not full and os.path.exists(manifest_path) and os.path.exists(output_csv):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("recipes") == recipes:
+            previous = manifest.get("builds", {})
+    reuse = {build for build, fp in fingerprints.items() if previous.get(build) == fp}
+
+    stale = [build for build in builds if build not in reuse]
+    if not stale and reuse == set(previous):
+        print(f"Materialized 0 build(s), reused {len(reuse)}")
+        return pd.read_csv(output_csv)
+
+    frames, rows = [], []
+    if reuse:
+        df_previous = pd.read_csv(output_csv)
+        kept = df_previous[(df_previous["Level"] == "build") & df_previous["Name"].isin(reuse)]
+        frames.append(kept.drop(columns="Level"))
+
+    if stale:
+        workers = processes or os.cpu_count() or 1
+        chunk = max(1, -(-len(stale) // (workers * 4)))
+        tasks = [
+            (recipe_book_csv, recipe_gathering_csv, {build: builds[build] for build in stale[i:i + chunk]})
+            for i in range(0, len(stale), chunk)
+        ]
+        if len(tasks) == 1 or processes == 1:
+            for chunk_rows in map(_materialize_builds, tasks):
+                rows.extend(chunk_rows)
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                for chunk_rows in pool.map(_materialize_builds, tasks):
+                    rows.extend(chunk_rows)
+    print(f"Materialized {len(stale)} build(s), reused {len(reuse)}")
+
+    if rows or not frames:
+        frames.append(pd.DataFrame(rows, columns=["Name", "Kind", "Item", "Quantity"]))
+    df_builds = pd.concat(frames, ignore_index=True)
+    df_builds.insert(0, "Level", "build")
+    df_categories = (
+        df_builds.assign(Name=df_builds["Name"].str.split("/").str[0])
+        .groupby(["Name", "Kind", "Item"], as_index=False)["Quantity"].sum()
+    )
+    df_categories.insert(0, "Level", "category")
+    df_output = (
+        pd.concat([df_categories, df_builds], ignore_index=True)
+        .sort_values(["Level", "Name", "Kind", "Item"], ascending=[False, True, True, True], ignore_index=True)
+    )
+
+    tmp_path = output_csv + ".tmp"
+    df_output.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, output_csv)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"recipes": recipes, "builds": fingerprints}, f, indent=1, sort_keys=True)
+    tracing.add_rows(len(df_output))
+    return df_output
 
 
 # --- Crafting Recipes List ---
 
+@tracing.traced("workshop.crafting_recipes")
 def get_crafting_recipes(total_csv):
     """
     Generate the list of crafting recipes from a totalized parts CSV.
@@ -155,34 +976,9 @@ def get_crafting_recipes(total_csv):
 """
 # --- Market Data Fetching ---
 
-def fetch_market_data(item_id, world, market_columns):
-    # Query the Universalis API for market data on a given item.
-    # Returns a dictionary with market data (or None values on failure).
-    
-    url = f"https://universalis.app/api/v2/aggregated/{world}/{item_id}"
-    try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            if "results" in data and len(data["results"]) > 0:
-                result = data["results"][0]
-                return {
-                    "minListing_world": result.get("nq", {}).get("minListing", {}).get("world", {}).get("price"),
-                    "minListing_dc": result.get("nq", {}).get("minListing", {}).get("dc", {}).get("price"),
-                    "recentPurchase_world": result.get("nq", {}).get("recentPurchase", {}).get("world", {}).get("price"),
-                    "recentPurchase_dc": result.get("nq", {}).get("recentPurchase", {}).get("dc", {}).get("price"),
-                    "averageSalePrice_dc": result.get("nq", {}).get("averageSalePrice", {}).get("dc", {}).get("price"),
-                    "dailySaleVelocity_dc": result.get("nq", {}).get("dailySaleVelocity", {}).get("dc", {}).get("quantity"),
-                }
-            else:
-                print(f"No results found for item ID {item_id}")
-        else:
-            print(f"Error fetching data for item ID {item_id}. Status code: {response.status_code}")
-    except Exception as e:
-        print(f"Exception for item ID {item_id}: {e}")
-    return {col: None for col in market_columns}
-
 def fetch_market_data_for_subparts(gathering_csv, crafting_csv, item_ids_json, output_csv, world="Seraph"):
+    from market_client import MARKET_COLUMNS, empty_market_fields, normalize_item_id
+    from price_cache import CachedMarketClient
     
     # Combine items from the gathering list and the crafting recipes list, look up their IDs,
     # query the Universalis API for market data, and write the results to output_csv.
@@ -205,129 +1001,196 @@ def fetch_market_data_for_subparts(gathering_csv, crafting_csv, item_ids_json, o
     df_combined = pd.concat([df_gathering, df_crafting], ignore_index=True)
     df_combined = df_combined.drop_duplicates(subset=["Item Name"])
 
-    # Load item ID mapping from JSON.
-    with open(item_ids_json, "r", encoding="utf-8") as f:
-        item_json = json.load(f)
-    item_mapping = {}
-    for item_id, names in item_json.items():
-        en_name = names.get("en", "").strip().lower()
-        if en_name:
-            item_mapping[en_name] = item_id
-
-    # Helper functions for cleaning names and looking up IDs.
-    def clean_item_name(name):
-        return name.lower().strip()
-
-    def get_item_id(name):
-        cleaned = clean_item_name(name)
-        if cleaned in item_mapping:
-            return item_mapping[cleaned]
-        else:
-            print(f"Error: No ID found for item '{name}' (cleaned as '{cleaned}').")
-            return None
+    # Look up item IDs through the prebuilt name index.
+    index = get_item_index(item_ids_json)
+    df_combined["Item ID"] = index.lookup(df_combined["Item Name"])
+    index.report_missing(df_combined["Item Name"], df_combined["Item ID"])
 
-    df_combined["Item ID"] = df_combined["Item Name"].apply(get_item_id)
-
-    # Initialize market data columns.
-    market_columns = [
-        "minListing_world", 
-        "minListing_dc", 
-        "recentPurchase_world", 
-        "recentPurchase_dc", 
-        "averageSalePrice_dc", 
-        "dailySaleVelocity_dc"
-    ]
-    for col in market_columns:
-        df_combined[col] = None
-
-    # Fetch market data for each item.
-    for idx, row in df_combined.iterrows():
-        item_id = row["Item ID"]
-        if item_id is not None:
-            market_data = fetch_market_data(item_id, world, market_columns)
-            for key, value in market_data.items():
-                df_combined.at[idx, key] = value
-            time.sleep(0.5)
-        else:
-            print(f"Skipping market query for '{row['Item Name']}' due to missing ID.")
+    # Fetch market data for every item with an ID, via the local price cache.
+    for name in df_combined.loc[df_combined["Item ID"].isna(), "Item Name"]:
+        print(f"Skipping market query for '{name}' due to missing ID.")
+    with CachedMarketClient(world=world) as client:
+        market = client.fetch(df_combined["Item ID"].dropna())
+    rows = [market.get(normalize_item_id(item_id), empty_market_fields()) for item_id in df_combined["Item ID"]]
+    for col in MARKET_COLUMNS:
+        df_combined[col] = pd.Series([row[col] for row in rows], index=df_combined.index, dtype=object)
 
     df_combined.to_csv(output_csv, index=False)
     return df_combined
 """
 
 
-def print_recipe_tree(total_csv, recipe_book_csv, recipe_gathering_csv):
+@tracing.traced("workshop.recipe_tree")
+def print_recipe_tree(total_csv, recipe_book_csv, recipe_gathering_csv,
+                      output=None, fmt=None, backrefs=True, max_depth=None, collapse=None):
     """
-    Recursively prints each top‐level product (from total_csv) as a tree:
+    Prints each top‐level product (from total_csv) as a tree:
       ├── IngredientA (x qty)
-      │   ├── SubIngredient1 (x qty*…)
+      │   ├── SubIngredient1 (x qty*…)  [#1]
       │   └── SubIngredient2 (x qty*…)
       └── IngredientB (x qty)
-          └── … etc …
+          └── SubIngredient1 (x qty*…)  → see #1 above
     Leaf nodes show their gathering Method and Location Info in brackets.
 
     total_csv: path to CSV with top‐level items and quantities.
     recipe_book_csv: path to CSV with crafting recipes (product → ingredient, qty, …).
     recipe_gathering_csv: path to CSV mapping ingredient → Method + locations.
+    output / fmt: stream to a file instead of stdout, as "text", "json" or "html"
+      (taken from the extension when fmt is None); without output, json/html is returned.
+    backrefs: expand sub-trees shared by several parents once, then refer back to them
+      (False repeats them in full, as this used to).
+    max_depth / collapse: stop expanding below a depth / show at most N ingredients per product.
     """
+    top_level = read_totals(total_csv)
+    graph = load_recipe_graph(recipe_book_csv, recipe_gathering_csv)
+    return render_recipe_tree(graph, top_level, output, fmt,
+                              backrefs=backrefs, max_depth=max_depth, collapse=collapse)
 
-    # 1) Build top‐level dict: {product_name: quantity}
-    df_total = load_csv_with_max_columns(total_csv)
-    top_level = {row[0]: float(row[1]) for _, row in df_total.iterrows()}
 
-    # 2) Build recipes dict: {product: [(ingredient, qty), …]}
-    df_recipe = load_csv_with_max_columns(recipe_book_csv)
-    max_fields = df_recipe.shape[1]
-    recipes = {}
-    for _, row in df_recipe.iterrows():
-        product = row[0]
-        ingredients = []
-        for i in range(1, max_fields, 2):
-            if pd.isna(row[i]):
-                break
-            ing = row[i]
-            qty = float(row[i + 1]) if (i + 1 < max_fields and not pd.isna(row[i + 1])) else 0.0
-            ingredients.append((ing, qty))
-        recipes[product] = ingredients
-
-    # 3) Build gathering info: {ingredient: (method, location_info_string)}
-    df_gather = load_csv_with_max_columns(recipe_gathering_csv)
-    df_gather.rename(columns={0: "Ingredient", 1: "Method"}, inplace=True)
-
-    def _combine_location(row):
-        return ", ".join(
-            str(v).strip() for v in row[2:] if pd.notna(v) and str(v).strip()
-        )
+# --- Notebook Session ---
 
-    gather_info = {}
-    for _, row in df_gather.iterrows():
-        ing = row["Ingredient"]
-        method = row["Method"]
-        loc = _combine_location(row)
-        gather_info[ing] = (method, loc)
-
-    # 4) Recursive printer
-    def _print_node(item_name, qty, prefix="", is_last=False):
-        branch = "└── " if is_last else "├── "
-        line = prefix + branch + f"{item_name} (x {qty:g})"
-
-        if item_name not in recipes:
-            # leaf: append gathering info if available
-            if item_name in gather_info:
-                m, loc = gather_info[item_name]
-                line += f"  [{m} @ {loc}]"
-            print(line)
-        else:
-            print(line)
-            children = recipes[item_name]
-            for idx, (child, child_qty) in enumerate(children):
-                last_child = (idx == len(children) - 1)
-                next_prefix = prefix + ("    " if is_last else "│   ")
-                _print_node(child, child_qty * qty, prefix=next_prefix, is_last=last_child)
-
-    # 5) Top‐level iteration
-    print("=== Recipe Breakdown ===")
-    items = list(top_level.items())
-    for idx, (prod, qty) in enumerate(items):
-        last_prod = (idx == len(items) - 1)
-        _print_node(prod, qty, prefix="", is_last=last_prod)
\ No newline at end of file
+def _stat_fingerprint(path):
+    # (mtime_ns, size), or None for a missing file: one stat call, no reading.
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class WorkshopSession:
+    """
+    The workshop reference data for one notebook (or script), parsed once and
+    re-parsed only when its files change.
+
+        session = WorkshopSession()                 # paths under utilities/ and data/
+        session.consolidate()
+        session.gathering_list()
+        session.recipe_tree()
+
+    Every access checks the files it depends on with a single stat() each
+    (mtime and size) and rebuilds only what changed:
+
+    - graph: the recipe book and gathering info (RecipeGraph, shared with
+      load_recipe_graph)
+    - totals: the consolidated top-level items from totals_csv
+    - inventory: the surplus stock CSVs
+    - catalog: the data/ PartsCatalog, refreshed file by file
+    - item_index: the item name -> ID index
+
+    The methods mirror the module functions (consolidate_csv_files,
+    generate_gathering_list, …) with the paths filled in from the session.
+    """
+
+    def __init__(self, utils_dir="utilities", data_dir="data", parts_folder=None, totals_csv=None,
+                 recipe_book_csv=None, recipe_gathering_csv=None, inventory_csvs=None,
+                 item_ids_json=None, world="Seraph"):
+        self.utils_dir = utils_dir
+        self.data_dir = data_dir
+        self.parts_folder = parts_folder or os.path.join(utils_dir, "workshop_parts")
+        self.totals_csv = totals_csv or os.path.join(utils_dir, "workshop_output.csv")
+        self.recipe_book_csv = recipe_book_csv or os.path.join(utils_dir, "recipe_book.csv")
+        self.recipe_gathering_csv = recipe_gathering_csv or os.path.join(utils_dir, "recipe_gathering.csv")
+        if inventory_csvs is None:
+            inventory_csvs = [os.path.join(utils_dir, "surplus_crafting.csv"), os.path.join(utils_dir, "surplus_gathering.csv")]
+        self.inventory_csvs = list(inventory_csvs)
+        self.item_ids_json = item_ids_json or os.path.join(utils_dir, "item_ids.json")
+        self.world = world
+        self._cache = {}  # name -> (fingerprints, value)
+        self._catalog = None
+        self._consolidator = None
+
+    def _cached(self, name, paths, build):
+        stamp = tuple(_stat_fingerprint(p) for p in paths)
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == stamp:
+            tracing.count("session.cache_hit")
+            return cached[1]
+        tracing.count("session.cache_miss")
+        value = build()
+        self._cache[name] = (stamp, value)
+        return value
+
+    # --- Reference data ---
+
+    @property
+    def graph(self):
+        return load_recipe_graph(self.recipe_book_csv, self.recipe_gathering_csv)
+
+    @property
+    def totals(self):
+        """{item: quantity} from totals_csv."""
+        return self._cached("totals", [self.totals_csv], lambda: read_totals(self.totals_csv))
+
+    @property
+    def inventory(self):
+        """Stock on hand summed over the inventory CSVs that exist."""
+        return self._cached("inventory", self.inventory_csvs,
+                            lambda: read_inventory([p for p in self.inventory_csvs if os.path.exists(p)]))
+
+    @property
+    def catalog(self):
+        """The data/ PartsCatalog; later accesses only re-read part files that changed."""
+        if self._catalog is None:
+            self._catalog = PartsCatalog.load(self.data_dir, os.path.join(self.utils_dir, "parts_catalog.json"))
+        elif self._catalog.refresh() and self._catalog.index_path:
+            self._catalog.save()
+        return self._catalog
+
+    @property
+    def item_index(self):
+        return get_item_index(self.item_ids_json, os.path.splitext(self.item_ids_json)[0] + ".idx")
+
+    # --- Pipeline steps ---
+
+    @tracing.traced("session.consolidate")
+    def consolidate(self, catalog_keys=None):
+        """consolidate_csv_files for the session's parts folder (or catalog_keys from data/)."""
+        if catalog_keys is not None:
+            # totals_csv now holds catalog totals, so the folder has to be rescanned and rewritten next time.
+            self._consolidator = None
+            return _consolidated(self.catalog.totals(catalog_keys), self.graph, self.totals_csv)
+        if self._consolidator is None:
+            self._consolidator = WorkshopConsolidator(self.parts_folder, self.totals_csv,
+                                                      self.recipe_book_csv, self.recipe_gathering_csv)
+        self._consolidator.scan()
+        return self._consolidator.frame()
+
+    @tracing.traced("session.gathering_list")
+    def gathering_list(self, output_csv=None, net=False):
+        """generate_gathering_list for the current totals; net=True subtracts the inventory at every level."""
+        output_csv = output_csv or os.path.join(self.utils_dir, "gathering_list.csv")
+        return _gathering_list(self.graph, self.totals, self.inventory if net else None, output_csv)
+
+    @tracing.traced("session.cheapest_gathering_list")
+    def cheapest_gathering_list(self, output_csv=None, prices=None, use_inventory=True):
+        """generate_cheapest_gathering_list for the current totals and (by default) inventory."""
+        output_csv = output_csv or os.path.join(self.utils_dir, "gathering_list.csv")
+        inventory = self.inventory if use_inventory else {}
+        return _cheapest_gathering_list(self.graph, self.totals, inventory, prices, output_csv,
+                                        self.world, self.item_ids_json)
+
+    def net_requirements(self):
+        """NetRequirements for the current totals and inventory (see RecipeGraph.net_requirements)."""
+        return self.graph.net_requirements(self.totals, self.inventory)
+
+    def crafting_recipes(self):
+        """get_crafting_recipes for totals_csv."""
+        return self._cached("crafting_recipes", [self.totals_csv],
+                            lambda: get_crafting_recipes(self.totals_csv)).copy()
+
+    def recipe_tree(self, output=None, fmt=None, **options):
+        """print_recipe_tree for the current totals (same options)."""
+        return render_recipe_tree(self.graph, self.totals, output, fmt, **options)
+
+    def catalog_requirements(self, group_by="build", patterns=None):
+        return catalog_requirements(group_by, patterns, self.recipe_book_csv, self.recipe_gathering_csv,
+                                    catalog=self.catalog)
+
+    def materialize(self, output_csv=None, processes=None, full=False):
+        output_csv = output_csv or os.path.join(self.utils_dir, "catalog_materials.csv")
+        return materialize_catalog(output_csv, self.recipe_book_csv, self.recipe_gathering_csv,
+                                   processes=processes, full=full, catalog=self.catalog)
+
+    def market_prices(self, item_names, field="minListing_world"):
+        return market_prices(item_names, field, self.world, self.item_ids_json)